@@ -0,0 +1,55 @@
+"""
+Streaming JSON arrays for unpaginated list endpoints.
+
+StreamingListMixin makes list() answer JSON requests with a
+StreamingHttpResponse that writes the array a chunk of rows at a time: rows
+are read with queryset.iterator(), serialized chunk by chunk and encoded with
+renderers.dumps(). Memory stays bounded by `stream_chunk_size` rows however
+large the table is. The body is the same as a rendered response would be.
+
+Paginated views, and requests for other formats (e.g. the browsable API),
+take the normal path.
+"""
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .renderers import dumps
+
+
+def json_array(items, encode=dumps):
+    """Yield the bytes of a JSON array of chunks of already serialized items"""
+    yield b'['
+    first = True
+    for chunk in items:
+        if not chunk:
+            continue
+        body = encode(chunk)[1:-1]  # the chunk's own array, without its brackets
+        yield body if first else b',' + body
+        first = False
+    yield b']'
+
+
+class StreamingListMixin:
+    stream_chunk_size = 1000
+
+    def should_stream(self, request):
+        return self.paginator is None and isinstance(request.accepted_renderer, JSONRenderer)
+
+    def serialized_chunks(self, queryset):
+        chunk = []
+        for row in queryset.iterator(chunk_size=self.stream_chunk_size):
+            chunk.append(row)
+            if len(chunk) >= self.stream_chunk_size:
+                yield self.get_serializer(chunk, many=True).data
+                chunk = []
+        if chunk:
+            yield self.get_serializer(chunk, many=True).data
+
+    def list(self, request, *args, **kwargs):
+        if not self.should_stream(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(
+            json_array(self.serialized_chunks(queryset)),
+            content_type=request.accepted_renderer.media_type,
+        )
@@ -1,3 +1,62 @@
+import datetime
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from . import renderers
+from .models import Book
+from .views import BookList
+
+
+class FastJSONRendererTests(TestCase):
+    def test_output_matches_json_renderer(self):
+        data = {
+            'title': 'Caf\u00e9 \u2028 line',
+            'when': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 5, 1),
+            'price': Decimal('9.50'),
+            'items': [1, 2.5, None, True],
+            3: 'int key',
+        }
+        self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indented_requests_fall_back(self):
+        rendered = renderers.FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+
+class StreamingListTests(APITestCase):
+    def setUp(self):
+        Book.objects.bulk_create([Book(title=f'Book {number}', author='Author') for number in range(5)])
+
+    def test_book_list_streams_in_chunks(self):
+        original = BookList.stream_chunk_size
+        BookList.stream_chunk_size = 2
+        try:
+            response = self.client.get(reverse('book-list'), HTTP_ACCEPT='application/json')
+        finally:
+            BookList.stream_chunk_size = original
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(json.loads(body), list(Book.objects.order_by('id').values('id', 'title', 'author')))
+
+    def test_empty_list_is_an_empty_array(self):
+        Book.objects.all().delete()
+        response = self.client.get(reverse('book-list'), HTTP_ACCEPT='application/json')
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+    def test_browsable_api_is_not_streamed(self):
+        response = self.client.get(reverse('book-list'), HTTP_ACCEPT='text/html')
+        self.assertFalse(response.streaming)
 
-# Create your tests here.
+    def test_admin_viewset_streams(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(reverse('book_all-list'), HTTP_ACCEPT='application/json')
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 5)
@@ -2,18 +2,19 @@ from django.shortcuts import render
 from rest_framework import viewsets
 from .models import Book
 from .serializers import BookSerializer
+from .streaming import StreamingListMixin
 from rest_framework.response import Response
 from rest_framework import generics
 from rest_framework.permissions import AllowAny, IsAdminUser #import specific authentication we want to alter
 
 # 📌 Public view — no authentication required
-class BookList(generics.ListAPIView):
+class BookList(StreamingListMixin, generics.ListAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [AllowAny]
    
 # 📌 Admin-only full CRUD view
-class BookViewSet (viewsets.ModelViewSet):
+class BookViewSet (StreamingListMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAdminUser]
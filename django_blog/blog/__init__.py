@@ -0,0 +1,3 @@
+# deferred.py is a copy of social_media_api's social_media_api/deferred.py.
+# The two projects deploy separately and share no package, so change both
+# together.
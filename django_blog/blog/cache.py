@@ -0,0 +1,101 @@
+# blog/cache.py
+"""
+Versioned caching for rendered blog pages and fragments.
+
+Nothing is ever deleted from the cache. Every cache key embeds a version
+number, and blog/signals.py bumps the version when the underlying rows
+change, so stale entries are never read again and simply expire:
+
+    post:<pk>      the post itself and its tag assignments
+    comments:<pk>  comments of one post
+    posts          any post (the list pages)
+
+Templates use `{% cache %}` with the versions from `fragment_versions()`, and
+AnonymousPageCacheMixin stores whole responses for logged-out readers. Works
+with any Django cache backend (locmem and file based ones included).
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+
+POSTS = 'posts'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def comments_scope(post_id):
+    return f'comments:{post_id}'
+
+
+def _version_key(scope):
+    return f'blog:version:{scope}'
+
+
+def timeout():
+    return getattr(settings, 'BLOG_CACHE_TIMEOUT', 600)
+
+
+def versions(*scopes):
+    """Current version of each scope, in order; unseen scopes start at 1"""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: 1 for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # never read yet: any version works as long as it is new
+            cache.set(key, 2, timeout=None)
+
+
+def fragment_versions(post_id):
+    """Template context for the post detail {% cache %} fragments"""
+    post_version, comments_version = versions(post_scope(post_id), comments_scope(post_id))
+    return {'post_version': post_version, 'comments_version': comments_version}
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serve whole rendered pages to logged-out GET requests from the cache.
+
+    Views list the version scopes their output depends on in
+    `page_cache_scopes()`.
+    """
+
+    def page_cache_scopes(self):
+        return [POSTS]
+
+    def page_cache_key(self, request):
+        scopes = self.page_cache_scopes()
+        version = '.'.join(str(number) for number in versions(*scopes))
+        url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f'blog:page:{url}:{version}'
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated or len(messages.get_messages(request)):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.page_cache_key(request)
+        response = cache.get(key)
+        if response is not None:
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            if hasattr(response, 'render') and callable(response.render):
+                response.add_post_render_callback(lambda rendered: cache.set(key, rendered, timeout()))
+            else:
+                cache.set(key, response, timeout())
+        return response
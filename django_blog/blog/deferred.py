@@ -0,0 +1,98 @@
+"""
+Signal side effects deferred to commit and run in batches.
+
+A receiver that writes to the database runs inside every save that triggers
+it, holding the saving transaction open for longer and costing one or more
+queries per row. defer(handler, item) queues the item instead; when the
+transaction commits, handler(items) is called once with everything queued
+for it, so creating a thousand users in one transaction costs one bulk insert
+rather than a thousand inserts. Outside a transaction the handler runs at once
+with the single item.
+
+Only the public transaction.on_commit() is used. The first item a handler
+gets while connection.in_atomic_block is set starts a batch, which is
+registered as an on_commit() callback; later items join it, and each also
+registers a no-op marker callback. Django drops the callbacks of a
+savepoint or transaction that is rolled back, and the batch and markers are
+referenced from nowhere else (we only keep weak references), so at commit
+the batch runs with the items whose markers are still alive, and a batch
+that was dropped is replaced by a new one on the next defer(). This relies
+on the interpreter freeing dropped callbacks at once, as CPython does.
+
+Handlers run after commit, in autocommit mode, so they must be idempotent:
+whatever they create may exist already (use bulk_create(ignore_conflicts=True)
+or similar). A handler that raises is logged and does not affect the
+transaction that queued the work.
+
+only_touches() lets receivers ignore saves they have no business with, such
+as the `last_login` update Django makes on every login.
+"""
+import threading
+import weakref
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+_local = threading.local()
+
+
+class Marker:
+    """on_commit() callback standing for one queued item; alive while its savepoint is"""
+    __slots__ = ('item', '__weakref__')
+
+    def __init__(self, item):
+        self.item = item
+
+    def __call__(self):
+        pass
+
+
+class Batch:
+    """Items queued for one handler in one transaction"""
+
+    def __init__(self, handler, using):
+        self.handler = handler
+        self.using = using
+        self.markers = []
+        # on_commit() names the callback when logging a failure
+        self.__qualname__ = getattr(handler, '__qualname__', repr(handler))
+
+    def add(self, item):
+        marker = Marker(item)
+        self.markers.append(weakref.ref(marker))
+        transaction.on_commit(marker, using=self.using)
+
+    def __call__(self):
+        batches = _batches(self.using)
+        if batches.get(self.handler, lambda: None)() is self:
+            del batches[self.handler]
+        items = [marker.item for marker in (ref() for ref in self.markers) if marker is not None]
+        if items:
+            self.handler(items)
+
+
+def _batches(using):
+    """handler -> weak reference to its open Batch, per database"""
+    if not hasattr(_local, 'batches'):
+        _local.batches = {}
+    return _local.batches.setdefault(using, {})
+
+
+def defer(handler, item, using=None):
+    """Queue item for handler(items), called once per batch after commit"""
+    using = using or DEFAULT_DB_ALIAS
+    if not transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: handler([item]), using=using, robust=True)  # runs now
+        return
+
+    batches = _batches(using)
+    batch = batches[handler]() if handler in batches else None
+    if batch is None:  # first item of this transaction, or the last batch was rolled back
+        batch = Batch(handler, using)
+        batches[handler] = weakref.ref(batch)
+        transaction.on_commit(batch, using=using, robust=True)
+    batch.add(item)
+
+
+def only_touches(update_fields, *fields):
+    """True when save(update_fields=...) wrote nothing but `fields`"""
+    return update_fields is not None and set(update_fields) <= set(fields)
@@ -2,7 +2,7 @@ from django import forms
 from .email import EmailAddForm
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import AuthenticationForm
-from .models import Profile, Post, Comment, Tag
+from .models import Profile, Post, Comment
 from taggit.forms import TagWidget  
 
 from django.contrib.auth.forms import UserCreationForm
@@ -43,12 +43,7 @@ class ProfileForm(forms.ModelForm):
 
 
 class PostForm(forms.ModelForm):
-       tags = forms.ModelMultipleChoiceField(
-        queryset=Tag.objects.all(),
-        required=False,
-        widget=forms.CheckboxSelectMultiple
-    )
-
+       # tags is taggit's own comma-separated TagField
        class Meta:
         model = Post
         fields = ['title', 'content', 'tags']
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog import tags
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-tag post counts and recent posts from the tagging tables'
+
+    def handle(self, *args, **options):
+        rebuilt = tags.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {rebuilt} tag(s).'))
@@ -40,14 +40,56 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='blog_comment_post_page_idx'),  # comment pages
+        ]
 
     def __str__(self):
         return f'Comment by {self.author} on {self.post}'
 
 
 
-class Tag(models.Model):
-    name = models.CharField(max_length=50, unique=True)
+class SearchDocument(models.Model):
+    """Per-post statistics for BM25, maintained by blog/search.py"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    length = models.PositiveIntegerField(default=0)  # weighted number of terms
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f'Search document for {self.post_id}'
+
+
+class SearchStats(models.Model):
+    """Corpus totals for BM25 in a single row (pk=1), maintained by blog/search.py"""
+    documents = models.PositiveIntegerField(default=0)
+    total_length = models.PositiveBigIntegerField(default=0)  # sum of SearchDocument.length
+
+    def __str__(self):
+        return f'{self.documents} search document(s)'
+
+
+class SearchPosting(models.Model):
+    """One row per (term, post): the inverted index"""
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='search_postings')
+    frequency = models.PositiveIntegerField()  # weighted term frequency
+
+    class Meta:
+        unique_together = ('term', 'post')  # also the term lookup index
+
+    def __str__(self):
+        return f'{self.term} in {self.post_id}'
+
+
+class TagStat(models.Model):
+    """Per-tag post count and newest post ids for taggit tags, maintained by blog/tags.py"""
+    tag = models.OneToOneField('taggit.Tag', on_delete=models.CASCADE, primary_key=True, related_name='blog_stat')
+    post_count = models.PositiveIntegerField(default=0)
+    recent_post_ids = models.JSONField(default=list)  # newest first, at most tags.RECENT_POSTS
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-post_count'], name='blog_tagstat_count_idx'),  # tag cloud
+        ]
+
+    def __str__(self):
+        return f'{self.tag} ({self.post_count})'
\ No newline at end of file
@@ -0,0 +1,50 @@
+# blog/pagination.py
+"""
+Keyset pagination for a post's comments.
+
+Comments are read in (created_at, id) order straight off the
+(post, created_at, id) index: each page is `WHERE post_id = ? AND
+(created_at, id) > cursor LIMIT n`, so page 500 costs the same as page 1 and
+the detail page renders the same amount of HTML for any number of comments.
+"""
+import base64
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment
+
+
+def page_size():
+    return getattr(settings, 'BLOG_COMMENTS_PAGE_SIZE', 20)
+
+
+def encode_cursor(comment):
+    raw = f'{comment.created_at.isoformat()}|{comment.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; None when it is missing or malformed"""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        return (created_at, int(pk)) if created_at else None
+    except (ValueError, UnicodeDecodeError, AttributeError):
+        return None
+
+
+def comment_page(post_id, cursor=None, size=None):
+    """One page of a post's comments with authors, and the cursor of the next page (or None)"""
+    size = size or page_size()
+    comments = Comment.objects.filter(post_id=post_id).select_related('author').order_by('created_at', 'id')
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        comments = comments.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+
+    rows = list(comments[:size + 1])  # one extra row tells us whether there is more
+    page = rows[:size]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > size else None
+    return page, next_cursor
@@ -0,0 +1,139 @@
+# blog/search.py
+"""
+Inverted-index search for blog posts.
+
+Each post is tokenized once, when it is saved or its tags change, into
+SearchPosting rows (term, post, weighted frequency) plus a SearchDocument
+holding its weighted length. A query then reads only the postings of its own
+terms and ranks posts with BM25, instead of ILIKE-scanning every title and
+body and joining the tag tables.
+
+Title and tag terms count more than body terms (TITLE_WEIGHT, TAG_WEIGHT).
+Deleting a post removes its postings through on_delete=CASCADE.
+
+The corpus size and total length BM25 needs live in the one SearchStats row,
+adjusted by index_post() and when a SearchDocument is deleted, so a query
+never aggregates over SearchDocument.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import Post, SearchDocument, SearchPosting, SearchStats
+
+STATS_PK = 1
+
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+MAX_TERM_LENGTH = 64
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i in is it its of on or so that the this to was were will with you
+""".split())
+
+
+def tokenize(text):
+    return [
+        word for word in re.findall(r'\w+', (text or '').lower())
+        if word not in STOPWORDS and len(word) <= MAX_TERM_LENGTH
+    ]
+
+
+def post_terms(post, tag_names=None):
+    """Weighted term frequencies for a post"""
+    if tag_names is None:
+        tag_names = post.tags.names()
+    terms = Counter()
+    for word in tokenize(post.title):
+        terms[word] += TITLE_WEIGHT
+    for word in tokenize(post.content):
+        terms[word] += 1
+    for name in tag_names:
+        for word in tokenize(name):
+            terms[word] += TAG_WEIGHT
+    return terms
+
+
+def adjust_stats(documents, length):
+    """Move the corpus totals; the row is recounted from SearchDocument if missing"""
+    updated = SearchStats.objects.filter(pk=STATS_PK).update(
+        documents=F('documents') + documents, total_length=F('total_length') + length,
+    )
+    if not updated:
+        recount_stats()
+
+
+def recount_stats():
+    totals = SearchDocument.objects.aggregate(documents=Count('pk'), total_length=Sum('length'))
+    SearchStats.objects.update_or_create(pk=STATS_PK, defaults={
+        'documents': totals['documents'], 'total_length': totals['total_length'] or 0,
+    })
+
+
+def index_post(post, tag_names=None):
+    """Replace the postings of one post"""
+    terms = post_terms(post, tag_names)
+    length = sum(terms.values())
+    with transaction.atomic():
+        SearchPosting.objects.filter(post=post).delete()
+        SearchPosting.objects.bulk_create(
+            [SearchPosting(term=term, post=post, frequency=frequency) for term, frequency in terms.items()]
+        )
+        previous = SearchDocument.objects.filter(post=post).values_list('length', flat=True).first()
+        if previous is None:
+            SearchDocument.objects.create(post=post, length=length)
+            adjust_stats(1, length)
+        elif previous != length:
+            SearchDocument.objects.filter(post=post).update(length=length)
+            adjust_stats(0, length - previous)
+
+
+def rebuild(batch_size=500):
+    """Reindex every post; returns the number indexed"""
+    count = 0
+    queryset = Post.objects.prefetch_related('tags').order_by('pk')
+    for post in queryset.iterator(chunk_size=batch_size):
+        index_post(post, [tag.name for tag in post.tags.all()])
+        count += 1
+    recount_stats()
+    return count
+
+
+def search(query, limit=50):
+    """Post ids matching any query term, best BM25 score first"""
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+
+    stats = SearchStats.objects.filter(pk=STATS_PK).values_list('documents', 'total_length').first()
+    total, total_length = stats or (0, 0)
+    average = total_length / total if total else 1
+
+    postings = defaultdict(list)
+    rows = SearchPosting.objects.filter(term__in=terms).values_list(
+        'term', 'post_id', 'frequency', 'post__search_document__length'
+    )
+    for term, post_id, frequency, length in rows:
+        postings[term].append((post_id, frequency, length or 0))
+
+    scores = Counter()
+    for term, matches in postings.items():
+        idf = math.log(1 + (total - len(matches) + 0.5) / (len(matches) + 0.5))
+        for post_id, frequency, length in matches:
+            norm = K1 * (1 - B + B * length / average)
+            scores[post_id] += idf * frequency * (K1 + 1) / (frequency + norm)
+    return [post_id for post_id, _ in scores.most_common(limit)]
+
+
+def search_posts(query, limit=50):
+    """Ranked Post objects for a query"""
+    ids = search(query, limit)
+    posts = Post.objects.select_related('author').in_bulk(ids)
+    return [posts[post_id] for post_id in ids if post_id in posts]
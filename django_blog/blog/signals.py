@@ -1,13 +1,72 @@
 # blog/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from taggit.models import Tag as TaggitTag, TaggedItem
+from .models import Profile, Post, Comment, SearchDocument
+from . import cache, search, tags
+from .deferred import defer
+
+
+def create_profiles(user_ids):
+    """Create missing profiles in one insert; existing ones are left alone"""
+    Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in dict.fromkeys(user_ids)],
+                                ignore_conflicts=True)
+
 
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
-    if created:
-        Profile.objects.create(user=instance)
-    else:
-        # ensure profile exists & save it (safe)
-        Profile.objects.get_or_create(user=instance)
+def create_or_update_user_profile(sender, instance, created, update_fields=None, raw=False, using=None, **kwargs):
+    # partial saves (last_login on every login, password changes) cannot lose a profile;
+    # full saves still make sure users from before this receiver existed get one
+    if raw or update_fields is not None:
+        return
+    defer(create_profiles, instance.pk, using=using)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=SearchDocument)
+def unindex_post(sender, instance, **kwargs):
+    search.adjust_stats(-1, -instance.length)  # also runs when the post's delete cascades
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def reindex_post_tags(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Post):
+        search.index_post(instance)
+        cache.bump(cache.post_scope(instance.pk))
+
+
+@receiver(post_save, sender=TaggitTag)
+def reindex_renamed_tag(sender, instance, created, **kwargs):
+    if not created:
+        for post in Post.objects.filter(tags=instance):
+            search.index_post(post)
+            cache.bump(cache.post_scope(post.pk))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_cache(sender, instance, **kwargs):
+    cache.bump(cache.post_scope(instance.pk), cache.POSTS)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comments_cache(sender, instance, **kwargs):
+    cache.bump(cache.comments_scope(instance.post_id))
+
+
+@receiver(post_save, sender=TaggedItem)
+def count_tagging(sender, instance, created, **kwargs):
+    if created and instance.content_type_id == tags.post_content_type().id:
+        tags.post_tagged(instance.tag_id, instance.object_id)
+
+
+@receiver(post_delete, sender=TaggedItem)
+def uncount_tagging(sender, instance, **kwargs):
+    if instance.content_type_id == tags.post_content_type().id:
+        tags.post_untagged(instance.tag_id, instance.object_id)
@@ -1,4 +1,16 @@
 // Basic example script to demonstrate dynamic behavior
 document.addEventListener('DOMContentLoaded', function() {
     console.log('Blog page loaded');
-});
\ No newline at end of file
+});
+
+// "Load more comments": swap the link for the next page of comments
+document.addEventListener('click', function(event) {
+    var link = event.target.closest('[data-load-more]');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    fetch(link.href, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+        .then(function(response) { return response.text(); })
+        .then(function(html) { link.closest('li').outerHTML = html; });
+});
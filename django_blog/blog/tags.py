@@ -0,0 +1,128 @@
+# blog/tags.py
+"""
+Tag statistics on top of django-taggit.
+
+taggit's Tag/TaggedItem tables are the only source of truth for tags. For each
+tag, TagStat keeps how many posts carry it and the ids of its newest posts.
+The rows are adjusted one tagging at a time from TaggedItem post_save and
+post_delete (blog/signals.py), which fire for add(), remove(), clear(),
+set() and for posts being deleted.
+
+That keeps the tag cloud a single indexed read of TagStat, cached under a
+versioned key, and lets the first page of a tag be served from
+recent_post_ids without touching the tagging tables. Older pages are walked
+with a bounded `object_id < cursor` query.
+"""
+import math
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from taggit.models import Tag, TaggedItem
+
+from .cache import bump, timeout, versions
+from .models import Post, TagStat
+
+RECENT_POSTS = 50
+CLOUD_SIZE = 50
+CLOUD_STEPS = 5
+TAGS = 'tags'  # cache version scope of the tag cloud
+
+
+def post_content_type():
+    return ContentType.objects.get_for_model(Post)
+
+
+def tagged_post_ids(tag_id, before=None, limit=RECENT_POSTS):
+    """Newest post ids carrying a tag, read from taggit's table"""
+    rows = TaggedItem.objects.filter(tag_id=tag_id, content_type=post_content_type())
+    if before is not None:
+        rows = rows.filter(object_id__lt=before)
+    return list(rows.order_by('-object_id').values_list('object_id', flat=True)[:limit])
+
+
+def post_tagged(tag_id, post_id):
+    with transaction.atomic():
+        stat, _ = TagStat.objects.select_for_update().get_or_create(tag_id=tag_id)
+        stat.post_count = F('post_count') + 1
+        if post_id not in stat.recent_post_ids:
+            stat.recent_post_ids = sorted(stat.recent_post_ids + [post_id], reverse=True)[:RECENT_POSTS]
+        stat.save(update_fields=['post_count', 'recent_post_ids'])
+    bump(TAGS)
+
+
+def post_untagged(tag_id, post_id):
+    with transaction.atomic():
+        stat = TagStat.objects.select_for_update().filter(tag_id=tag_id).first()
+        if stat is None:
+            return
+        stat.post_count = Greatest(F('post_count') - 1, Value(0))
+        fields = ['post_count']
+        if post_id in stat.recent_post_ids:
+            # refill from taggit so the list stays full; the row is already gone
+            stat.recent_post_ids = tagged_post_ids(tag_id)
+            fields.append('recent_post_ids')
+        stat.save(update_fields=fields)
+    bump(TAGS)
+
+
+def rebuild():
+    """Recompute every TagStat from taggit's tables; returns the number of tags"""
+    count = 0
+    with transaction.atomic():
+        TagStat.objects.all().delete()
+        content_type = post_content_type()
+        for tag in Tag.objects.filter(taggit_taggeditem_items__content_type=content_type).distinct():
+            TagStat.objects.create(
+                tag=tag,
+                post_count=TaggedItem.objects.filter(tag=tag, content_type=content_type).count(),
+                recent_post_ids=tagged_post_ids(tag.pk),
+            )
+            count += 1
+    bump(TAGS)
+    return count
+
+
+def tag_page(tag, before=None, size=10):
+    """
+    Posts of a tag, newest first, and the cursor of the next page (or None).
+
+    The first page comes from TagStat.recent_post_ids; later pages continue
+    below the last id shown.
+    """
+    stat = TagStat.objects.filter(tag=tag).first()
+    if before is None and stat is not None and (len(stat.recent_post_ids) > size or stat.post_count <= size):
+        ids = stat.recent_post_ids[:size + 1]
+    else:
+        ids = tagged_post_ids(tag.pk, before=before, limit=size + 1)
+
+    posts = Post.objects.select_related('author').in_bulk(ids[:size])
+    page = [posts[post_id] for post_id in ids[:size] if post_id in posts]
+    next_cursor = ids[size - 1] if len(ids) > size else None
+    return page, next_cursor
+
+
+def cloud():
+    """The CLOUD_SIZE most used tags with a 1..CLOUD_STEPS weight, cached until tags change"""
+    (version,) = versions(TAGS)
+    key = f'blog:tag-cloud:{version}'
+    entries = cache.get(key)
+    if entries is None:
+        stats = list(
+            TagStat.objects.filter(post_count__gt=0).select_related('tag')
+            .order_by('-post_count')[:CLOUD_SIZE]
+        )
+        top = math.log(stats[0].post_count + 1) if stats else 1
+        entries = [
+            {
+                'name': stat.tag.name,
+                'slug': stat.tag.slug,
+                'count': stat.post_count,
+                'weight': 1 + round((CLOUD_STEPS - 1) * math.log(stat.post_count + 1) / top),
+            }
+            for stat in sorted(stats, key=lambda stat: stat.tag.name.lower())
+        ]
+        cache.set(key, entries, timeout())
+    return entries
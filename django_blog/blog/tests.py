@@ -1,3 +1,199 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from .models import Post, Comment, Profile, SearchDocument, SearchPosting, SearchStats, TagStat
+from . import search, tags
 
 # Create your tests here.
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.title_hit = Post.objects.create(title='Django caching', content='Notes on views.', author=self.author)
+        self.body_hit = Post.objects.create(title='Weekly notes', content='Some caching tips and more caching.', author=self.author)
+        self.other = Post.objects.create(title='Gardening', content='Tomatoes.', author=self.author)
+
+    def test_ranked_by_bm25(self):
+        self.assertEqual(search.search('caching'), [self.title_hit.id, self.body_hit.id])
+
+    def test_tags_are_indexed(self):
+        self.other.tags.add('Python')
+        self.assertEqual(search.search('python'), [self.other.id])
+        self.other.tags.clear()
+        self.assertEqual(search.search('python'), [])
+
+    def test_edit_and_delete_update_the_index(self):
+        self.other.content = 'Caching compost.'
+        self.other.save()
+        self.assertIn(self.other.id, search.search('compost'))
+        self.other.delete()
+        self.assertFalse(SearchPosting.objects.filter(term='compost').exists())
+
+    def test_corpus_stats_follow_the_documents(self):
+        self.other.content = 'A much longer body about tomatoes and peppers.'
+        self.other.save()
+        self.title_hit.delete()
+        stats = SearchStats.objects.get()
+        lengths = list(SearchDocument.objects.values_list('length', flat=True))
+        self.assertEqual((stats.documents, stats.total_length), (len(lengths), sum(lengths)))
+
+    def test_search_view_reads_only_the_index(self):
+        with self.assertNumQueries(3):  # corpus stats, postings, posts
+            response = self.client.get(reverse('search_results'), {'q': 'django caching'})
+        self.assertEqual(list(response.context['results']), [self.title_hit, self.body_hit])
+        self.assertEqual(response.context['query'], 'django caching')
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.post = Post.objects.create(title='Cached', content='Body text.', author=self.author)
+        self.post.tags.add('django')
+        self.url = reverse('post_detail', kwargs={'pk': self.post.pk})
+
+    def test_anonymous_detail_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+
+    def test_versions_are_bumped_by_writes(self):
+        self.client.get(self.url)
+        Comment.objects.create(post=self.post, author=self.author, content='First!')
+        self.assertContains(self.client.get(self.url), 'First!')
+
+        self.post.tags.add('caching')
+        self.assertContains(self.client.get(self.url), 'caching')
+
+        self.post.title = 'Renamed'
+        self.post.save()
+        self.assertContains(self.client.get(reverse('posts')), 'Renamed')
+        self.assertContains(self.client.get(self.url), 'Renamed')
+
+    def test_logged_in_readers_bypass_page_cache(self):
+        self.client.get(self.url)
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(self.url), 'Leave a comment')
+
+
+class PostDetailQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.readers = [User.objects.create_user(username=f'reader{i}', password='pass12345') for i in range(5)]
+        self.post = Post.objects.create(title='Popular', content='Body.', author=self.readers[0])
+        self.post.tags.add('django', 'performance')
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.readers[i % 5], content=f'Comment {i}') for i in range(1200)
+        )
+        cache.clear()
+
+    def test_query_count_is_fixed_for_1000_plus_comments(self):
+        with self.assertNumQueries(4):  # post + author, tags, first comment page + authors, comment count
+            response = self.client.get(reverse('post_detail', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.context['comment_count'], 1200)
+        self.assertContains(response, 'Comments (1200)')
+        self.assertContains(response, 'reader4')
+        self.assertEqual(len(response.context['comments']), 20)  # first page only
+        self.assertContains(response, 'data-load-more')
+
+    def test_load_more_walks_every_comment(self):
+        url = reverse('comment_list', kwargs={'pk': self.post.pk})
+        seen, cursor = [], ''
+        for _ in range(100):
+            data = self.client.get(url, {'format': 'json', 'after': cursor}).json()
+            seen += [comment['id'] for comment in data['comments']]
+            cursor = data['next']
+            if not cursor:
+                break
+        self.assertEqual(seen, list(Comment.objects.filter(post=self.post).order_by('created_at', 'id').values_list('id', flat=True)))
+
+    def test_load_more_fragment(self):
+        response = self.client.get(reverse('comment_list', kwargs={'pk': self.post.pk}))
+        self.assertContains(response, 'class="comment"', count=20)
+        self.assertContains(response, 'data-load-more')
+        self.assertEqual(self.client.get(reverse('comment_list', kwargs={'pk': 9999})).status_code, 404)
+
+
+class TagStatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.posts = [Post.objects.create(title=f'Post {i}', content='Body.', author=self.author) for i in range(15)]
+        for post in self.posts:
+            post.tags.add('django')
+        self.posts[0].tags.add('rare')
+
+    def stat(self, slug):
+        return TagStat.objects.get(tag__slug=slug)
+
+    def test_counts_and_recent_ids_follow_taggings(self):
+        self.assertEqual(self.stat('django').post_count, 15)
+        self.assertEqual(self.stat('django').recent_post_ids[:2], [self.posts[14].pk, self.posts[13].pk])
+
+        self.posts[14].tags.remove('django')
+        self.posts[13].delete()
+        stat = self.stat('django')
+        self.assertEqual(stat.post_count, 13)
+        self.assertEqual(stat.recent_post_ids[0], self.posts[12].pk)
+
+    def test_tag_pages_are_bounded(self):
+        url = reverse('tag_posts', kwargs={'tag_slug': 'django'})
+        response = self.client.get(url)
+        first = list(response.context['posts'])
+        self.assertEqual(first, self.posts[14:4:-1])
+
+        response = self.client.get(url, {'before': response.context['next_cursor']})
+        self.assertEqual(list(response.context['posts']), self.posts[4::-1])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_cloud_is_cached_until_tags_change(self):
+        self.client.get(reverse('tag_cloud'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('tag_cloud'))
+        self.assertEqual([(tag['name'], tag['count']) for tag in response.context['tags']], [('django', 15), ('rare', 1)])
+
+        self.posts[1].tags.add('rare')
+        response = self.client.get(reverse('tag_cloud'))
+        self.assertEqual(response.context['tags'][1]['count'], 2)
+
+    def test_rebuild_matches_incremental_stats(self):
+        before = {stat.tag_id: (stat.post_count, stat.recent_post_ids) for stat in TagStat.objects.all()}
+        tags.rebuild()
+        after = {stat.tag_id: (stat.post_count, stat.recent_post_ids) for stat in TagStat.objects.all()}
+        self.assertEqual(before, after)
+
+class DeferredProfileTests(TestCase):
+    def test_profiles_are_created_in_one_batch_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            users = [User.objects.create_user(username=f'user{i}', password='pass12345') for i in range(3)]
+            self.assertFalse(Profile.objects.exists())
+        with self.assertNumQueries(1):  # one bulk insert; the other callbacks are the items' markers
+            for callback in callbacks:
+                callback()
+        self.assertEqual(set(Profile.objects.values_list('user_id', flat=True)), {user.id for user in users})
+
+    def test_partial_saves_queue_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user(username='user', password='pass12345')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.login(username='user', password='pass12345')  # saves last_login only
+            user.save(update_fields=['email'])
+        self.assertEqual(callbacks, [])
+
+    def test_full_save_backfills_a_missing_profile(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user(username='user', password='pass12345')
+        Profile.objects.filter(user=user).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+            user.save()
+        self.assertEqual(Profile.objects.filter(user=user).count(), 1)
+
+    def test_saves_run_no_profile_queries(self):
+        user = User.objects.create_user(username='user', password='pass12345')
+        with self.assertNumQueries(1):  # the UPDATE itself
+            user.save()
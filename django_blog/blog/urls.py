@@ -17,11 +17,13 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('profile/', views.profile_view, name='profile'),
     
+    path('post/<int:pk>/comments/', views.comment_list, name='comment_list'),
     path('post/<int:pk>/comments/new/', views.CommentCreateView.as_view(), name='comment_create'),
     path('comment/<int:pk>/update/', views.CommentUpdateView.as_view(), name='comment_update'),
     path('comment/<int:pk>/delete/', views.CommentDeleteView.as_view(), name='comment_delete'),
 
     path("search/", views.SearchResultsView.as_view(), name="search_results"),
+    path("tags/", views.tag_cloud, name="tag_cloud"),
     path("tags/<slug:tag_slug>/", views.PostByTagListView.as_view(), name="tag_posts"),
 
 ]
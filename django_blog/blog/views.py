@@ -3,8 +3,12 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .forms import SignupForm, LoginForm, ProfileForm, PostForm, CommentForm
-from .models import Profile, Post, Comment, Tag
-from django.db.models import Q
+from .models import Profile, Post, Comment
+from taggit.models import Tag
+from django.http import Http404, JsonResponse
+from . import search, tags
+from .pagination import comment_page
+from .cache import AnonymousPageCacheMixin, comments_scope, fragment_versions, post_scope, timeout
 from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
@@ -74,7 +78,7 @@ def profile_view(request):
 
 # here goes the CRUD oppresion for the post model
 
-class PostListView(ListView):
+class PostListView(AnonymousPageCacheMixin, ListView):
     model = Post
     template_name = 'blog/posts_list.html'   # adjust if you use a different path
     context_object_name = 'posts'
@@ -82,16 +86,28 @@ class PostListView(ListView):
     paginate_by = 10
 
 
-class PostDetailView(DetailView):
+class PostDetailView(AnonymousPageCacheMixin, DetailView):
     model = Post
     template_name = 'blog/post_detail.html'
     context_object_name = 'post'
 
+    def page_cache_scopes(self):
+        return [post_scope(self.kwargs['pk']), comments_scope(self.kwargs['pk'])]
+
+    def get_queryset(self):
+        return Post.objects.select_related('author').prefetch_related('tags')
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         post = self.object  # the Post instance
-        ctx['comments'] = post.comments.select_related('author').all()
+        # only the first page of comments; the rest is fetched from comment_list
+        ctx['comments'], ctx['next_cursor'] = comment_page(post.pk)
+        ctx['comment_count'] = post.comments.count()
+        ctx['post_pk'] = post.pk
+        ctx['tags'] = post.tags.all()  # prefetched
         ctx['comment_form'] = CommentForm()
+        ctx['cache_timeout'] = timeout()
+        ctx.update(fragment_versions(post.pk))  # keys for the {% cache %} fragments
         return ctx
 
 
@@ -132,6 +148,30 @@ class PostDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         post = self.get_object()
         return self.request.user == post.author
 
+def comment_list(request, pk):
+    """Next page of a post's comments: an HTML fragment, or JSON with ?format=json"""
+    if not Post.objects.filter(pk=pk).exists():
+        raise Http404("Post not found")
+    comments, next_cursor = comment_page(pk, request.GET.get('after'))
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'content': comment.content,
+                    'created_at': comment.created_at.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next': next_cursor,
+        })
+    return render(request, 'blog/comment_items.html', {
+        'comments': comments, 'next_cursor': next_cursor, 'post_pk': pk,
+    })
+
+
 # Create comment (nested under a post)
 class CommentCreateView(LoginRequiredMixin, CreateView):
     model = Comment
@@ -179,24 +219,39 @@ class CommentDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
 class SearchResultsView(ListView):
     model = Post
     template_name = "blog/search_results.html"
-    context_object_name = "posts"
+    context_object_name = "results"
 
     def get_queryset(self):
-        query = self.request.GET.get("q")
-        if query:
-            return Post.objects.filter(
-                Q(title__icontains=query) |
-                Q(content__icontains=query) |
-                Q(tags__name__icontains=query)
-            ).distinct()
-        return Post.objects.none()
+        # ranked lookup in the inverted index, see blog/search.py
+        return search.search_posts(self.request.GET.get("q", ""))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.request.GET.get("q", "")
+        return context
 
 
 class  PostByTagListView(ListView):
     model = Post
-    template_name = "blog/tag_posts.html"
+    template_name = "blog/posts_by_tag.html"
     context_object_name = "posts"
+    page_size = 10
 
     def get_queryset(self):
-        tag_slug = self.kwargs['tag_slug']
-        return Post.objects.filter(tags__slug=tag_slug)
+        self.tag = get_object_or_404(Tag, slug=self.kwargs['tag_slug'])
+        try:
+            before = int(self.request.GET['before'])
+        except (KeyError, ValueError):
+            before = None
+        posts, self.next_cursor = tags.tag_page(self.tag, before, self.page_size)
+        return posts
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["tag"] = self.tag
+        context["next_cursor"] = self.next_cursor
+        return context
+
+
+def tag_cloud(request):
+    return render(request, 'blog/tag_cloud.html', {'tags': tags.cloud()})
@@ -141,6 +141,20 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Rendered pages and fragments (blog/cache.py). Any backend works; set
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache and
+# CACHE_LOCATION=/var/tmp/django_blog to share the cache between processes
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'django-blog'),
+    }
+}
+BLOG_CACHE_TIMEOUT = int(os.environ.get('BLOG_CACHE_TIMEOUT', 600))
+
+# Comments rendered with a post and returned per "load more" request
+BLOG_COMMENTS_PAGE_SIZE = 20
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
@@ -0,0 +1,215 @@
+# accounts/authentication.py
+"""
+Token authentication without a database round-trip per request.
+
+CachedTokenAuthentication keeps validated (user, token) pairs in a shared
+Django cache, in front of which every process keeps a small LRU. Only misses
+reach Token.objects.select_related('user'). accounts/signals.py revokes
+entries when a token is deleted or its user is saved (deactivation, password
+change). Every request gets its own copy of the cached user and token, so
+code that changes request.user (last_login, profile saves) never races other
+threads.
+
+Revoking bumps a per-token revision in the shared cache, and a shared entry
+is only trusted while it carries the current revision (both come back in one
+get_many). A worker that read the token from the database just before the
+revocation therefore cannot put the old user back. Entries in the per-process
+LRU are not checked: the revoking process drops its own, but a revoked token
+keeps working for up to LOCAL_TTL seconds on workers that already had it in
+memory. Without a shared cache that holds for the whole lifetime of an entry,
+so the system check rejects a per-process SHARED_CACHE; set it to None to
+cache in each process for LOCAL_TTL seconds only.
+
+The shared tier is only worth it when it is cheaper than the token query it
+saves, i.e. Redis or Memcached. A DatabaseCache costs a query per hit and
+three per miss, so one is ignored as if SHARED_CACHE were None: past
+LOCAL_TTL a request goes back to the plain Token lookup.
+
+Settings (TOKEN_AUTH_CACHE):
+    MAX_SIZE      entries kept per process
+    TTL           seconds an entry is trusted in the shared cache
+    LOCAL_TTL     seconds an entry is trusted in the per-process LRU
+    SHARED_CACHE  alias from CACHES for the shared tier, or None
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from social_media_api.shared_cache import SHARED, check_alias
+
+DEFAULTS = {
+    'MAX_SIZE': 10000,
+    'TTL': 300,
+    'LOCAL_TTL': 5,
+    'SHARED_CACHE': SHARED,
+}
+
+
+def _config(key):
+    return getattr(settings, 'TOKEN_AUTH_CACHE', {}).get(key, DEFAULTS[key])
+
+
+@checks.register(checks.Tags.caches)
+def check_token_cache(app_configs, **kwargs):
+    alias = _config('SHARED_CACHE')
+    if alias is None:
+        return []
+    return check_alias(
+        "TOKEN_AUTH_CACHE['SHARED_CACHE']", alias, 'accounts.E003', 'accounts.E004',
+        'Revoked tokens would keep authenticating on other workers for up to TTL seconds.',
+    )
+
+
+def _copies(user, token):
+    user, token = copy.copy(user), copy.copy(token)
+    token.user = user
+    return user, token
+
+
+class TokenCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, user, token)
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _shared(self):
+        alias = _config('SHARED_CACHE')
+        if alias is None or isinstance(caches[alias], DatabaseCache):
+            return None
+        return caches[alias]
+
+    def _shared_key(self, key):
+        return f'accounts:token:{key}'
+
+    def _revision_key(self, key):
+        return f'accounts:token:revision:{key}'
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _copies(entry[1], entry[2])
+                del self._entries[key]
+
+        shared = self._shared()
+        if shared is not None:
+            found = shared.get_many([self._shared_key(key), self._revision_key(key)])
+            cached = found.get(self._shared_key(key))
+            if cached is not None and cached[0] == found.get(self._revision_key(key)):
+                _, user, token = cached
+                self._store(key, user, token)
+                with self._lock:
+                    self.shared_hits += 1
+                return _copies(user, token)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def revision(self, key):
+        """
+        Current revision of a token in the shared cache; read it before the
+        database so an entry built from rows a revocation has since replaced
+        is never trusted
+        """
+        shared = self._shared()
+        if shared is None:
+            return None
+        revision_key = self._revision_key(key)
+        revision = shared.get(revision_key)
+        if revision is None:
+            shared.add(revision_key, time.time_ns(), timeout=None)
+            revision = shared.get(revision_key)
+        return revision
+
+    def contains(self, key, user_id):
+        """True while this process holds an unexpired entry for key and user; no stats"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic() and entry[1].pk == user_id
+
+    def set(self, key, user, token, revision=None):
+        """Cache a pair read from the database, tagged with the revision read before it (default: now)"""
+        user, token = _copies(user, token)  # the caller keeps using its own instances
+        self._store(key, user, token)
+        shared = self._shared()
+        if shared is not None:
+            if revision is None:
+                revision = self.revision(key)
+            shared.set(self._shared_key(key), (revision, user, token), timeout=_config('TTL'))
+
+    def _store(self, key, user, token):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + _config('LOCAL_TTL'), user, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > _config('MAX_SIZE'):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        """Revoke tokens in every process; other workers' LRUs follow within LOCAL_TTL"""
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        shared = self._shared()
+        if shared is not None and keys:
+            revision = time.time_ns()
+            shared.set_many({self._revision_key(key): revision for key in keys}, timeout=None)
+            shared.delete_many([self._shared_key(key) for key in keys])
+
+    def invalidate_user(self, user_id):
+        """Revoke every token of a user"""
+        with self._lock:
+            keys = {key for key, entry in self._entries.items() if entry[1].pk == user_id}
+        if self._shared() is not None:
+            keys.update(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+        self.invalidate(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            'size': size,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+        }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        revision = token_cache.revision(key)
+        user, token = super().authenticate_credentials(key)  # raises AuthenticationFailed
+        token_cache.set(key, user, token, revision)
+        return user, token
@@ -0,0 +1,128 @@
+# accounts/graph.py
+"""
+Cached adjacency sets for the follow graph.
+
+For every user the cache holds two ID sets read straight off the
+User.followers through table (from_user -> to_user):
+
+    followers  ids in user.followers   (rows where from_user = user)
+    following  ids in user.following   (rows where to_user = user)
+
+plus the size of the first one, which timelines use to decide whether an
+author is fanned out. A cold key is loaded for many users with one query, and
+accounts/signals.py drops the affected keys whenever the through table
+changes. Single membership checks do not load a set at all (a popular user's
+would have to be fetched and unpickled whole): is_edge() asks the through
+table's unique (from_user, to_user) index.
+
+A follow handled by one worker has to invalidate the sets every other worker
+reads (fan-out, counts, is_following), so they live in the FOLLOW_GRAPH_CACHE
+cache, shared by every process; a system check rejects a per-process
+LocMemCache.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.db.models import Count
+
+from social_media_api.shared_cache import check_shared, shared_cache
+
+FOLLOWERS = 'followers'
+FOLLOWING = 'following'
+FOLLOWER_COUNT = 'follower_count'
+
+
+def graph_cache():
+    return shared_cache('FOLLOW_GRAPH_CACHE')
+
+
+@checks.register(checks.Tags.caches)
+def check_graph_cache(app_configs, **kwargs):
+    return check_shared(
+        'FOLLOW_GRAPH_CACHE', 'accounts.E001', 'accounts.E002',
+        'Follows and unfollows would only invalidate the adjacency sets of the worker that handled '
+        'them, so the others would fan out and count from a stale graph.',
+    )
+
+
+def _through():
+    return get_user_model().followers.through
+
+
+def _timeout():
+    return getattr(settings, 'FOLLOW_GRAPH_CACHE_TIMEOUT', 3600)
+
+
+def _key(kind, user_id):
+    return f'accounts:graph:{kind}:{user_id}'
+
+
+def _load_sets(kind, user_ids):
+    """Map each user id to a frozenset of neighbour ids, filling cache misses with one query"""
+    user_ids = set(user_ids)
+    keys = {_key(kind, user_id): user_id for user_id in user_ids}
+    cache = graph_cache()
+    cached = cache.get_many(keys)
+    found = {keys[key]: value for key, value in cached.items()}
+
+    missing = user_ids - found.keys()
+    if missing:
+        owner, other = ('from_user_id', 'to_user_id') if kind == FOLLOWERS else ('to_user_id', 'from_user_id')
+        loaded = {user_id: set() for user_id in missing}
+        rows = _through().objects.filter(**{f'{owner}__in': missing}).values_list(owner, other)
+        for user_id, neighbour_id in rows.iterator(chunk_size=2000):
+            loaded[user_id].add(neighbour_id)
+        loaded = {user_id: frozenset(ids) for user_id, ids in loaded.items()}
+        cache.set_many({_key(kind, user_id): ids for user_id, ids in loaded.items()}, timeout=_timeout())
+        found.update(loaded)
+    return found
+
+
+def is_edge(from_user_id, to_user_id):
+    """True when to_user_id is in from_user.followers"""
+    return _through().objects.filter(from_user_id=from_user_id, to_user_id=to_user_id).exists()
+
+
+def follower_ids(user_id):
+    """IDs in user.followers"""
+    return _load_sets(FOLLOWERS, [user_id])[user_id]
+
+
+def following_ids(user_id):
+    """IDs in user.following"""
+    return _load_sets(FOLLOWING, [user_id])[user_id]
+
+
+def follower_counts(user_ids):
+    """Map each user id to len(user.followers) without loading the sets themselves"""
+    user_ids = set(user_ids)
+    keys = {_key(FOLLOWER_COUNT, user_id): user_id for user_id in user_ids}
+    cache = graph_cache()
+    counts = {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+    missing = user_ids - counts.keys()
+    if missing:
+        loaded = dict.fromkeys(missing, 0)
+        rows = (
+            _through().objects.filter(from_user_id__in=missing)
+            .values('from_user_id').annotate(total=Count('id'))
+            .values_list('from_user_id', 'total')
+        )
+        loaded.update(rows)
+        cache.set_many({_key(FOLLOWER_COUNT, user_id): total for user_id, total in loaded.items()}, timeout=_timeout())
+        counts.update(loaded)
+    return counts
+
+
+def follower_count(user_id):
+    return follower_counts([user_id])[user_id]
+
+
+def forget(from_user_ids, to_user_ids):
+    """Drop cached sets touched by through rows between these users"""
+    keys = []
+    for user_id in from_user_ids:
+        keys += [_key(FOLLOWERS, user_id), _key(FOLLOWER_COUNT, user_id)]
+    for user_id in to_user_ids:
+        keys.append(_key(FOLLOWING, user_id))
+    graph_cache().delete_many(keys)
@@ -0,0 +1,161 @@
+# accounts/login.py
+"""
+Login fast path.
+
+A login should cost one password hash check and nothing else on the request
+path. Three things used to ride along with it:
+
+- last_login. It is recorded in LastLoginBuffer, a WriteBuffer like the one
+  for likes, and written for every user who logged in since the last flush
+  with one bulk UPDATE. Session logins go the same way: accounts/signals.py
+  swaps Django's update_last_login receiver for the buffered one.
+- The token. User id -> token key is cached after the first login, so later
+  logins skip Token.objects.get_or_create(). Deleting a token evicts it. A
+  cached key is only handed out while the token auth cache
+  (accounts/authentication.py) still holds it too, so a token deleted by
+  another process stops being handed out once that cache's TTL runs out,
+  just as it stops authenticating.
+- Hash upgrades. When PASSWORD_HASHERS or the PBKDF2 iteration count changes,
+  Django re-hashes the password (a second full hash) and saves it during the
+  login that notices. User.check_password() hands the upgrade to
+  password_upgrades instead. One background thread re-hashes and writes it,
+  but only if the stored hash has not changed since the login read it. At
+  most MAX_PENDING_UPGRADES jobs (each holding a raw password) wait at once;
+  further ones are dropped, and the user's next login schedules them again.
+
+LoginApiView reports the time spent in each stage through the request
+instrumentation (Server-Timing and /metrics/) on sampled requests.
+
+Settings (LOGIN_FAST_PATH):
+    TOKEN_CACHE_TIMEOUT     seconds a user's token key stays cached
+    DEFER_HASH_UPGRADES     False re-hashes on the request path, as Django does
+    MAX_PENDING_UPGRADES    hash upgrades queued at most
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from social_media_api.buffering import WriteBuffer
+
+from .authentication import token_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TOKEN_CACHE_TIMEOUT': 3600,
+    'DEFER_HASH_UPGRADES': True,
+    'MAX_PENDING_UPGRADES': 100,
+}
+
+
+def _config(key):
+    return getattr(settings, 'LOGIN_FAST_PATH', {}).get(key, DEFAULTS[key])
+
+
+class LastLoginBuffer(WriteBuffer):
+    setting_name = 'LAST_LOGIN_BUFFER'
+    defaults = {
+        'ENABLED': True,
+        'MAX_SIZE': 1000,
+        'FLUSH_INTERVAL': 5.0,
+    }
+
+    def merge(self, pending, key, value):
+        pending[key] = max(value, pending.get(key, value))
+
+    def record(self, user_id, when=None):
+        when = when or timezone.now()
+        if self.enabled:
+            self.add(user_id, when)
+        else:
+            self.write({user_id: when})
+
+    def write(self, batch):
+        User = get_user_model()
+        User.objects.bulk_update(
+            [User(pk=user_id, last_login=when) for user_id, when in batch.items()],
+            ['last_login'],
+            batch_size=500,
+        )
+
+
+last_logins = LastLoginBuffer()
+
+
+def _token_cache_key(user_id):
+    return f'accounts:login-token:{user_id}'
+
+
+def token_key(user):
+    """The user's token key, created on first use"""
+    key = cache.get(_token_cache_key(user.pk))
+    if key is not None and token_cache.contains(key, user.pk):
+        return key
+    token = Token.objects.get_or_create(user=user)[0]
+    token_cache.set(token.key, user, token)  # the client authenticates with it next
+    cache.set(_token_cache_key(user.pk), token.key, timeout=_config('TOKEN_CACHE_TIMEOUT'))
+    return token.key
+
+
+def forget_token(user_id):
+    cache.delete(_token_cache_key(user_id))
+
+
+class PasswordUpgrades:
+    """Re-hash passwords stored with outdated hasher settings, off the request path"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = None
+        self.upgraded = 0
+        self.skipped = 0
+        self.dropped = 0
+
+    def schedule(self, user_id, encoded, raw_password):
+        if not _config('DEFER_HASH_UPGRADES'):
+            self.upgrade(user_id, encoded, raw_password)
+            return
+        with self._lock:
+            if user_id in self._pending:
+                return  # a login storm needs one upgrade, not one per request
+            if len(self._pending) >= _config('MAX_PENDING_UPGRADES'):
+                self.dropped += 1  # the next login schedules it again
+                return
+            self._pending.add(user_id)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-upgrade')
+        self._executor.submit(self._run, user_id, encoded, raw_password)
+
+    def upgrade(self, user_id, encoded, raw_password):
+        """Store a fresh hash unless the password changed meanwhile; True if written"""
+        updated = get_user_model().objects.filter(pk=user_id, password=encoded).update(
+            password=make_password(raw_password)
+        )
+        with self._lock:
+            if updated:
+                self.upgraded += 1
+            else:
+                self.skipped += 1
+        return bool(updated)
+
+    def _run(self, user_id, encoded, raw_password):
+        try:
+            self.upgrade(user_id, encoded, raw_password)
+        except Exception:
+            logger.exception('Password hash upgrade for user %s failed', user_id)
+        finally:
+            with self._lock:
+                self._pending.discard(user_id)
+            connection.close()  # the worker thread owns its own DB connection
+
+
+password_upgrades = PasswordUpgrades()
@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import signal_audit  # this app's signal_audit.py
+
+
+class Command(BaseCommand):
+    help = ('List the receivers of every model signal and time what the save receivers add to each save '
+            '(inside a transaction that is rolled back)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', dest='models', metavar='APP_LABEL.MODEL',
+                            help='Only audit this model (repeatable)')
+        parser.add_argument('--samples', type=int, default=20, help='Rows of each model to time saves with')
+        parser.add_argument('--update-fields', help='Time saves with these update_fields, comma separated, '
+                                                     'e.g. last_login')
+        parser.add_argument('--no-timing', action='store_true', help='Only list the receivers')
+
+    def handle(self, *args, **options):
+        try:
+            models = [apps.get_model(label) for label in options['models'] or []]
+        except (LookupError, ValueError) as error:
+            raise CommandError(str(error))
+        update_fields = [name for name in (options['update_fields'] or '').split(',') if name]
+
+        for label, receivers in sorted(signal_audit.receivers(models).items()):
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            timings = {}
+            if not options['no_timing']:
+                model = apps.get_model(label)
+                timings = {(row['signal'], row['receiver']): row
+                           for row in signal_audit.measure(model, options['samples'], update_fields)}
+            for name, receiver in receivers:
+                row = timings.get((name, receiver))
+                cost = f"{row['ms']:>9.3f} ms {row['queries']:>6.2f} queries" if row else ''
+                self.stdout.write(f'  {name:<12} {receiver:<70} {cost}'.rstrip())
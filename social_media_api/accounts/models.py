@@ -1,6 +1,9 @@
 from django.db import models
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractUser
 
+from . import graph
+
 # Create your models here.
 
 class User(AbstractUser):
@@ -11,6 +14,17 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+    def check_password(self, raw_password):
+        """As Django's, but outdated hashes are upgraded in the background (accounts/login.py)"""
+        from .login import password_upgrades
+
+        encoded = self.password
+
+        def setter(raw_password):
+            password_upgrades.schedule(self.pk, encoded, raw_password)
+
+        return check_password(raw_password, encoded, setter)
     
     def follow(self, user):
         """Follow another user"""
@@ -24,11 +38,11 @@ class User(AbstractUser):
 
     def is_following(self, user):
         """Check if following"""
-        return self.followers.filter(id=user.id).exists()
+        return graph.is_edge(self.id, user.id)
     
     def follower_count(self):
         """Return number of followers"""
-        return self.followers.count()
+        return graph.follower_count(self.id)
     
     def following_list(self):
         """Return list of users this user is following"""
@@ -36,6 +50,6 @@ class User(AbstractUser):
 
     def is_followed_by(self, user):
         """Check if user is followed by someone"""
-        return user.followers.filter(id=self.id).exists()
+        return graph.is_edge(user.id, self.id)
     
 
@@ -4,6 +4,8 @@ from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate, get_user_model
 from rest_framework.authtoken.models import Token
 
+from . import graph
+
 
 User = get_user_model()
 
@@ -27,7 +29,7 @@ class UserRegistration(serializers.ModelSerializer):
             email=validated_data.get('email'),
             password=validated_data['password']
         )
-        Token.objects.create(user=user)
+        Token.objects.get_or_create(user=user)  # accounts.signals may have created it already
         return user
         
      def validate_password(self, value):
@@ -85,15 +87,33 @@ class LoginSerializer(serializers.Serializer):
 class UserDetailSerializer(serializers.ModelSerializer):
     followers = serializers.SerializerMethodField()
     following = serializers.SerializerMethodField()
+    follower_count = serializers.SerializerMethodField()
+    following_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'bio', 'profile_picture', 'followers', 'following']
+        fields = ['id', 'username', 'bio', 'profile_picture', 'followers', 'following', 'follower_count', 'following_count']
+
+    # the first usernames of each list; /accounts/followers/ and /accounts/following/ page through all of them
+    edge_list_limit = 100
+
+    def _usernames(self, users):
+        return list(users.order_by('id').values_list('username', flat=True)[:self.edge_list_limit])
 
     def get_followers(self, obj):
-        return [follower.username for follower in obj.followers.all()]
+        return self._usernames(obj.followers.all())
 
     def get_following(self, obj):
-        return [followed.username for followed in obj.following.all()]
+        return self._usernames(obj.following.all())
+
+    def get_follower_count(self, obj):
+        return graph.follower_count(obj.id)
+
+    def get_following_count(self, obj):
+        return len(graph.following_ids(obj.id))
+
+
+class BulkFollowSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=500)
     
 
@@ -0,0 +1,105 @@
+"""
+Audit of model signal receivers.
+
+receivers() lists every live receiver of Django's model signals, per model
+(m2m_changed receivers are listed under the through model they listen to).
+
+measure() times what the pre_save and post_save receivers of a model add to
+a save of an existing row. For up to `samples` rows, each receiver is called
+with the arguments save() would pass it, inside a transaction that is rolled
+back afterwards, and its wall time and query count are averaged. Work a
+receiver defers to commit (deferred.py, defer()) never runs there and so
+is not counted, which is the point of deferring it. Cache writes made by
+receivers are not rolled back.
+"""
+import time
+
+import django
+from django.apps import apps
+from django.db import connections, router, transaction
+from django.db.models import signals
+
+SIGNALS = {
+    'pre_save': signals.pre_save,
+    'post_save': signals.post_save,
+    'pre_delete': signals.pre_delete,
+    'post_delete': signals.post_delete,
+    'm2m_changed': signals.m2m_changed,
+}
+SAVE_SIGNALS = ('pre_save', 'post_save')
+
+
+def describe(receiver):
+    name = getattr(receiver, '__qualname__', None) or type(receiver).__qualname__
+    return f'{receiver.__module__}.{name}'
+
+
+def live_receivers(signal, sender):
+    """
+    The receivers signal.send(sender) would call. Django has no public API
+    for this; Signal._live_receivers() returns a list up to 4.2 and a pair
+    of (sync, async) lists from 5.0 (checked through 5.2).
+    """
+    found = signal._live_receivers(sender)
+    if django.VERSION[:2] >= (5, 0):
+        if not (isinstance(found, tuple) and len(found) == 2):
+            raise RuntimeError(f'Signal._live_receivers() changed in Django {django.get_version()}; '
+                               f'update {__name__}.live_receivers().')
+        found = [*found[0], *found[1]]
+    return list(found)
+
+
+def receivers(models=None):
+    """{model label: [(signal name, receiver name)]} for models with receivers"""
+    found = {}
+    for model in models or apps.get_models(include_auto_created=True):
+        for name, signal in SIGNALS.items():
+            for receiver in live_receivers(signal, model):
+                found.setdefault(model._meta.label, []).append((name, describe(receiver)))
+    return found
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(model, samples=20, update_fields=None):
+    """
+    Average cost of each save receiver of `model` per save, as a list of
+    {'signal', 'receiver', 'calls', 'ms', 'queries'}; empty without rows.
+    """
+    using = router.db_for_write(model)
+    counter = QueryCounter()
+    totals = {}
+    with connections[using].execute_wrapper(counter), transaction.atomic(using=using):
+        for instance in model._default_manager.using(using).order_by('pk')[:samples]:
+            for name in SAVE_SIGNALS:
+                signal = SIGNALS[name]
+                arguments = {
+                    'instance': instance,
+                    'raw': False,
+                    'using': using,
+                    'update_fields': frozenset(update_fields) if update_fields else None,
+                }
+                if name == 'post_save':
+                    arguments['created'] = False
+                for receiver in live_receivers(signal, model):
+                    queries = counter.count
+                    started = time.perf_counter()
+                    receiver(signal=signal, sender=model, **arguments)
+                    entry = totals.setdefault((name, describe(receiver)), [0, 0.0, 0])
+                    entry[0] += 1
+                    entry[1] += time.perf_counter() - started
+                    entry[2] += counter.count - queries
+        transaction.set_rollback(True, using=using)
+
+    return [
+        {'signal': name, 'receiver': receiver, 'calls': calls,
+         'ms': round(seconds * 1000 / calls, 3), 'queries': round(queries / calls, 2)}
+        for (name, receiver), (calls, seconds, queries) in totals.items()
+    ]
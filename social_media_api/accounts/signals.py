@@ -1,10 +1,74 @@
 # accounts/signals.py
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
+from social_media_api.deferred import defer, only_touches
+
+from . import graph, login
+from .authentication import token_cache
+
+User = get_user_model()
+
+
+def create_tokens(user_ids):
+    """Give every user a token, in one insert; users that already have one keep it"""
+    Token.objects.bulk_create(
+        [Token(user_id=user_id, key=Token.generate_key()) for user_id in dict.fromkeys(user_ids)],
+        ignore_conflicts=True,
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_auth_token(sender, instance=None, created=False, raw=False, using=None, **kwargs):
+    # registration and login get_or_create the token themselves when they need it now
+    if created and not raw:
+        defer(create_tokens, instance.pk, using=using)
+
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def create_auth_token(sender, instance=None, created=False, **kwargs):
-    if created:
-        Token.objects.create(user=instance)
+def evict_cached_tokens(sender, instance, created, update_fields=None, **kwargs):
+    """Cached auth must not outlive a deactivation, password change or profile edit"""
+    if created or only_touches(update_fields, 'last_login'):
+        return
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate([instance.key])
+    login.forget_token(instance.user_id)
+
+
+# Django saves last_login on every session login; write it with the next batch instead
+user_logged_in.disconnect(dispatch_uid='update_last_login')
+
+
+@receiver(user_logged_in)
+def buffer_last_login(sender, request, user, **kwargs):
+    user.last_login = timezone.now()
+    login.last_logins.record(user.pk, user.last_login)
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def invalidate_follow_graph(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached adjacency sets for both ends of every changed follow"""
+    if action == 'pre_clear':
+        # clear() passes no pk_set; remember who is about to lose the edge
+        instance._cleared_follow_ids = graph.following_ids(instance.pk) if reverse else graph.follower_ids(instance.pk)
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_follow_ids', set())
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    # user.followers.add(...) -> instance is from_user; user.following.add(...) -> instance is to_user
+    from_ids, to_ids = (set(pk_set), {instance.pk}) if reverse else ({instance.pk}, set(pk_set))
+    graph.forget(from_ids, to_ids)
+    # a concurrent request may have re-read the old rows before we commit
+    transaction.on_commit(lambda: graph.forget(from_ids, to_ids))
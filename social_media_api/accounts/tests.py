@@ -1,3 +1,384 @@
-from django.test import TestCase
+import json
+from io import StringIO
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from . import graph, login, signal_audit
+from .authentication import CachedTokenAuthentication, check_token_cache, token_cache
+
+User = get_user_model()
 
 # Create your tests here.
+
+
+class FollowGraphCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        self.carol = User.objects.create_user(username='carol', password='pass12345')
+
+    def _graph_queries(self, context):
+        table = User.followers.through._meta.db_table
+        return [query for query in context.captured_queries if table in query['sql']]
+
+    def test_membership_checks_are_one_exists_query_each(self):
+        self.alice.follow(self.bob)
+        with mock.patch.object(graph, '_load_sets') as load, CaptureQueriesContext(connection) as context:
+            self.assertTrue(self.alice.is_following(self.bob))
+            self.assertFalse(self.alice.is_following(self.carol))
+            self.assertTrue(self.bob.is_followed_by(self.alice))
+        load.assert_not_called()
+        self.assertEqual(len(self._graph_queries(context)), 3)
+
+        self.alice.follower_count()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.alice.follower_count(), 1)
+        self.assertEqual(self._graph_queries(context), [])
+
+    def test_follow_and_unfollow_invalidate_both_ends(self):
+        self.assertEqual(graph.following_ids(self.bob.id), frozenset())
+        self.alice.follow(self.bob)
+        self.assertEqual(graph.following_ids(self.bob.id), {self.alice.id})
+
+        self.alice.unfollow(self.bob)
+        self.assertFalse(self.alice.is_following(self.bob))
+        self.assertEqual(graph.following_ids(self.bob.id), frozenset())
+
+    def test_clear_invalidates_the_other_side(self):
+        self.alice.follow(self.bob)
+        self.carol.follow(self.bob)
+        self.assertEqual(graph.following_ids(self.bob.id), {self.alice.id, self.carol.id})
+        self.bob.following.clear()
+        self.assertEqual(graph.follower_ids(self.alice.id), frozenset())
+        self.assertEqual(graph.following_ids(self.bob.id), frozenset())
+
+    def test_follower_counts_load_misses_in_one_query(self):
+        self.alice.follow(self.bob)
+        self.alice.follow(self.carol)
+        with CaptureQueriesContext(connection) as context:
+            counts = graph.follower_counts([self.alice.id, self.bob.id, self.carol.id])
+        self.assertEqual(counts, {self.alice.id: 2, self.bob.id: 0, self.carol.id: 0})
+        self.assertEqual(len(self._graph_queries(context)), 1)
+
+    def test_sets_live_in_the_shared_cache(self):
+        self.alice.follow(self.bob)
+        graph.following_ids(self.bob.id)
+        self.assertIsNone(cache.get(graph._key(graph.FOLLOWING, self.bob.id)))
+        self.assertEqual(graph.graph_cache().get(graph._key(graph.FOLLOWING, self.bob.id)), {self.alice.id})
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       FOLLOW_GRAPH_CACHE='default')
+    def test_per_process_graph_cache_fails_the_system_check(self):
+        self.assertEqual([error.id for error in graph.check_graph_cache(None)], ['accounts.E002'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkFollowTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='pass12345')
+        self.others = [User.objects.create_user(username=f'other{i}', password='pass12345') for i in range(3)]
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_follow_and_unfollow(self):
+        ids = [other.id for other in self.others]
+        response = self.client.post(reverse('follow-bulk'), {'user_ids': ids + [self.user.id, 9999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'followed': ids, 'not_found': [9999]})
+        self.assertTrue(all(self.user.is_following(other) for other in self.others))
+
+        response = self.client.post(reverse('unfollow-bulk'), {'user_ids': ids[:2]}, format='json')
+        self.assertEqual(response.data['unfollowed'], ids[:2])
+        self.assertEqual(graph.follower_ids(self.user.id), {ids[2]})
+
+    def test_bulk_follow_requires_ids(self):
+        response = self.client.post(reverse('follow-bulk'), {'user_ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_profile_counts_come_from_graph(self):
+        self.user.follow(self.others[0])
+        response = self.client.get(reverse('user-detail-detail', kwargs={'pk': self.user.id}))
+        self.assertEqual(response.data['followers'], ['other0'])
+        self.assertEqual(response.data['follower_count'], 1)
+        self.assertEqual(response.data['following_count'], 0)
+
+    def test_profile_lists_are_capped(self):
+        self.user.followers.add(*self.others)
+        with mock.patch('accounts.serializers.UserDetailSerializer.edge_list_limit', 2):
+            response = self.client.get(reverse('user-detail-detail', kwargs={'pk': self.user.id}))
+        self.assertEqual(response.data['followers'], ['other0', 'other1'])
+        self.assertEqual(response.data['follower_count'], 3)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class FollowListTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='pass12345')
+        self.others = [User.objects.create_user(username=f'other{i}', password='pass12345') for i in range(5)]
+        self.user.followers.add(*self.others)
+        self.others[0].followers.add(self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_followers_are_cursor_paginated(self):
+        url = reverse('followers', kwargs={'user_id': self.user.id})
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['username'] for row in response.data['results']], ['other0', 'other1', 'other2'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['username'] for row in response.data['results']], ['other3', 'other4'])
+        self.assertIsNone(response.data['next'])
+
+    def test_following_list(self):
+        response = self.client.get(reverse('following', kwargs={'user_id': self.others[0].id}))
+        self.assertEqual(response.data['results'], [{'id': self.user.id, 'username': 'user'}])
+
+    def test_ndjson_export_streams_every_row(self):
+        response = self.client.get(reverse('followers', kwargs={'user_id': self.user.id}), {'export': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0]), {'id': self.others[0].id, 'username': 'other0'})
+
+    def test_unknown_user(self):
+        response = self.client.get(reverse('followers', kwargs={'user_id': 9999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()  # stands in for Redis as the shared tier where a test names it
+        token_cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):  # tokens are created on commit
+            self.user = User.objects.create_user(username='user', password='pass12345')
+        self.token = Token.objects.get(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('followers', kwargs={'user_id': self.user.id})
+
+    def _token_queries(self, context):
+        table = Token._meta.db_table
+        return [query for query in context.captured_queries if table in query['sql']]
+
+    def test_second_request_skips_token_lookup(self):
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self._token_queries(first)), 1)
+        self.assertEqual(self._token_queries(second), [])
+        self.assertEqual(token_cache.stats()['hits'], 1)
+
+    @override_settings(TOKEN_AUTH_CACHE={'SHARED_CACHE': 'default', 'LOCAL_TTL': 0})
+    def test_shared_tier_answers_past_the_local_ttl_without_queries(self):
+        auth = CachedTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, _ = auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(token_cache.stats()['shared_hits'], 1)
+
+    @override_settings(TOKEN_AUTH_CACHE={'LOCAL_TTL': 0})
+    def test_database_shared_tier_is_skipped(self):
+        auth = CachedTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(1):  # the token lookup, no cache table round-trips
+            auth.authenticate_credentials(self.token.key)
+        self.assertEqual(token_cache.stats()['shared_hits'], 0)
+
+    @override_settings(TOKEN_AUTH_CACHE={'SHARED_CACHE': 'default'})
+    def test_other_workers_share_entries_and_revocations(self):
+        self.client.get(self.url)
+        token_cache.clear()  # another worker: nothing in its LRU
+        self.assertIsNotNone(token_cache.get(self.token.key))
+        self.assertEqual(token_cache.stats()['shared_hits'], 1)
+
+        token_cache.invalidate([self.token.key])
+        token_cache.clear()
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    @override_settings(TOKEN_AUTH_CACHE={'SHARED_CACHE': 'default'})
+    def test_entry_read_before_a_revocation_is_not_trusted(self):
+        revision = token_cache.revision(self.token.key)
+        token_cache.invalidate([self.token.key])  # lands while the lookup is in flight
+        token_cache.set(self.token.key, self.user, self.token, revision)
+        token_cache.clear()
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       TOKEN_AUTH_CACHE={'SHARED_CACHE': 'default'})
+    def test_per_process_shared_tier_fails_the_system_check(self):
+        self.assertEqual([error.id for error in check_token_cache(None)], ['accounts.E004'])
+
+    def test_each_hit_gets_its_own_user(self):
+        auth = CachedTokenAuthentication()
+        first, _ = auth.authenticate_credentials(self.token.key)
+        first.first_name = 'changed'
+        second, token = auth.authenticate_credentials(self.token.key)
+        self.assertIsNot(second, first)
+        self.assertIs(token.user, second)
+        self.assertEqual((second.pk, second.first_name), (self.user.pk, ''))
+
+    def test_deleted_token_is_evicted(self):
+        self.client.get(self.url)
+        self.token.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_evicted(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_last_login_update_keeps_entry(self):
+        self.client.get(self.url)
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(token_cache.stats()['size'], 1)
+
+    def test_lru_is_bounded(self):
+        with self.settings(TOKEN_AUTH_CACHE={'MAX_SIZE': 1}):
+            with self.captureOnCommitCallbacks(execute=True):
+                other = User.objects.create_user(username='other', password='pass12345')
+            self.client.get(self.url)
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get(user=other).key}')
+            self.client.get(self.url)
+        self.assertEqual(token_cache.stats()['size'], 1)
+        self.assertEqual(token_cache.stats()['evictions'], 1)
+
+class DeferredTokenTests(TestCase):
+    def test_tokens_are_created_in_one_batch_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            users = [User.objects.create_user(username=f'user{i}', password='pass12345') for i in range(3)]
+            self.assertFalse(Token.objects.exists())
+        with self.assertNumQueries(1):  # one bulk insert; the other callbacks are the items' markers
+            for callback in callbacks:
+                callback()
+        self.assertEqual(set(Token.objects.values_list('user_id', flat=True)), {user.id for user in users})
+
+    def test_rolled_back_savepoint_drops_its_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            kept = User.objects.create_user(username='kept', password='pass12345')
+            try:
+                with transaction.atomic():
+                    User.objects.create_user(username='dropped', password='pass12345')
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(list(Token.objects.values_list('user_id', flat=True)), [kept.id])
+
+    def test_batch_started_in_a_rolled_back_savepoint_is_replaced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    User.objects.create_user(username='dropped', password='pass12345')
+                    raise ValueError
+            except ValueError:
+                pass
+            kept = User.objects.create_user(username='kept', password='pass12345')
+        self.assertEqual(list(Token.objects.values_list('user_id', flat=True)), [kept.id])
+
+    def test_existing_token_is_kept(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            user = User.objects.create_user(username='user', password='pass12345')
+            token = Token.objects.create(user=user)
+        callbacks[0]()
+        self.assertEqual(Token.objects.get(user=user).key, token.key)
+
+    def test_audit_times_save_receivers(self):
+        User.objects.create_user(username='user', password='pass12345')
+        timings = {row['receiver']: row for row in signal_audit.measure(User)}
+        self.assertEqual(timings['accounts.signals.create_auth_token']['queries'], 0)
+
+        out = StringIO()
+        call_command('audit_signals', '--model', 'accounts.User', '--update-fields', 'last_login', stdout=out)
+        self.assertIn('accounts.signals.evict_cached_tokens', out.getvalue())
+        self.assertIn('queries', out.getvalue())
+
+@override_settings(SECURE_SSL_REDIRECT=False,
+                   LAST_LOGIN_BUFFER={'ENABLED': True, 'MAX_SIZE': 1000, 'FLUSH_INTERVAL': 0})
+class LoginFastPathTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        login.last_logins.flush()
+        self.user = User.objects.create_user(username='user', password='pass12345')
+        self.url = reverse('login')
+
+    def log_in(self, password='pass12345'):
+        return self.client.post(self.url, {'username': 'user', 'password': password})
+
+    def test_repeat_login_only_reads_the_user(self):
+        first = self.log_in()
+        self.assertEqual(first.data['token'], Token.objects.get(user=self.user).key)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.log_in()
+        self.assertEqual(second.data['token'], first.data['token'])
+        self.assertEqual(len(queries), 1)
+
+    def test_deleted_token_is_not_handed_out(self):
+        key = self.log_in().data['token']
+        Token.objects.filter(user=self.user).delete()
+        self.assertNotEqual(self.log_in().data['token'], key)
+
+    def test_key_deleted_elsewhere_is_rechecked_once_auth_forgets_it(self):
+        key = self.log_in().data['token']
+        with mock.patch('accounts.signals.login.forget_token'):  # as if another process deleted it
+            Token.objects.filter(user=self.user).delete()
+        token_cache.clear()  # its TTL ran out
+        self.assertNotEqual(self.log_in().data['token'], key)
+
+    def test_pending_hash_upgrades_are_capped(self):
+        upgrades = login.PasswordUpgrades()
+        upgrades._executor = mock.Mock()
+        with self.settings(LOGIN_FAST_PATH={'MAX_PENDING_UPGRADES': 2}):
+            for user_id in range(1, 5):
+                upgrades.schedule(user_id, 'old-hash', 'secret')
+        self.assertEqual(upgrades._executor.submit.call_count, 2)
+        self.assertEqual(upgrades.dropped, 2)
+
+    def test_last_login_is_written_with_the_next_flush(self):
+        self.log_in()
+        self.client.force_login(self.user)  # session logins are buffered too
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        self.assertEqual(login.last_logins.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_stages_are_reported_on_sampled_requests(self):
+        with self.settings(INSTRUMENTATION={'SAMPLE_RATE': 1.0}):
+            response = self.log_in()
+        for name in ('authenticate', 'token', 'last_login'):
+            self.assertIn(f'{name};dur=', response['Server-Timing'])
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher',
+                                         'django.contrib.auth.hashers.PBKDF2PasswordHasher'])
+    def test_outdated_hash_is_upgraded_off_the_request_path(self):
+        outdated = make_password('pass12345', hasher='pbkdf2_sha256')
+        User.objects.filter(pk=self.user.pk).update(password=outdated)
+        self.addCleanup(login.password_upgrades._pending.discard, self.user.pk)
+        with mock.patch.object(login.password_upgrades, '_executor') as executor:
+            self.assertEqual(self.log_in().status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, outdated)
+        executor.submit.assert_called_once_with(login.password_upgrades._run, self.user.pk, outdated, 'pass12345')
+
+        self.assertTrue(login.password_upgrades.upgrade(self.user.pk, outdated, 'pass12345'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('md5$'))
+        self.assertTrue(self.user.check_password('pass12345'))
+        # a password changed since the login read it is left alone
+        self.assertFalse(login.password_upgrades.upgrade(self.user.pk, outdated, 'pass12345'))
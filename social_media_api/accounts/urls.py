@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import UserRegistrationView, LoginApiView, UserDetailView, ListFollowers, PeopleYouFollowView, followApiView, UnfollowApiView
+from .views import UserRegistrationView, LoginApiView, AuthCacheStatsView, UserDetailView, ListFollowers, PeopleYouFollowView, followApiView, UnfollowApiView, BulkFollowApiView, BulkUnfollowApiView
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -9,8 +9,11 @@ router.register(r'user-details', UserDetailView, basename='user-detail')
 urlpatterns = [
     path('', include(router.urls)),
     path('login/', LoginApiView.as_view(), name='login'),
+    path('auth-cache-stats/', AuthCacheStatsView.as_view(), name='auth-cache-stats'),
     path('register/', include),
-    path('followers/', ListFollowers.as_view(), name='followers'),
+    path('followers/<int:user_id>/', ListFollowers.as_view(), name='followers'),
+    path('follow/bulk/', BulkFollowApiView.as_view(), name='follow-bulk'),
+    path('unfollow/bulk/', BulkUnfollowApiView.as_view(), name='unfollow-bulk'),
     path('follow/<int:user_id>/', followApiView.as_view(), name='follow'),
     path('unfollow/<int:user_id>/', UnfollowApiView.as_view(), name='unfollow'),
     path('following/<int:user_id>/', PeopleYouFollowView.as_view(), name='following')
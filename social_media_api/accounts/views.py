@@ -2,14 +2,19 @@ from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from .models import User
-from .serializers import UserRegistration, LoginSerializer, UserDetailSerializer
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.authentication import TokenAuthentication
+from .serializers import UserRegistration, LoginSerializer, UserDetailSerializer, BulkFollowSerializer
+from . import login
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from accounts.authentication import CachedTokenAuthentication, token_cache
 from rest_framework.views import APIView as ApiView
-from rest_framework.authtoken.models import Token
 from django.contrib import messages
 from rest_framework.views import APIView
 from rest_framework import serializers, generics, permissions
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from social_media_api.pagination import FollowKeysetPagination
+from social_media_api.instrumentation import InstrumentedViewMixin, stage
+from social_media_api.renderers import dumps
 
 
 # Create your views here.
@@ -26,7 +31,7 @@ class UserRegistrationView(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserRegistration
     permission_classes = [AllowAny]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
 
 
     def get_permissions(self):
@@ -42,24 +47,29 @@ class LoginApiView(ApiView):
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
-        if serializer.is_valid():
+        with stage(request, 'authenticate'):
+            valid = serializer.is_valid()
+        if valid:
             user = serializer.validated_data
-            token, _ = Token.objects.get_or_create(user=user)  # create token if not exists
+            with stage(request, 'token'):
+                key = login.token_key(user)  # cached after the first login
+            with stage(request, 'last_login'):
+                login.last_logins.record(user.pk)  # written with the next batch
             return Response({
                 'message': 'Login successful',
                 'user_id': user.id,
                 'username': user.username,
-                'token': token.key
+                'token': key
             }, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
 
-class UserDetailView(viewsets.ModelViewSet):
+class UserDetailView(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserDetailSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
 
     def get_permissions(self):
         if self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
@@ -84,9 +94,18 @@ class UserDetailView(viewsets.ModelViewSet):
         
 
 
+class AuthCacheStatsView(APIView):
+    """Hit/miss counters of this worker's token cache"""
+    permission_classes = [IsAdminUser]
+    authentication_classes = [CachedTokenAuthentication]
+
+    def get(self, request):
+        return Response(token_cache.stats(), status=status.HTTP_200_OK)
+
+
 class followApiView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
 
     def post(self, request, user_id):
         try:
@@ -100,7 +119,7 @@ class followApiView(APIView):
         
 class UnfollowApiView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]       
+    authentication_classes = [CachedTokenAuthentication]       
 
     def delete(self, request, user_id):
         try:
@@ -114,31 +133,82 @@ class UnfollowApiView(APIView):
 
 
 
-class ListFollowers(APIView):
+class BulkFollowApiView(APIView):
+    """Follow many users in one transaction: {"user_ids": [1, 2, 3]}"""
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+    result_key = "followed"
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids, not_found = self.resolve(request, serializer.validated_data['user_ids'])
+        with transaction.atomic():
+            self.apply(request.user, user_ids)
+        return Response({self.result_key: user_ids, "not_found": not_found}, status=status.HTTP_200_OK)
+
+    def resolve(self, request, requested):
+        requested = list(dict.fromkeys(requested))
+        existing = set(User.objects.filter(id__in=requested).values_list('id', flat=True))
+        user_ids = [user_id for user_id in requested if user_id in existing and user_id != request.user.id]
+        not_found = [user_id for user_id in requested if user_id not in existing]
+        return user_ids, not_found
+
+    def apply(self, user, user_ids):
+        user.followers.add(*user_ids)  # same direction as User.follow()
+
+
+class BulkUnfollowApiView(BulkFollowApiView):
+    """Unfollow many users in one transaction: {"user_ids": [1, 2, 3]}"""
+    result_key = "unfollowed"
+
+    def apply(self, user, user_ids):
+        user.followers.remove(*user_ids)
+
+
+class FollowListView(InstrumentedViewMixin, APIView):
+    """
+    Cursor-paginated follow list read straight off the User.followers through table.
+
+    Rows are walked in `member_field` order within one `owner_field` value, so
+    the page query is an index range scan. `?export=ndjson` streams the whole
+    list instead, one JSON object per line, from a server-side cursor.
+    """
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    owner_field = None
+    member_field = None
+    export_chunk_size = 2000
 
     def get(self, request, user_id):
-        try:
-            user = User.objects.get(id=user_id)
-            followers = user.followers.all()
-            follower_usernames = [follower.username for follower in followers]
-            return Response({"followers": follower_usernames}, status=status.HTTP_200_OK)
-        except User.DoesNotExist:
+        if not User.objects.filter(id=user_id).exists():
             return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
-        
 
-class PeopleYouFollowView(APIView):
-    permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+        member_id = f'{self.member_field}_id'
+        rows = User.followers.through.objects.filter(**{f'{self.owner_field}_id': user_id})
+        columns = (member_id, f'{self.member_field}__username')
 
-    
-    def get(self, request, *args, **kwargs):
+        if request.query_params.get('export') == 'ndjson':
+            lines = rows.order_by(member_id).values_list(*columns).iterator(chunk_size=self.export_chunk_size)
+            return StreamingHttpResponse(
+                (dumps({"id": pk, "username": username}) + b"\n" for pk, username in lines),
+                content_type='application/x-ndjson',
+            )
 
-        try:
-            user_followed = User.objects.get(kwargs['user_id'])
-            friends = user_followed.following_list
-            friends_usernames = [friend.username for friend in friends]
-            return Response({"following": friends_usernames}, status=status.HTTP_200_OK)
-        except User.DoesNotExist:         
-            return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        paginator = FollowKeysetPagination(member_id)
+        page = paginator.paginate_queryset(rows.values(*columns), request, view=self)
+        return paginator.get_paginated_response([
+            {"id": row[member_id], "username": row[columns[1]]} for row in page
+        ])
+
+
+class ListFollowers(FollowListView):
+    """Users in user.followers"""
+    owner_field = 'from_user'
+    member_field = 'to_user'
+
+
+class PeopleYouFollowView(FollowListView):
+    """Users in user.following"""
+    owner_field = 'to_user'
+    member_field = 'from_user'
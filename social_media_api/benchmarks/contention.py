@@ -0,0 +1,160 @@
+# benchmarks/contention.py
+"""
+Check-first versus insert-first reaction writes under concurrent writers.
+
+Writer threads, each with its own database connection, like (post, user)
+pairs drawn at random from a small pool, so they collide on the same pairs the
+way a burst of taps on one popular post does. Two strategies are compared:
+
+    check_first   Like.objects.filter(...).exists(), then create(); what
+                  LikeSerializer and LikeViewSet used to do
+    insert_first  integrity.create_unique(): one INSERT, and a lookup only
+                  when it fails
+
+For each strategy the report gives statements per attempt, latency
+percentiles, throughput and outcomes: created, duplicate (answered with a
+validation error) and error (an exception that escaped, a 500 in the API).
+check_first errors when two writers both pass the exists() check for the
+same pair. Both strategies replay the same pairs in the same order.
+
+Counters are left alone and every like created is deleted afterwards, so the
+seeded data is unchanged. SQLite lets one writer in at a time; run against
+PostgreSQL for numbers that mean something.
+"""
+import random
+import threading
+import time
+
+from django.db import DatabaseError, IntegrityError, connection
+
+from posts import counters
+from posts.models import Like, Post
+from social_media_api.integrity import create_unique
+
+from . import data
+from .runner import QueryRecorder, milliseconds, percentile
+
+
+def check_first(post_id, user_id):
+    if Like.objects.filter(post_id=post_id, user_id=user_id).exists():
+        return 'duplicate', None
+    return 'created', Like.objects.create(post_id=post_id, user_id=user_id).id
+
+
+def insert_first(post_id, user_id):
+    like, created = create_unique(Like.objects, post_id=post_id, user_id=user_id)
+    return ('created', like.id) if created else ('duplicate', None)
+
+
+STRATEGIES = {
+    'check_first': check_first,
+    'insert_first': insert_first,
+}
+
+
+def pair_pool(rng, size):
+    """`size` (post_id, user_id) pairs of benchmark rows that are not liked yet"""
+    post_ids = list(Post.objects.filter(author__in=data.bench_users()).values_list('id', flat=True))
+    user_ids = list(data.bench_users().values_list('id', flat=True))
+    if not post_ids:
+        raise ValueError('No benchmark data; run seed_benchmark_data first.')
+    wanted = min(size, len(post_ids) * len(user_ids))
+    candidates = set()
+    while len(candidates) < wanted * 2 and len(candidates) < len(post_ids) * len(user_ids):
+        candidates.add((rng.choice(post_ids), rng.choice(user_ids)))
+    liked = set(Like.objects.filter(
+        post_id__in={post_id for post_id, _ in candidates},
+        user_id__in={user_id for _, user_id in candidates},
+    ).values_list('post_id', 'user_id'))
+    return sorted(candidates - liked)[:wanted]
+
+
+class Writer:
+    def __init__(self, strategy, pairs):
+        self.strategy = strategy
+        self.pairs = pairs
+        self.latencies = []
+        self.outcomes = {}
+        self.created = []
+        self.recorder = QueryRecorder()
+
+    def run(self, barrier=None):
+        if barrier is not None:
+            barrier.wait()
+        with connection.execute_wrapper(self.recorder), counters.suspended():
+            for post_id, user_id in self.pairs:
+                started = time.perf_counter()
+                try:
+                    outcome, like_id = self.strategy(post_id, user_id)
+                except IntegrityError:
+                    outcome, like_id = 'error', None
+                except DatabaseError:  # e.g. SQLite's "database is locked"
+                    outcome, like_id = 'database_error', None
+                self.latencies.append(time.perf_counter() - started)
+                self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+                if like_id is not None:
+                    self.created.append(like_id)
+
+    def run_in_thread(self, barrier):
+        try:
+            self.run(barrier)
+        finally:
+            connection.close()  # each thread owns its own connection
+
+
+def run_strategy(name, workloads):
+    writers = [Writer(STRATEGIES[name], pairs) for pairs in workloads]
+    started = time.perf_counter()
+    if len(writers) == 1:
+        writers[0].run()
+    else:
+        barrier = threading.Barrier(len(writers))
+        threads = [threading.Thread(target=writer.run_in_thread, args=(barrier,)) for writer in writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    seconds = time.perf_counter() - started
+
+    created = [like_id for writer in writers for like_id in writer.created]
+    with counters.suspended():
+        Like.objects.filter(id__in=created).delete()
+
+    latencies = sorted(latency for writer in writers for latency in writer.latencies)
+    outcomes = {}
+    for writer in writers:
+        for outcome, count in writer.outcomes.items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+    return {
+        'attempts': len(latencies),
+        'outcomes': dict(sorted(outcomes.items())),
+        'statements_per_attempt': round(sum(writer.recorder.count for writer in writers) / len(latencies), 2),
+        'latency_ms': {
+            'p50': milliseconds(percentile(latencies, 50)),
+            'p95': milliseconds(percentile(latencies, 95)),
+            'p99': milliseconds(percentile(latencies, 99)),
+            'max': milliseconds(latencies[-1]),
+        },
+        'throughput_wps': round(len(latencies) / seconds, 1),
+    }
+
+
+def run(writers=8, attempts=200, pool=50, seed=42):
+    """Run both strategies with `writers` threads of `attempts` likes each"""
+    if writers < 1 or attempts < 1:
+        raise ValueError('writers and attempts must be at least 1')
+    rng = random.Random(seed)
+    pairs = pair_pool(rng, pool)
+    if not pairs:
+        raise ValueError('Every benchmark post is liked by every benchmark user already.')
+    workloads = [[rng.choice(pairs) for _ in range(attempts)] for _ in range(writers)]
+    return {
+        'meta': {
+            'database': connection.vendor,
+            'writers': writers,
+            'attempts_per_writer': attempts,
+            'pool': len(pairs),
+            'seed': seed,
+        },
+        'strategies': {name: run_strategy(name, workloads) for name in STRATEGIES},
+    }
@@ -0,0 +1,210 @@
+# benchmarks/data.py
+"""
+Synthetic data for the benchmark suite.
+
+generate() fills the database with `bench_` users, a follow graph, posts,
+likes, emojis and notifications, deterministically for a given seed, so two
+runs against the same seed measure the same dataset.
+
+Follower counts follow a power law: authors are ranked and the n-th one is
+picked as a followee with weight 1 / n ** alpha, so a handful of accounts end
+up with most followers (and past TIMELINE_FANOUT_LIMIT on big datasets) while
+the long tail has almost none, as on a real network.
+
+Everything is written with bulk_create, which bypasses model signals, so the
+derived state those signals maintain (post counters, home timelines) is
+rebuilt afterwards in bulk.
+"""
+import io
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from notifications.models import Notification
+from posts import timeline
+from posts.models import Emoji, Like, Post, TimelineEntry
+
+User = get_user_model()
+
+PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+BATCH_SIZE = 1000
+MIN_CONTENT_LENGTH = 1000
+
+WORDS = """
+account active album answer april audio autumn balance beach bicycle bird blue book bread bridge budget
+camera campus candle career castle chart cloud coffee college concert cookie cottage country course dance
+data design desert dinner doctor dream engine evening family farm festival field film flower forest
+friend garden garage guitar harbor health history holiday hotel island journey kitchen ladder language
+library light market meeting memory mountain museum music network ocean office orange painting paper
+party picture planet python poetry puzzle rain recipe river robot school science season server shadow
+sketch snow soccer spring station story street summer sunset system teacher theater ticket tower train
+travel valley village violin voyage water weather window winter yoga
+""".split()
+
+EMOJIS = [('like', '👍'), ('heart', '❤️'), ('smile', '😊'), ('laugh', '😂'), ('wow', '😮')]
+
+
+def bench_users():
+    return User.objects.filter(username__startswith=PREFIX)
+
+
+def reset():
+    """Delete every benchmark user; their posts, likes and the rest cascade"""
+    deleted, _ = bench_users().delete()
+    clear_caches()
+    return deleted
+
+
+def clear_caches():
+    """Empty the per-process caches and the shared ones (follow graph, ETag versions)"""
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+def paragraph(rng, length=MIN_CONTENT_LENGTH):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words).capitalize() + '.'
+
+
+def zipf_cum_weights(count, alpha):
+    return list(accumulate(1 / rank ** alpha for rank in range(1, count + 1)))
+
+
+def follow_graph(user_ids, follows_per_user, alpha, rng):
+    """{author_id: set(reader_ids)}; user_ids[0] is the most followed author"""
+    cum_weights = zipf_cum_weights(len(user_ids), alpha)
+    readers = {user_id: set() for user_id in user_ids}
+    for reader_id in user_ids:
+        wanted = min(follows_per_user, len(user_ids) - 1)
+        followees = set()
+        # sampling with replacement; stop early rather than spin on a tiny graph
+        for _ in range(wanted * 4):
+            if len(followees) >= wanted:
+                break
+            author_id = rng.choices(user_ids, cum_weights=cum_weights)[0]
+            if author_id != reader_id:
+                followees.add(author_id)
+        for author_id in followees:
+            readers[author_id].add(reader_id)
+    return readers
+
+
+def _create_users(count):
+    password = make_password(PASSWORD)  # hashing once keeps seeding fast
+    User.objects.bulk_create(
+        [User(username=f'{PREFIX}{number}', email=f'{PREFIX}{number}@example.com', password=password)
+         for number in range(count)],
+        batch_size=BATCH_SIZE,
+    )
+    users = list(bench_users().order_by('id').values_list('id', flat=True))
+    Token.objects.bulk_create(
+        [Token(user_id=user_id, key=Token.generate_key()) for user_id in users],
+        batch_size=BATCH_SIZE,
+    )
+    return users
+
+
+def _create_follows(readers):
+    Follow = User.followers.through
+    # A.follow(B) stores from_user=A, to_user=B and makes B a reader of A
+    Follow.objects.bulk_create(
+        [Follow(from_user_id=author_id, to_user_id=reader_id)
+         for author_id, reader_ids in readers.items() for reader_id in reader_ids],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _create_posts(user_ids, posts_per_user, rng):
+    Post.objects.bulk_create(
+        [Post(author_id=author_id, title=' '.join(rng.sample(WORDS, 4)).title(), content=paragraph(rng))
+         for _ in range(posts_per_user) for author_id in user_ids],
+        batch_size=BATCH_SIZE,
+    )
+    return list(Post.objects.filter(author_id__in=user_ids).order_by('id').values_list('id', 'author_id'))
+
+
+def _create_reactions(user_ids, posts, likes_per_post, rng):
+    """Likes and emojis, plus the notification each like sends the author"""
+    post_type = ContentType.objects.get_for_model(Post)
+    likes, emojis, notifications = [], [], []
+    for post_id, author_id in posts:
+        count = min(len(user_ids), int(rng.expovariate(1 / likes_per_post))) if likes_per_post else 0
+        for user_id in rng.sample(user_ids, count):
+            likes.append(Like(post_id=post_id, user_id=user_id))
+            if user_id != author_id:
+                notifications.append(Notification(
+                    recipient_id=author_id, actor_id=user_id, verb='liked',
+                    content_type=post_type, object_id=post_id, is_read=rng.random() < 0.7,
+                ))
+            if rng.random() < 0.3:
+                name, unicode = rng.choice(EMOJIS)
+                emojis.append(Emoji(post_id=post_id, user_id=user_id, name=name, unicode=unicode))
+    Like.objects.bulk_create(likes, batch_size=BATCH_SIZE)
+    Emoji.objects.bulk_create(emojis, batch_size=BATCH_SIZE)
+    Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+    return len(likes), len(emojis), len(notifications)
+
+
+def _build_timelines(readers, posts):
+    """Fan every post out like posts.timeline does, skipping popular authors"""
+    limit = timeline.fanout_limit()
+    created_at = dict(Post.objects.filter(id__in=[post_id for post_id, _ in posts]).values_list('id', 'created_at'))
+    entries = []
+    total = 0
+    for post_id, author_id in posts:
+        if len(readers[author_id]) >= limit:
+            continue
+        for reader_id in readers[author_id]:
+            entries.append(TimelineEntry(owner_id=reader_id, post_id=post_id, created_at=created_at[post_id]))
+        if len(entries) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+            total += len(entries)
+            entries = []
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return total + len(entries)
+
+
+def generate(users=200, posts_per_user=10, follows_per_user=20, likes_per_post=5, alpha=1.1, seed=42):
+    """Create a dataset and return a summary of what was written"""
+    if bench_users().exists():
+        raise ValueError('Benchmark data already exists; reset it first.')
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    with transaction.atomic():
+        user_ids = _create_users(users)
+        readers = follow_graph(user_ids, follows_per_user, alpha, rng)
+        _create_follows(readers)
+        posts = _create_posts(user_ids, posts_per_user, rng)
+        likes, emojis, notifications = _create_reactions(user_ids, posts, likes_per_post, rng)
+        call_command('reconcile_post_counters', verbosity=0, stdout=io.StringIO())
+        timeline_entries = _build_timelines(readers, posts)
+    clear_caches()  # follow graph, unread counters and token caches start cold
+
+    follower_counts = sorted((len(ids) for ids in readers.values()), reverse=True)
+    return {
+        'users': len(user_ids),
+        'follows': sum(follower_counts),
+        'max_followers': follower_counts[0] if follower_counts else 0,
+        'posts': len(posts),
+        'likes': likes,
+        'emojis': emojis,
+        'notifications': notifications,
+        'timeline_entries': timeline_entries,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
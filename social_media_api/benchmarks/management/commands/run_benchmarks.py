@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API endpoints against the seeded dataset and report latency, throughput, queries and memory as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(runner.SCENARIOS),
+                            help='Only run this scenario (repeatable)')
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+
+        try:
+            report = runner.run(options['scenarios'], options['iterations'], options['warmup'], options['seed'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        if baseline is not None:
+            report['change_percent'] = runner.compare(report, baseline)
+
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(text + '\n')
+            for name, result in report['scenarios'].items():
+                latency = result['latency_ms']
+                self.stdout.write(
+                    f"{name:<18} p50 {latency['p50']:>9.2f}ms  p95 {latency['p95']:>9.2f}ms  "
+                    f"{result['throughput_rps']:>8.1f} req/s  {result['queries']['mean']:>6.1f} queries"
+                )
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import contention
+
+
+class Command(BaseCommand):
+    help = ('Compare check-first and insert-first like writes under concurrent writer threads '
+            'against the seeded dataset and report the results as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads')
+        parser.add_argument('--attempts', type=int, default=200, help='Likes each writer tries')
+        parser.add_argument('--pool', type=int, default=50,
+                            help='Distinct (post, user) pairs the writers draw from; smaller means more collisions')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            report = contention.run(options['writers'], options['attempts'], options['pool'], options['seed'])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(text + '\n')
+            for name, result in report['strategies'].items():
+                latency = result['latency_ms']
+                self.stdout.write(
+                    f"{name:<13} p50 {latency['p50']:>8.2f}ms  p99 {latency['p99']:>8.2f}ms  "
+                    f"{result['throughput_wps']:>8.1f} writes/s  {result['statements_per_attempt']:>5.2f} statements  "
+                    f"{result['outcomes']}"
+                )
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import data
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic dataset (users, power-law follow graph, posts, likes, notifications) for run_benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--posts-per-user', type=int, default=10)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--likes-per-post', type=float, default=5, help='Mean likes per post')
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help='Power-law exponent of follower counts; higher means more skew')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--reset', action='store_true', help='Delete existing benchmark data first')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('--users must be at least 2')
+        if options['reset']:
+            deleted = data.reset()
+            self.stdout.write(f'Deleted {deleted} existing benchmark row(s).')
+        try:
+            summary = data.generate(
+                users=options['users'],
+                posts_per_user=options['posts_per_user'],
+                follows_per_user=options['follows_per_user'],
+                likes_per_post=options['likes_per_post'],
+                alpha=options['alpha'],
+                seed=options['seed'],
+            )
+        except ValueError as error:
+            raise CommandError(f'{error} Pass --reset.')
+        details = ', '.join(f'{value} {key}' for key, value in summary.items() if key != 'seconds')
+        self.stdout.write(self.style.SUCCESS(f"Seeded {details} in {summary['seconds']}s."))
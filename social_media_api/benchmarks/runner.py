@@ -0,0 +1,375 @@
+# benchmarks/runner.py
+"""
+Scenario benchmarks against the seeded dataset.
+
+Each scenario drives one endpoint in-process through DRF's APIClient, so the
+numbers cover the full Django stack (middleware, authentication, views,
+serializers, ORM) without network noise. Per request we record wall time,
+the number of SQL queries and the time spent executing them (through
+connection.execute_wrapper, so DEBUG stays off). Peak memory comes from a
+separate, shorter pass under tracemalloc, which slows everything down too
+much to share the timed pass.
+
+The `*_model` scenarios repeat a list scenario with the view's
+row_serializer_class switched off, so the values() fast path
+(social_media_api/serialization.py) is measured against ModelSerializer.
+
+run() returns a JSON-serializable report; compare() diffs two of them.
+"""
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts.login import last_logins
+from notifications.pipeline import notification_pipeline
+from posts.buffers import like_buffer
+from posts import views
+from posts.models import Like, Post
+
+from . import data
+
+PERCENTILES = (50, 90, 95, 99)
+MEMORY_SAMPLES = 5
+
+
+class QueryRecorder:
+    """execute_wrapper that counts queries and their database time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class Dataset:
+    """What the scenarios need to know about the seeded data"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.tokens = list(
+            Token.objects.filter(user__in=data.bench_users()).order_by('user_id').values_list('user_id', 'key')
+        )
+        if not self.tokens:
+            raise ValueError('No benchmark data; run seed_benchmark_data first.')
+        self.post_ids = list(Post.objects.filter(author__in=data.bench_users()).values_list('id', flat=True))
+        # data.follow_graph ranks authors by id, so the first users have the most followers
+        self.popular_user_ids = [user_id for user_id, _ in self.tokens[:10]]
+        self.usernames = dict(data.bench_users().values_list('id', 'username'))
+
+    def reader(self):
+        return self.rng.choice(self.tokens)
+
+
+class Scenario:
+    """One endpoint; subclasses build the next request"""
+    name = None
+    description = ''
+    method = 'get'
+    view = None  # list view whose row serializer the *_model variants switch off
+    row_serializer = True
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def active(self):
+        """Context the scenario runs in"""
+        if self.row_serializer or self.view is None:
+            return nullcontext()
+        return mock.patch.object(self.view, 'row_serializer_class', None)
+
+    def request(self):
+        """(token key, path, data) of the next request"""
+        raise NotImplementedError
+
+    def cleanup(self, client, path):
+        """Untimed work undoing a request's writes, so iterations stay comparable"""
+
+
+class FeedScenario(Scenario):
+    name = 'feed'
+    description = 'Home timeline of a random reader'
+    view = views.FeedView
+
+    def request(self):
+        _, key = self.dataset.reader()
+        return key, '/posts/feed/', None
+
+
+class PostListScenario(Scenario):
+    name = 'post_list'
+    description = 'Newest posts, first page'
+    view = views.PostViewSet
+
+    def request(self):
+        _, key = self.dataset.reader()
+        return key, '/posts/posts/', None
+
+
+class EmojiListScenario(Scenario):
+    name = 'emoji_list'
+    description = 'Emoji reactions, first page'
+    view = views.EmojiViewSet
+
+    def request(self):
+        _, key = self.dataset.reader()
+        return key, '/posts/emojis/', None
+
+
+class FeedModelScenario(FeedScenario):
+    name = 'feed_model'
+    description = 'feed through PostSerializer'
+    row_serializer = False
+
+
+class PostListModelScenario(PostListScenario):
+    name = 'post_list_model'
+    description = 'post_list through PostSerializer'
+    row_serializer = False
+
+
+class EmojiListModelScenario(EmojiListScenario):
+    name = 'emoji_list_model'
+    description = 'emoji_list through EmojiSerializer'
+    row_serializer = False
+
+
+class LikeScenario(Scenario):
+    name = 'like'
+    description = 'Like a random post, written unbuffered (undone after timing)'
+    method = 'post'
+
+    def __init__(self, dataset):
+        super().__init__(dataset)
+        # only like posts the reader hasn't liked, so the unlike restores the seeded data
+        self.liked = set(Like.objects.filter(post_id__in=dataset.post_ids).values_list('user_id', 'post_id'))
+
+    def active(self):
+        # time the insert itself: with the buffer on, the like would only be queued and the
+        # unlike in cleanup() would cancel it before any flush, so nothing would be written
+        return override_settings(LIKE_BUFFER={**getattr(settings, 'LIKE_BUFFER', {}), 'ENABLED': False})
+
+    def request(self):
+        while True:
+            user_id, key = self.dataset.reader()
+            post_id = self.dataset.rng.choice(self.dataset.post_ids)
+            if (user_id, post_id) not in self.liked:
+                return key, f'/posts/posts/{post_id}/like/', None
+
+    def cleanup(self, client, path):
+        client.post(path.replace('/like/', '/unlike/'), secure=True)
+
+
+class SearchScenario(Scenario):
+    name = 'search'
+    description = 'Full-text search for two random words'
+
+    def request(self):
+        _, key = self.dataset.reader()
+        words = ' '.join(self.dataset.rng.sample(data.WORDS, 2))
+        return key, '/posts/posts/', {'search': words}
+
+
+class FollowersScenario(Scenario):
+    name = 'followers'
+    description = 'First page of followers of a popular user'
+
+    def request(self):
+        _, key = self.dataset.reader()
+        target = self.dataset.rng.choice(self.dataset.popular_user_ids)
+        return key, f'/accounts/followers/{target}/', None
+
+
+class LoginScenario(Scenario):
+    name = 'login'
+    description = 'Log a random user in with their password'
+    method = 'post'
+
+    def request(self):
+        user_id, key = self.dataset.reader()
+        return key, '/accounts/login/', {'username': self.dataset.usernames[user_id], 'password': data.PASSWORD}
+
+
+class NotificationsScenario(Scenario):
+    name = 'notifications'
+    description = "A random user's notification inbox"
+
+    def request(self):
+        _, key = self.dataset.reader()
+        return key, '/notifications/notifications/', None
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [FeedScenario, FeedModelScenario, PostListScenario, PostListModelScenario, EmojiListScenario,
+                     EmojiListModelScenario, LikeScenario, SearchScenario, FollowersScenario, NotificationsScenario,
+                     LoginScenario]
+}
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    rank = max(1, round(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+def server_name():
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def make_client():
+    return APIClient(SERVER_NAME=server_name())
+
+
+def perform(client, scenario):
+    """Send one request; returns (response, seconds, QueryRecorder)"""
+    key, path, params = scenario.request()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+    recorder = QueryRecorder()
+    send = getattr(client, scenario.method)
+    with connection.execute_wrapper(recorder):
+        started = time.perf_counter()
+        response = send(path, params, secure=True)
+        elapsed = time.perf_counter() - started
+    scenario.cleanup(client, path)
+    return response, elapsed, recorder
+
+
+def flush_buffers():
+    like_buffer.flush()
+    notification_pipeline.flush()
+    last_logins.flush()
+
+
+def run_scenario(scenario, iterations, warmup):
+    client = make_client()
+    for _ in range(warmup):
+        perform(client, scenario)
+
+    latencies, queries, db_seconds, sizes = [], [], [], []
+    statuses = {}
+    for _ in range(iterations):
+        response, elapsed, recorder = perform(client, scenario)
+        latencies.append(elapsed)
+        queries.append(recorder.count)
+        db_seconds.append(recorder.seconds)
+        sizes.append(len(response.content))
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+    total = sum(latencies)
+    flush_buffers()  # buffered writes land outside the measured window
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(min(iterations, MEMORY_SAMPLES)):
+        tracemalloc.reset_peak()
+        perform(client, scenario)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    flush_buffers()
+
+    latencies.sort()
+    return {
+        'description': scenario.description,
+        'requests': iterations,
+        'errors': sum(count for status, count in statuses.items() if int(status) >= 400),
+        'status_codes': statuses,
+        # sequential, single-threaded: requests per second of one worker
+        'throughput_rps': round(iterations / total, 2) if total else None,
+        'latency_ms': {
+            **{f'p{percent}': milliseconds(percentile(latencies, percent)) for percent in PERCENTILES},
+            'max': milliseconds(latencies[-1]),
+            'mean': milliseconds(statistics.fmean(latencies)),
+        },
+        'queries': {'mean': round(statistics.fmean(queries), 2), 'max': max(queries)},
+        'db_ms_mean': milliseconds(statistics.fmean(db_seconds)),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'response_bytes_mean': round(statistics.fmean(sizes)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names=None, iterations=100, warmup=10, seed=42):
+    """Run the named scenarios (all by default) and return the report"""
+    if iterations < 1:
+        raise ValueError('iterations must be at least 1')
+    unknown = set(names or []) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    dataset = Dataset(random.Random(seed))
+    results = {}
+    for name in names or SCENARIOS:
+        scenario = SCENARIOS[name](dataset)
+        with scenario.active():
+            results[name] = run_scenario(scenario, iterations, warmup)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'iterations': iterations,
+            'warmup': warmup,
+            'seed': seed,
+            'dataset': {'users': len(dataset.tokens), 'posts': len(dataset.post_ids)},
+        },
+        'scenarios': results,
+    }
+
+
+def compare(report, baseline):
+    """Per scenario change of the headline numbers against a baseline report, in percent"""
+    changes = {}
+    for name, result in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        pairs = {
+            'p50_ms': (before['latency_ms']['p50'], result['latency_ms']['p50']),
+            'p95_ms': (before['latency_ms']['p95'], result['latency_ms']['p95']),
+            'throughput_rps': (before['throughput_rps'], result['throughput_rps']),
+            'queries_mean': (before['queries']['mean'], result['queries']['mean']),
+        }
+        changes[name] = {
+            key: round((new - old) / old * 100, 1) if old else None
+            for key, (old, new) in pairs.items()
+        }
+    return changes
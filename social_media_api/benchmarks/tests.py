@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from posts.models import Like, Post, TimelineEntry
+
+from . import contention, data, runner
+
+User = get_user_model()
+
+
+class DataGeneratorTests(TestCase):
+    def test_generate_is_deterministic_and_skewed(self):
+        summary = data.generate(users=30, posts_per_user=2, follows_per_user=5, likes_per_post=3, seed=7)
+        self.assertEqual(summary['users'], 30)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertTrue(all(len(content) >= data.MIN_CONTENT_LENGTH
+                            for content in Post.objects.values_list('content', flat=True)))
+
+        # the top-ranked author collects far more followers than an even split would give
+        first = data.bench_users().order_by('id').first()
+        self.assertGreater(first.followers.count(), 5 * 2)
+        self.assertEqual(summary['max_followers'], first.followers.count())
+
+        # bulk inserts skip the signals, so counters and timelines were rebuilt afterwards
+        post = Post.objects.filter(like_count__gt=0).first()
+        self.assertEqual(post.like_count, Like.objects.filter(post=post).count())
+        self.assertEqual(TimelineEntry.objects.count(), summary['timeline_entries'])
+
+        data.reset()
+        self.assertFalse(User.objects.exists())
+        again = data.generate(users=30, posts_per_user=2, follows_per_user=5, likes_per_post=3, seed=7)
+        summary.pop('seconds'), again.pop('seconds')
+        self.assertEqual(again, summary)
+
+    def test_seed_command_refuses_to_seed_twice(self):
+        call_command('seed_benchmark_data', users=5, posts_per_user=1, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark_data', users=5, posts_per_user=1, stdout=StringIO())
+        call_command('seed_benchmark_data', users=5, posts_per_user=1, reset=True, stdout=StringIO())
+        self.assertEqual(data.bench_users().count(), 5)
+
+
+@override_settings(LIKE_BUFFER={'ENABLED': True, 'MAX_SIZE': 500, 'FLUSH_INTERVAL': 0},
+                   NOTIFICATION_PIPELINE={'ENABLED': True, 'MAX_SIZE': 500, 'FLUSH_INTERVAL': 0},
+                   LAST_LOGIN_BUFFER={'ENABLED': True, 'MAX_SIZE': 1000, 'FLUSH_INTERVAL': 0})
+class RunnerTests(TestCase):
+    def setUp(self):
+        data.generate(users=12, posts_per_user=2, follows_per_user=4, likes_per_post=2, seed=1)
+
+    def test_every_scenario_reports_without_errors(self):
+        likes = Like.objects.count()
+        report = runner.run(iterations=3, warmup=1)
+
+        self.assertEqual(set(report['scenarios']), set(runner.SCENARIOS))
+        self.assertEqual(report['meta']['dataset'], {'users': 12, 'posts': 24})
+        for name, result in report['scenarios'].items():
+            self.assertEqual(result['requests'], 3, name)
+            self.assertEqual(result['errors'], 0, (name, result['status_codes']))
+            self.assertGreater(result['queries']['mean'], 0, name)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['max'])
+            self.assertGreater(result['peak_memory_kb'], 0)
+        self.assertEqual(Like.objects.count(), likes)  # every like was undone
+
+    def test_like_scenario_writes_a_row_inside_the_timed_request(self):
+        likes = Like.objects.count()
+        seen = []
+        cleanup = runner.LikeScenario.cleanup
+
+        def check_then_cleanup(scenario, client, path):
+            seen.append(Like.objects.count() - likes)
+            cleanup(scenario, client, path)
+
+        with mock.patch.object(runner.LikeScenario, 'cleanup', check_then_cleanup):
+            report = runner.run(['like'], iterations=3, warmup=0)
+        self.assertEqual(seen, [1] * 6)  # three timed requests, then three under tracemalloc
+        self.assertEqual(report['scenarios']['like']['status_codes'], {'200': 3})
+        self.assertEqual(Like.objects.count(), likes)
+
+    def test_command_writes_report_and_compares_with_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = os.path.join(directory, 'first.json')
+            call_command('run_benchmarks', scenario=['post_list'], iterations=2, warmup=0,
+                         output=first, stdout=StringIO())
+            out = StringIO()
+            call_command('run_benchmarks', scenario=['post_list'], iterations=2, warmup=0,
+                         baseline=first, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(list(report['scenarios']), ['post_list'])
+        self.assertIn('p95_ms', report['change_percent']['post_list'])
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(runner.percentile(values, 50), 50)
+        self.assertEqual(runner.percentile(values, 99), 99)
+        self.assertEqual(runner.percentile([5], 95), 5)
+
+
+class ContentionTests(TestCase):
+    def setUp(self):
+        data.generate(users=8, posts_per_user=2, follows_per_user=3, likes_per_post=1, seed=2)
+
+    def test_both_strategies_replay_the_same_pairs(self):
+        likes = Like.objects.count()
+        report = contention.run(writers=1, attempts=30, pool=5)
+
+        check_first, insert_first = report['strategies']['check_first'], report['strategies']['insert_first']
+        self.assertEqual(check_first['outcomes'], insert_first['outcomes'])
+        self.assertEqual(check_first['outcomes']['created'], report['meta']['pool'])
+        self.assertEqual(insert_first['attempts'], 30)
+        self.assertEqual(Like.objects.count(), likes)
+
+    def test_command_writes_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'contention.json')
+            out = StringIO()
+            call_command('run_contention_benchmark', writers=1, attempts=10, pool=3, output=path, stdout=out)
+            with open(path) as handle:
+                report = json.load(handle)
+        self.assertEqual(set(report['strategies']), {'check_first', 'insert_first'})
+        self.assertIn('insert_first', out.getvalue())
+
+    def test_command_needs_seeded_data(self):
+        Post.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('run_contention_benchmark', writers=1, attempts=1, stdout=StringIO())
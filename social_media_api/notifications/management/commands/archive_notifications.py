@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from notifications import unread
+from notifications.models import Notification, ArchivedNotification
+from social_media_api import conditional
+
+ARCHIVED_FIELDS = ['recipient_id', 'actor_id', 'verb', 'content_type_id', 'object_id',
+                   'timestamp', 'actor_count', 'is_read']
+
+
+class Command(BaseCommand):
+    help = 'Move notifications older than the retention period into the archive table, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90))
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        archived = 0
+
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    Notification.objects.filter(timestamp__lt=cutoff)
+                    .order_by('id')
+                    .values('id', *ARCHIVED_FIELDS)[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                ArchivedNotification.objects.bulk_create(
+                    ArchivedNotification(**{field: row[field] for field in ARCHIVED_FIELDS}) for row in rows
+                )
+                Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+            # Archived unread rows no longer count towards the badge; recount lazily
+            unread.forget({row['recipient_id'] for row in rows if not row['is_read']})
+            conditional.bump_notifications({row['recipient_id'] for row in rows})
+            archived += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} notification(s) older than {options["days"]} days.'))
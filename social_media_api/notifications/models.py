@@ -2,10 +2,25 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.prefetch import GenericPrefetch
 # Create your models here.
 
 User = get_user_model()
 
+
+class NotificationQuerySet(models.QuerySet):
+    def with_targets(self, *target_querysets):
+        """
+        Load actors with a join and targets with one IN query per content type.
+
+        Pass a queryset per target model to control how each group is fetched,
+        e.g. Comment.objects.select_related('author', 'post') so that
+        Comment.__str__ doesn't query again for every row.
+        """
+        target = GenericPrefetch('target', list(target_querysets)) if target_querysets else 'target'
+        return self.select_related('actor').prefetch_related(target)
+
+
 class Notification(models.Model):
     recipient = models.ForeignKey(User, related_name="notifications", on_delete=models.CASCADE)
     actor = models.ForeignKey(User, related_name="actions", on_delete=models.CASCADE)
@@ -17,6 +32,36 @@ class Notification(models.Model):
     target = GenericForeignKey("content_type", "object_id")  # combines them
 
     timestamp = models.DateTimeField(auto_now_add=True)
+    actor_count = models.PositiveIntegerField(default=1)  # > 1 when a burst was coalesced into this row
+    actor_ids = models.JSONField(default=list, blank=True)  # distinct actors counted so far, see pipeline.py
+    is_read = models.BooleanField(default=False)
+
+    objects = NotificationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'timestamp', 'id'], name='notif_recipient_keyset_idx'),  # keyset pagination
+            models.Index(fields=['recipient', 'is_read'], name='notif_recipient_unread_idx'),  # unread recounts
+        ]
+
+    def __str__(self):
+        if self.actor_count > 1:
+            return f"{self.actor} and {self.actor_count - 1} others {self.verb} {self.target} for {self.recipient}"
+        return f"{self.actor} {self.verb} {self.target} for {self.recipient}"
+
+
+class ArchivedNotification(models.Model):
+    """Notifications moved out of the hot table once they pass NOTIFICATION_RETENTION_DAYS"""
+    recipient = models.ForeignKey(User, related_name="archived_notifications", on_delete=models.CASCADE)
+    actor = models.ForeignKey(User, related_name="+", on_delete=models.CASCADE)
+    verb = models.CharField(max_length=255)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    target = GenericForeignKey("content_type", "object_id")
+    timestamp = models.DateTimeField()
+    actor_count = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.actor} {self.verb} {self.target} for {self.recipient}"
\ No newline at end of file
+        return f"{self.actor} {self.verb} {self.target} for {self.recipient} (archived)"
@@ -0,0 +1,127 @@
+# notifications/pipeline.py
+"""
+Asynchronous, coalescing notification writes.
+
+Notifications are queued per (recipient, verb, target) instead of being
+inserted inside the request. A flush turns each queued group into at most one
+row: if the recipient already has a notification for the same verb and target
+newer than COALESCE_WINDOW seconds it is bumped ("A and 48 others liked your
+post"), otherwise a new row is inserted. All inserts go out in one
+bulk_create and all bumps in one bulk_update.
+
+A row remembers the distinct actors it has counted (up to MAX_TRACKED_ACTORS)
+in actor_ids, so someone who likes, unlikes and likes again is counted once.
+Groups whose recipient was deleted, and actors who were, are dropped before
+the insert.
+
+Queued notifications live in the worker's memory until the flush. The exit
+flush covers a clean shutdown, but a worker that is killed (SIGKILL, the OOM
+killer) loses them, so the pipeline is off unless
+NOTIFICATION_PIPELINE_ENABLED is set. With ENABLED = False every notification
+is flushed on the spot, inside the request, and still coalesced.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from social_media_api import conditional
+from social_media_api.buffering import WriteBuffer
+
+from . import unread
+from .models import Notification
+
+MAX_TRACKED_ACTORS = 500  # beyond this, actor_ids stops growing and repeat actors may be counted again
+
+
+def content_type_id_for(obj):
+    """ContentType id for a model instance; ContentTypeManager caches these per process"""
+    return ContentType.objects.get_for_model(obj).id
+
+
+class NotificationPipeline(WriteBuffer):
+    setting_name = 'NOTIFICATION_PIPELINE'
+    defaults = dict(WriteBuffer.defaults, ENABLED=False, COALESCE_WINDOW=3600)
+
+    def notify(self, recipient_id, actor_id, verb, content_type_id, object_id):
+        if recipient_id == actor_id:
+            return  # don't notify yourself
+        self.add((recipient_id, verb, content_type_id, object_id), actor_id)
+        if not self.enabled:
+            self.flush()
+
+    def merge(self, pending, key, actor_id):
+        actors = pending.setdefault(key, [])
+        if actor_id in actors:
+            actors.remove(actor_id)
+        actors.append(actor_id)  # most recent actor last
+
+    def write(self, batch):
+        batch = self._live(batch)
+        if not batch:
+            return [], []
+        now = timezone.now()
+        since = now - timedelta(seconds=self.config('COALESCE_WINDOW'))
+
+        recent = {}
+        rows = Notification.objects.filter(
+            recipient_id__in={key[0] for key in batch},
+            verb__in={key[1] for key in batch},
+            object_id__in={key[3] for key in batch},
+            timestamp__gte=since,
+        ).order_by('timestamp')
+        for notification in rows:
+            key = (notification.recipient_id, notification.verb, notification.content_type_id, notification.object_id)
+            recent[key] = notification  # newest wins
+
+        to_create, to_update = [], []
+        newly_unread = Counter()
+        for key, actors in batch.items():
+            notification = recent.get(key)
+            if notification is None:
+                recipient_id, verb, content_type_id, object_id = key
+                to_create.append(Notification(
+                    recipient_id=recipient_id, actor_id=actors[-1], verb=verb,
+                    content_type_id=content_type_id, object_id=object_id, actor_count=len(actors),
+                    actor_ids=actors[-MAX_TRACKED_ACTORS:],
+                ))
+                newly_unread[recipient_id] += 1
+                continue
+            counted = notification.actor_ids or [notification.actor_id]  # rows from before actor_ids
+            seen = set(counted)
+            new_actors = [actor_id for actor_id in actors if actor_id not in seen]
+            notification.actor_count += len(new_actors)
+            notification.actor_ids = (counted + new_actors)[:MAX_TRACKED_ACTORS]
+            notification.actor_id = actors[-1]
+            notification.timestamp = now
+            if notification.is_read:
+                notification.is_read = False
+                newly_unread[notification.recipient_id] += 1
+            to_update.append(notification)
+
+        with transaction.atomic():
+            Notification.objects.bulk_create(to_create)
+            Notification.objects.bulk_update(to_update, ['actor', 'actor_count', 'actor_ids', 'timestamp', 'is_read'])
+        for recipient_id, delta in newly_unread.items():
+            unread.adjust(recipient_id, delta)
+        conditional.bump_notifications({notification.recipient_id for notification in to_create + to_update})
+        return to_create, to_update
+
+    def _live(self, batch):
+        """Drop recipients and actors that have been deleted since they were queued"""
+        user_ids = {key[0] for key in batch}
+        for actors in batch.values():
+            user_ids.update(actors)
+        users = set(get_user_model().objects.filter(id__in=user_ids).values_list('id', flat=True))
+        live = {}
+        for key, actors in batch.items():
+            actors = [actor_id for actor_id in actors if actor_id in users]
+            if key[0] in users and actors:
+                live[key] = actors
+        return live
+
+
+notification_pipeline = NotificationPipeline()
@@ -8,5 +8,5 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields = ["id", "actor", "verb", "target", "timestamp", "is_read"]
-        read_only_fields = ["id", "actor", "verb", "target", "timestamp"]
\ No newline at end of file
+        fields = ["id", "actor", "actor_count", "verb", "target", "timestamp", "is_read"]
+        read_only_fields = ["id", "actor", "actor_count", "verb", "target", "timestamp"]
\ No newline at end of file
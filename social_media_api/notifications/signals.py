@@ -0,0 +1,40 @@
+# notifications/signals.py
+"""
+Notification lists show their actor's username and their target's text (a
+post's title, or "Comment by <author> on <post title>"), which live outside
+the recipient's notifications scope. These receivers bump the scopes of the
+recipients shown a post, comment or user when it is edited or deleted, so
+their ETags do not keep the old text.
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from posts.models import Comment, Post
+
+from .utils import bump_showing
+
+
+@receiver(post_save, sender=Post)
+def post_edited(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'title' in update_fields):
+        bump_showing(post_ids=[instance.pk])
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    # before the cascade, while the post's comments can still be found
+    bump_showing(post_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Post) or getattr(origin, 'model', None) is Post:
+        return  # post_deleted covered it
+    bump_showing(comment_ids=[instance.pk])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_renamed(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'username' in update_fields):
+        bump_showing(user_ids=[instance.pk])
@@ -1,3 +1,268 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from posts.models import Post, Comment
+from . import unread
+from .models import Notification, ArchivedNotification
+from .pipeline import notification_pipeline
+from .utils import create_notification
+
+User = get_user_model()
+
+
+@override_settings(NOTIFICATION_PIPELINE={'ENABLED': True, 'MAX_SIZE': 100, 'FLUSH_INTERVAL': 0, 'COALESCE_WINDOW': 3600})
+class NotificationPipelineTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass12345') for i in range(3)]
+        self.post = Post.objects.create(author=self.author, title='Viral', content='x' * 1000)
+
+    def tearDown(self):
+        notification_pipeline.flush()
+
+    def test_notifications_are_queued_until_flush(self):
+        create_notification(recipient=self.author, actor=self.fans[0], verb='liked', target=self.post)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(notification_pipeline.flush(), 1)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_burst_is_coalesced_into_one_row(self):
+        for fan in self.fans:
+            create_notification(recipient=self.author, actor=fan, verb='liked', target=self.post)
+        create_notification(recipient=self.author, actor=self.fans[0], verb='liked', target=self.post)
+        notification_pipeline.flush()
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.actor, self.fans[0])  # most recent actor
+        self.assertEqual(str(notification), 'fan0 and 2 others liked Viral for author')
+
+    def test_later_flush_bumps_recent_row(self):
+        create_notification(recipient=self.author, actor=self.fans[0], verb='liked', target=self.post)
+        notification_pipeline.flush()
+        create_notification(recipient=self.author, actor=self.fans[1], verb='liked', target=self.post)
+        notification_pipeline.flush()
+
+        notification = Notification.objects.get()
+        self.assertEqual((notification.actor, notification.actor_count), (self.fans[1], 2))
+
+    def test_returning_actor_is_counted_once(self):
+        for fan in (self.fans[0], self.fans[1], self.fans[0], self.fans[1]):
+            create_notification(recipient=self.author, actor=fan, verb='liked', target=self.post)
+            notification_pipeline.flush()
+
+        notification = Notification.objects.get()
+        self.assertEqual((notification.actor, notification.actor_count), (self.fans[1], 2))
+
+    def test_deleted_users_do_not_block_the_queue(self):
+        other = User.objects.create_user(username='other', password='pass12345')
+        create_notification(recipient=other, actor=self.fans[0], verb='liked', target=self.post)
+        create_notification(recipient=self.author, actor=self.fans[1], verb='liked', target=self.post)
+        create_notification(recipient=self.author, actor=self.fans[2], verb='liked', target=self.post)
+        other.delete()
+        self.fans[2].delete()
+
+        self.assertEqual(notification_pipeline.flush(), 2)
+        notification = Notification.objects.get()
+        self.assertEqual((notification.recipient, notification.actor_count), (self.author, 1))
+
+    def test_old_rows_are_not_coalesced(self):
+        post_type = ContentType.objects.get_for_model(Post)
+        old = Notification.objects.create(recipient=self.author, actor=self.fans[0], verb='liked',
+                                          content_type=post_type, object_id=self.post.id)
+        Notification.objects.filter(pk=old.pk).update(timestamp=old.timestamp.replace(year=2000))
+        create_notification(recipient=self.author, actor=self.fans[1], verb='liked', target=self.post)
+        notification_pipeline.flush()
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_flush_is_one_lookup_and_one_insert(self):
+        other = Post.objects.create(author=self.author, title='Other', content='x' * 1000)
+        for post in (self.post, other):
+            for fan in self.fans:
+                create_notification(recipient=self.author, actor=fan, verb='liked', target=post)
+        # live users, lookup, savepoint, bulk insert, release, unread counter
+        with self.assertNumQueries(6):
+            notification_pipeline.flush()
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_self_notifications_are_dropped(self):
+        create_notification(recipient=self.author, actor=self.author, verb='liked', target=self.post)
+        self.assertEqual(notification_pipeline.flush(), 0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATION_PIPELINE={'ENABLED': False})
+class ReadStateTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass12345') for i in range(3)]
+        self.posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='x' * 1000) for i in range(3)]
+        for fan, post in zip(self.fans, self.posts):
+            create_notification(recipient=self.author, actor=fan, verb='liked', target=post)
+        self.client.force_authenticate(user=self.author)
+
+    def test_unread_count_is_served_from_cache(self):
+        url = reverse('notification-unread-count')
+        self.assertEqual(self.client.get(url).data, {'unread': 3})
+        with self.assertNumQueries(1):  # the shared counter, nothing from the notifications table
+            self.assertEqual(self.client.get(url).data, {'unread': 3})
+
+        create_notification(recipient=self.author, actor=self.fans[0], verb='commented on', target=self.posts[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).data, {'unread': 4})
+
+    def test_counter_is_shared_and_expires(self):
+        self.client.get(reverse('notification-unread-count'))
+        key = unread._key(self.author.id)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(unread.counter_cache().get(key), 3)
+
+        unread.counter_cache().set(key, 99, timeout=1)  # a count that lost an adjustment
+        later = timezone.now() + timedelta(seconds=2)
+        with mock.patch('django.core.cache.backends.db.tz_now', return_value=later):
+            self.assertEqual(unread.unread_count(self.author.id), 3)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       NOTIFICATION_UNREAD_CACHE='default')
+    def test_per_process_counter_cache_fails_the_system_check(self):
+        self.assertEqual([error.id for error in unread.check_counter_cache(None)], ['notifications.E002'])
+
+    def test_mark_all_read_up_to_timestamp(self):
+        oldest = Notification.objects.order_by('timestamp').first()
+        response = self.client.post(reverse('notification-mark-all-read'), {'up_to': oldest.timestamp.isoformat()})
+        self.assertEqual(response.data, {'marked_read': 1, 'unread': 2})
+
+        response = self.client.post(reverse('notification-mark-all-read'))
+        self.assertEqual(response.data, {'marked_read': 2, 'unread': 0})
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_mark_all_read_rejects_bad_timestamps(self):
+        url = reverse('notification-mark-all-read')
+        for up_to in ('yesterday', '2025-13-45T00:00', 123):
+            response = self.client.post(url, {'up_to': up_to}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, up_to)
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 3)
+
+    def test_mark_read_and_list_expose_read_state(self):
+        notification = Notification.objects.first()
+        response = self.client.post(reverse('notification-mark-read', kwargs={'pk': notification.pk}))
+        self.assertEqual(response.data['unread'], 2)
+        listed = {item['id']: item['is_read'] for item in self.client.get(reverse('notification-list')).data['results']}
+        self.assertTrue(listed[notification.pk])
+
+    def test_mark_read_with_a_non_numeric_id_is_not_found(self):
+        response = self.client.post(reverse('notification-mark-read', kwargs={'pk': 'abc'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 3)
+
+    def test_coalesced_bump_makes_read_row_unread_again(self):
+        self.client.post(reverse('notification-mark-all-read'))
+        create_notification(recipient=self.author, actor=self.fans[1], verb='liked', target=self.posts[0])
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data, {'unread': 1})
+
+    def test_archive_moves_old_rows_and_resets_counter(self):
+        Notification.objects.filter(actor=self.fans[0]).update(timestamp=timezone.now() - timedelta(days=120))
+        self.client.get(reverse('notification-unread-count'))  # warm the counter
+
+        call_command('archive_notifications', days=90, batch_size=1, stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(ArchivedNotification.objects.get().actor, self.fans[0])
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data, {'unread': 2})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATION_PIPELINE={'ENABLED': False})
+class NotificationQueryCountTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        fans = [User.objects.create_user(username=f'fan{i}', password='pass12345') for i in range(4)]
+        for i in range(12):
+            fan = fans[i % len(fans)]
+            post = Post.objects.create(author=self.author, title=f'Post {i}', content='x' * 1000)
+            comment = Comment.objects.create(post=post, author=fan, content='Nice')
+            create_notification(recipient=self.author, actor=fan, verb='liked', target=post)
+            create_notification(recipient=self.author, actor=fan, verb='commented on', target=comment)
+        self.client.force_authenticate(user=self.author)
+
+    def list_queries(self, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('notification-list'), {'page_size': page_size})
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.list_queries(2)  # warm the ContentType cache
+        # ETag versions, notifications + actor join, then one IN query for posts and one for comments
+        self.assertEqual(self.list_queries(2), 4)
+        self.assertEqual(self.list_queries(24), 4)
+
+    def test_targets_are_rendered(self):
+        results = self.client.get(reverse('notification-list'), {'page_size': 2}).data['results']
+        self.assertEqual(results[0]['target'], 'Comment by fan3 on Post 11')
+        self.assertEqual(results[1]['target'], 'Post 11')
+
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATION_PIPELINE={'ENABLED': False})
+class NotificationConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.fan = User.objects.create_user(username='fan', password='pass12345')
+        self.post = Post.objects.create(author=self.author, title='Post', content='x' * 1000)
+        create_notification(recipient=self.author, actor=self.fan, verb='liked', target=self.post)
+        self.client.force_authenticate(user=self.author)
+
+    def test_inbox_is_revalidated_until_something_changes(self):
+        url = reverse('notification-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):  # the version lookup
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):  # versions are stamped on commit
+            create_notification(recipient=self.author, actor=self.fan, verb='commented on', target=self.post)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notification-mark-all-read'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_edited_target_and_renamed_actor_change_the_etag(self):
+        url = reverse('notification-list')
+        etag = self.client.get(url)['ETag']
+        self.post.title = 'Edited'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['target'], 'Edited')
+
+        etag = response['ETag']
+        self.fan.username = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fan.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['actor'], 'renamed')
+
+    def test_other_users_changes_keep_the_etag(self):
+        url = reverse('notification-list')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notification(recipient=self.fan, actor=self.author, verb='liked', target=self.post)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
@@ -0,0 +1,65 @@
+# notifications/unread.py
+"""
+Per-user unread notification counters.
+
+The badge count lives in the cache and is moved incrementally by the code that
+creates or reads notifications, so the badge endpoint never counts the
+notifications table. A missing key (cold cache, eviction, archival) is rebuilt
+with one indexed COUNT on (recipient, is_read).
+
+A notification created on one worker may be marked read on another, so the
+counters live in the NOTIFICATION_UNREAD_CACHE cache, shared by every process;
+a system check rejects a per-process LocMemCache. Backends without an atomic
+incr (the database cache) can still lose a concurrent adjustment, so counters
+expire after NOTIFICATION_UNREAD_TIMEOUT seconds and are recounted.
+"""
+from django.conf import settings
+from django.core import checks
+
+from social_media_api.shared_cache import check_shared, shared_cache
+
+from .models import Notification
+
+
+def _key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def counter_cache():
+    return shared_cache('NOTIFICATION_UNREAD_CACHE')
+
+
+def _timeout():
+    return getattr(settings, 'NOTIFICATION_UNREAD_TIMEOUT', 300)
+
+
+@checks.register(checks.Tags.caches)
+def check_counter_cache(app_configs, **kwargs):
+    return check_shared(
+        'NOTIFICATION_UNREAD_CACHE', 'notifications.E001', 'notifications.E002',
+        'Each worker would keep its own unread counter, and badges would disagree once a notification '
+        'is created on one worker and read on another.',
+    )
+
+
+def unread_count(user_id):
+    cache = counter_cache()
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.add(_key(user_id), count, timeout=_timeout())
+    return max(count, 0)
+
+
+def adjust(user_id, delta):
+    """Move a user's counter; a cold counter is left to be recounted on next read"""
+    if not delta:
+        return
+    try:
+        counter_cache().incr(_key(user_id), delta)
+    except ValueError:
+        pass
+
+
+def forget(user_ids):
+    counter_cache().delete_many([_key(user_id) for user_id in user_ids])
@@ -1,12 +1,29 @@
 # notifications/utils.py
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+
+from posts.models import Comment, Post
+from social_media_api.conditional import bump_notifications
+
 from .models import Notification
+from .pipeline import notification_pipeline, content_type_id_for
+
 
 def create_notification(recipient, actor, verb, target=None):
+    """Queue a notification; it is written (or coalesced) by the pipeline's next flush"""
     if recipient == actor:
         return  # don’t notify yourself
-    Notification.objects.create(
-        recipient=recipient,
-        actor=actor,
-        verb=verb,
-        target=target
+    notification_pipeline.notify(recipient.pk, actor.pk, verb, content_type_id_for(target), target.pk)
+
+
+def bump_showing(post_ids=(), comment_ids=(), user_ids=()):
+    """Bump the notifications scope of every recipient whose list shows these posts, comments or users"""
+    types = ContentType.objects.get_for_models(Post, Comment)
+    comments = Comment.objects.filter(Q(post_id__in=post_ids) | Q(author_id__in=user_ids) | Q(pk__in=comment_ids))
+    shown = (
+        Q(content_type=types[Post], object_id__in=post_ids)
+        | Q(content_type=types[Comment], object_id__in=comments.values('pk'))
+        | Q(actor_id__in=user_ids)
     )
+    recipients = Notification.objects.filter(shown).values_list('recipient_id', flat=True).distinct()
+    bump_notifications(set(recipients))
@@ -1,7 +1,7 @@
 from django.shortcuts import render
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated 
-from rest_framework.authentication import TokenAuthentication
+from accounts.authentication import CachedTokenAuthentication
 from .models import Notification
 from .serializers import NotificationSerializer
 from rest_framework import serializers
@@ -10,17 +10,70 @@ from rest_framework import serializers
 # notifications/views.py
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
+from accounts.authentication import CachedTokenAuthentication
 from .models import Notification
 from .serializers import NotificationSerializer
+from . import unread
+from posts.models import Post, Comment
+from social_media_api.pagination import NotificationKeysetPagination
+from social_media_api.instrumentation import InstrumentedViewMixin
+from social_media_api.conditional import ConditionalGetMixin, bump_notifications, notifications_scope
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
-class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+class NotificationViewSet(InstrumentedViewMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    pagination_class = NotificationKeysetPagination
+
+    def conditional_scopes(self):
+        return [notifications_scope(self.request.user.id)]
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.filter(recipient=self.request.user).with_targets(
+            Post.objects.all(),
+            Comment.objects.select_related('author', 'post'),
+        )
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """Badge count, served from the cached counter"""
+        return Response({"unread": unread.unread_count(request.user.id)})
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """Mark every notification up to the `up_to` timestamp (default: now) as read"""
+        up_to = request.data.get('up_to')
+        try:
+            cutoff = parse_datetime(up_to) if up_to else timezone.now()
+        except (TypeError, ValueError):  # not a string, or out-of-range fields
+            cutoff = None
+        if cutoff is None:
+            return Response({"error": "up_to must be an ISO 8601 timestamp."}, status=status.HTTP_400_BAD_REQUEST)
+        marked = self.get_queryset().filter(is_read=False, timestamp__lte=cutoff).update(is_read=True)
+        unread.adjust(request.user.id, -marked)
+        if marked:
+            bump_notifications([request.user.id])
+        return Response({"marked_read": marked, "unread": unread.unread_count(request.user.id)})
+
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        try:
+            pk = Notification._meta.pk.to_python(pk)
+        except DjangoValidationError:
+            raise NotFound()
+        marked = self.get_queryset().filter(pk=pk, is_read=False).update(is_read=True)
+        unread.adjust(request.user.id, -marked)
+        if marked:
+            bump_notifications([request.user.id])
+        return Response({"marked_read": marked, "unread": unread.unread_count(request.user.id)})
+
     def perform_destroy(self, instance):
         if instance.recipient == self.request.user:
             instance.delete()
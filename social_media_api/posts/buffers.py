@@ -0,0 +1,136 @@
+# posts/buffers.py
+"""
+Buffered like ingestion.
+
+Like/unlike requests are acknowledged immediately and queued per
+(post_id, user_id); a like followed by an unlike before the next flush
+collapses to a single unlike. Each flush writes all pending likes with one
+bulk_create(ignore_conflicts=True), all pending unlikes with one DELETE, moves
+like_count with one UPDATE per distinct delta and hands new likes to the
+notification pipeline. Likes whose post or user was deleted while they were
+queued are dropped before the insert. Deltas count only the rows the flush
+really inserted or deleted, so rows another worker wrote first leave
+like_count alone.
+
+The buffer lives in one process, so until a flush nobody reads the pending
+writes: not the liking user on another worker, and not the post's like_count
+anywhere. Pending state is not overlaid on any response. The one
+read-your-writes guarantee is that GET /likes/ flushes first when the
+requesting user has anything pending in the worker serving it; post payloads
+(like_count) and every other worker catch up with the next flush, within
+FLUSH_INTERVAL seconds. The buffer is therefore off unless LIKE_BUFFER_ENABLED
+is set, for deployments where like throughput matters more than
+read-your-writes.
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from notifications.pipeline import notification_pipeline
+from social_media_api.buffering import WriteBuffer
+
+from . import counters
+from .models import Post, Like
+
+LIKE = True
+UNLIKE = False
+
+
+class LikeBuffer(WriteBuffer):
+    setting_name = 'LIKE_BUFFER'
+
+    def like(self, post_id, user_id):
+        self.add((post_id, user_id), LIKE)
+
+    def unlike(self, post_id, user_id):
+        self.add((post_id, user_id), UNLIKE)
+
+    def flush_for_user(self, user_id):
+        if self.has_pending(lambda key: key[1] == user_id):
+            self.flush()
+
+    def write(self, batch):
+        likes = [key for key, op in batch.items() if op is LIKE]
+        unlikes = [key for key, op in batch.items() if op is UNLIKE]
+
+        with transaction.atomic(), counters.suspended():
+            existing = self._existing(likes + unlikes)
+            created = [key for key in likes if key not in existing]
+            authors = self._authors(created)
+            created = self._inserted(self._live(created, authors))
+            removed = self._deleted([existing[key] for key in unlikes if key in existing])
+
+            deltas = Counter(post_id for post_id, _ in created)
+            deltas.subtract(removed)
+            counters.adjust_many('like_count', deltas)
+
+            self._notify(created, authors)
+
+    def _inserted(self, keys):
+        """
+        Insert likes for keys and return the keys this call actually inserted.
+
+        Another worker may insert the same pair after _existing() looked, in
+        which case ignore_conflicts skips ours; only rows carrying the
+        created_at this call stamped are counted.
+        """
+        if not keys:
+            return keys
+        likes = Like.objects.bulk_create(
+            [Like(post_id=post_id, user_id=user_id) for post_id, user_id in keys],
+            ignore_conflicts=True,
+        )
+        stamped = {(like.post_id, like.user_id): like.created_at for like in likes}
+        rows = Like.objects.filter(
+            post_id__in={post_id for post_id, _ in keys},
+            user_id__in={user_id for _, user_id in keys},
+            created_at__in=set(stamped.values()),
+        ).values_list('post_id', 'user_id', 'created_at')
+        return [(post_id, user_id) for post_id, user_id, created_at in rows
+                if stamped.get((post_id, user_id)) == created_at]
+
+    def _deleted(self, like_ids):
+        """Delete likes by id and return the post_id of each row this call removed"""
+        if not like_ids:
+            return []
+        # lock first: a row another worker deletes meanwhile drops out here instead of being counted
+        rows = list(Like.objects.select_for_update().filter(id__in=like_ids).values_list('id', 'post_id'))
+        Like.objects.filter(id__in=[like_id for like_id, _ in rows]).delete()
+        return [post_id for _, post_id in rows]
+
+    def _existing(self, keys):
+        """Map (post_id, user_id) -> Like.id for the keys that already exist"""
+        if not keys:
+            return {}
+        rows = Like.objects.filter(
+            post_id__in={post_id for post_id, _ in keys},
+            user_id__in={user_id for _, user_id in keys},
+        ).values_list('post_id', 'user_id', 'id')
+        wanted = set(keys)
+        return {(post_id, user_id): like_id for post_id, user_id, like_id in rows if (post_id, user_id) in wanted}
+
+    def _authors(self, keys):
+        """Map post_id -> author_id for the posts in keys that still exist"""
+        if not keys:
+            return {}
+        return dict(Post.objects.filter(id__in={post_id for post_id, _ in keys}).values_list('id', 'author_id'))
+
+    def _live(self, keys, authors):
+        """Drop keys whose post or user has been deleted since they were queued"""
+        if not keys:
+            return keys
+        users = set(get_user_model().objects.filter(id__in={user_id for _, user_id in keys}).values_list('id', flat=True))
+        return [(post_id, user_id) for post_id, user_id in keys if post_id in authors and user_id in users]
+
+    def _notify(self, created, authors):
+        if not created:
+            return
+        post_type_id = ContentType.objects.get_for_model(Post).id
+        for post_id, user_id in created:
+            if post_id in authors:
+                notification_pipeline.notify(authors[post_id], user_id, 'liked', post_type_id, post_id)
+
+
+like_buffer = LikeBuffer()
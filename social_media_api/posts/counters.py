@@ -0,0 +1,74 @@
+# posts/counters.py
+"""
+Denormalized like/comment/emoji counters on Post.
+
+Counters are moved with a single atomic `UPDATE ... SET n = n + 1` so
+concurrent writers never lose increments, and never drop below zero if they
+have drifted. `manage.py reconcile_post_counters` repairs any drift. Counter
+changes bump no ETag versions; see the counter window in
+social_media_api/conditional.py.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Post, Like, Comment, Emoji
+
+COUNTER_FIELDS = {
+    Like: 'like_count',
+    Comment: 'comment_count',
+    Emoji: 'emoji_count',
+}
+
+_local = threading.local()
+
+
+@contextmanager
+def suspended():
+    """Silence the per-row signal receivers while a bulk writer adjusts counters itself"""
+    previous = getattr(_local, 'suspended', False)
+    _local.suspended = True
+    try:
+        yield
+    finally:
+        _local.suspended = previous
+
+
+def is_suspended():
+    return getattr(_local, 'suspended', False)
+
+
+def adjust(post_id, field, delta):
+    """Atomically add delta to one counter of one post"""
+    if delta:
+        Post.objects.filter(pk=post_id).update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def adjust_many(field, deltas):
+    """Apply {post_id: delta} for one counter, one UPDATE per distinct delta"""
+    by_delta = {}
+    for post_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(post_id)
+    for delta, post_ids in by_delta.items():
+        Post.objects.filter(pk__in=post_ids).update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def actual_count(model):
+    """Subquery counting a related model's rows for the outer post"""
+    rows = (
+        model.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def with_actual_counts(queryset):
+    return queryset.annotate(**{
+        f'actual_{field}': actual_count(model) for model, field in COUNTER_FIELDS.items()
+    })
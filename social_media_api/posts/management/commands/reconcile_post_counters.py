@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+from social_media_api import conditional
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recount like/comment/emoji counters on posts and fix any drift, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = list(counters.COUNTER_FIELDS.values())
+        checked = fixed = 0
+        last_id = 0
+
+        while True:
+            # Walk the table by primary key so each batch is an index range scan
+            batch = list(
+                counters.with_actual_counts(Post.objects.filter(id__gt=last_id))
+                .order_by('id')
+                .only('id', *fields)[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            checked += len(batch)
+
+            drifted = []
+            for post in batch:
+                changed = False
+                for field in fields:
+                    actual = getattr(post, f'actual_{field}')
+                    if getattr(post, field) != actual:
+                        setattr(post, field, actual)
+                        changed = True
+                if changed:
+                    drifted.append(post)
+
+            fixed += len(drifted)
+            if drifted and not options['dry_run']:
+                Post.objects.bulk_update(drifted, fields)
+                conditional.bump_posts([post.id for post in drifted])
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} post(s). {verb} {fixed} with drifted counters.'))
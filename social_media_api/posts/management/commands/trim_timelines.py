@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Trim materialized home timelines back to TIMELINE_MAX_LENGTH entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only trim the timeline of this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        deleted = timeline.trim(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} timeline entr{"y" if deleted == 1 else "ies"}.'))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:29
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_INSTALL = [
+    """
+    CREATE FUNCTION posts_post_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER posts_post_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content ON posts_post
+    FOR EACH ROW EXECUTE FUNCTION posts_post_search_vector_update()
+    """,
+    "UPDATE posts_post SET title = title",  # fire the trigger for existing rows
+    "CREATE INDEX posts_post_search_idx ON posts_post USING GIN (search_vector)",
+]
+
+POSTGRES_REMOVE = [
+    "DROP INDEX IF EXISTS posts_post_search_idx",
+    "DROP TRIGGER IF EXISTS posts_post_search_vector_trigger ON posts_post",
+    "DROP FUNCTION IF EXISTS posts_post_search_vector_update()",
+]
+
+# SQLite keeps an FTS5 table instead; posts.search.ensure_sqlite_index() creates
+# it after every migrate, because SQLite table rebuilds drop its triggers.
+
+
+def install_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_INSTALL:
+            schema_editor.execute(statement)
+
+
+def remove_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_REMOVE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install_search, remove_search),
+    ]
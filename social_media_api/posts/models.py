@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 # Create your models here.
 
 User = get_user_model()
@@ -12,6 +13,23 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized counters, kept in step by posts/counters.py
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    emoji_count = models.PositiveIntegerField(default=0)
+
+    # Weighted title/content vector, filled by a database trigger on PostgreSQL
+    # (posts/search.py); unused on other databases
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='posts_post_keyset_idx'),  # keyset pagination
+            models.Index(fields=['like_count', 'id'], name='posts_post_popular_idx'),  # ?ordering=-like_count
+            models.Index(fields=['comment_count', 'id'], name='posts_post_commented_idx'),  # ?ordering=-comment_count
+            models.Index(fields=['emoji_count', 'id'], name='posts_post_reacted_idx'),  # ?ordering=-emoji_count
+        ]
+
     def __str__(self):
         return self.title
     
@@ -21,6 +39,11 @@ class Comment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='posts_comment_keyset_idx'),  # keyset pagination
+        ]
+
     def __str__(self):
         return f'Comment by {self.author} on {self.post.title}'
     
@@ -47,4 +70,20 @@ class Emoji(models.Model):
         unique_together = ('post', 'user', 'name')  # one emoji per user per post
 
     def __str__(self):
-        return f"{self.user.username} reacted with {self.name} to {self.post.title}"
\ No newline at end of file
+        return f"{self.user.username} reacted with {self.name} to {self.post.title}"
+
+
+class TimelineEntry(models.Model):
+    """A post fanned out into one follower's home timeline"""
+    owner = models.ForeignKey(User, related_name='timeline_entries', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='timeline_entries', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()  # copied from the post so feed reads never touch posts_post
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at'], name='posts_timeline_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post.title} in {self.owner.username}'s timeline"
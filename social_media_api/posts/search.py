@@ -0,0 +1,172 @@
+# posts/search.py
+"""
+Full-text search for posts.
+
+`?search=` used to compile to `title ILIKE '%term%' OR content ILIKE ...`,
+which scans every post. PostSearchFilter hands the query to a backend picked
+by database vendor instead:
+
+    postgresql  Post.search_vector (kept up to date by a trigger, GIN indexed),
+                ranked with ts_rank, snippets from ts_headline
+    sqlite      posts_post_fts, an external-content FTS5 table kept up to date
+                by triggers, ranked with bm25(), snippets from snippet()
+
+Other databases keep DRF's SearchFilter behaviour. Matches are annotated with
+`search_rank` (higher is better) and `search_snippet` (matched terms wrapped
+in <mark>), and ordered by relevance unless the client asked for an ordering.
+
+Snippets are HTML: the database marks matches with private-use characters,
+escapes the post text and only then turns the markers into <mark> tags, so
+markup in a post comes back as text.
+"""
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Value
+from django.db.models.functions import Replace
+from rest_framework import filters
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+SNIPPET_WORDS = 24
+
+# Stand-ins for the highlight tags while the snippet text is escaped
+MARK_START = '\ue000'
+MARK_STOP = '\ue001'
+SNIPPET_REPLACEMENTS = [
+    ('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'), ("'", '&#x27;'),
+    (MARK_START, HIGHLIGHT_START), (MARK_STOP, HIGHLIGHT_STOP),
+]
+
+SQLITE_TABLE = 'posts_post_fts'
+
+SQLITE_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5(
+        title, content, content='posts_post', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_TABLE}_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {SQLITE_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_TABLE}_delete AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_TABLE}_update AFTER UPDATE OF title, content ON posts_post BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO {SQLITE_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+SQLITE_OBJECTS = {SQLITE_TABLE, f'{SQLITE_TABLE}_insert', f'{SQLITE_TABLE}_delete', f'{SQLITE_TABLE}_update'}
+
+
+def ensure_sqlite_index(using='default'):
+    """
+    Create the FTS5 table and triggers if any are missing, then reindex.
+
+    Runs after every migrate: SQLite applies many ALTERs by rebuilding the
+    table, which silently drops triggers attached to it.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if 'posts_post' not in tables:
+            return False
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        if SQLITE_OBJECTS <= {name for (name,) in cursor.fetchall()}:
+            return False
+        for statement in SQLITE_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def _sql_string(text):
+    return "'%s'" % text.replace("'", "''")
+
+
+class PostgresBackend:
+    def search(self, queryset, text):
+        query = SearchQuery(text, config='english', search_type='websearch')
+        snippet = SearchHeadline(
+            'content', query, config='english',
+            start_sel=MARK_START, stop_sel=MARK_STOP, max_words=SNIPPET_WORDS,
+        )
+        for old, new in SNIPPET_REPLACEMENTS:
+            snippet = Replace(snippet, Value(old), Value(new))
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_snippet=snippet,
+        )
+
+
+class SQLiteBackend:
+    def match_expression(self, text):
+        """Quote every word so user input can't use FTS5 query syntax; words are ANDed"""
+        words = re.findall(r'\w+', text)
+        return ' '.join('"%s"' % word for word in words)
+
+    def snippet_sql(self):
+        snippet = f"snippet({SQLITE_TABLE}, 1, '{MARK_START}', '{MARK_STOP}', '...', {SNIPPET_WORDS})"
+        for old, new in SNIPPET_REPLACEMENTS:
+            snippet = f'replace({snippet}, {_sql_string(old)}, {_sql_string(new)})'
+        return snippet
+
+    def search(self, queryset, text):
+        match = self.match_expression(text)
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[SQLITE_TABLE],
+            where=[f'{SQLITE_TABLE}.rowid = {table}.id', f'{SQLITE_TABLE} MATCH %s'],
+            params=[match],
+            select={
+                # bm25() is lower-is-better; title hits weigh ten times a content hit
+                'search_rank': f'-bm25({SQLITE_TABLE}, 10.0, 1.0)',
+                'search_snippet': self.snippet_sql(),
+            },
+        )
+
+
+BACKENDS = {
+    'postgresql': PostgresBackend,
+    'sqlite': SQLiteBackend,
+}
+
+
+def get_backend(queryset):
+    backend = BACKENDS.get(connections[queryset.db].vendor)
+    return backend() if backend else None
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on Post querysets.
+
+    List it after OrderingFilter: relevance ordering is applied only when the
+    request has no `?ordering=`.
+    """
+    ordering_param = filters.OrderingFilter.ordering_param
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').replace('\x00', '').strip()
+        backend = get_backend(queryset)
+        if not text or backend is None:
+            return super().filter_queryset(request, queryset, view)
+        if not re.search(r'\w', text):
+            return queryset.none()  # nothing searchable, e.g. only punctuation
+
+        queryset = backend.search(queryset, text)
+        if self.ordering_param not in request.query_params:
+            queryset = queryset.order_by('-search_rank', '-created_at', '-id')
+        return queryset
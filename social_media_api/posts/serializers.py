@@ -1,13 +1,62 @@
+from collections import Counter
+
 from .models import Post, Comment, Like
+from notifications.utils import bump_showing
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from social_media_api import conditional
+from social_media_api.bulk import BulkListSerializer
+from social_media_api.integrity import InsertFirstMixin
+from social_media_api.serialization import ValuesSerializer
+
+from . import counters
+
+
+class PostBulkSerializer(BulkListSerializer):
+    updatable_fields = ('title', 'content')
+
+    # what posts.signals.bump_post_version (and notifications.signals.post_edited) does per row
+    def after_create(self, objects):
+        conditional.bump_posts([post.pk for post in objects])
+
+    def after_update(self, objects):
+        conditional.bump_posts([post.pk for post in objects])
+        bump_showing(post_ids=[post.pk for post in objects])
+
+
+class CountedBulkSerializer(BulkListSerializer):
+    """Bulk writer for rows counted on their post (comments, emojis)"""
+
+    def after_create(self, objects):
+        # what posts.signals.increment_post_counter does per row
+        counters.adjust_many(counters.COUNTER_FIELDS[self.model], Counter(row.post_id for row in objects))
+
+
+class CommentBulkSerializer(CountedBulkSerializer):
+    updatable_fields = ('content',)
+
+
+class EmojiBulkSerializer(CountedBulkSerializer):
+    updatable_fields = ('name', 'unicode')
 
+    def validate_batch(self, validated):
+        errors = super().validate_batch(validated) or [{} for _ in validated]
+        if self.instance is None:  # an update cannot move a reaction to another post
+            for index, attrs in enumerate(validated):
+                if attrs['post'].author_id == attrs['user'].id:  # what EmojiViewSet.perform_create refuses
+                    errors[index].setdefault(api_settings.NON_FIELD_ERRORS_KEY, []).append(
+                        "You cannot react to your own post dummy!.")
+        return errors if any(errors) else []
 
 
 class PostSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
-        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'author', 'created_at', 'updated_at']
+        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at',
+                  'like_count', 'comment_count', 'emoji_count']
+        read_only_fields = ['id', 'author', 'created_at', 'updated_at',
+                            'like_count', 'comment_count', 'emoji_count']
+        list_serializer_class = PostBulkSerializer  # many=True creates/updates in one query, see social_media_api/bulk.py
 
     def validate_content(self, value):
         if len(value) < 1000:
@@ -16,6 +65,13 @@ class PostSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         return Post.objects.create(**validated_data)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if hasattr(instance, 'search_rank'):  # annotated by posts/search.py
+            data['search_rank'] = instance.search_rank
+            data['search_snippet'] = instance.search_snippet
+        return data
     
     def update(self, instance, validated_data):
         instance.title = validated_data.get('title', instance.title)
@@ -29,7 +85,8 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ['id', 'post', 'author', 'content', 'created_at']
-        read_only_fields = ['id', 'post', 'author', 'created_at']
+        read_only_fields = ['id', 'author', 'created_at']
+        list_serializer_class = CommentBulkSerializer
 
     def validate_content(self, value):
         if len(value) < 400:
@@ -40,27 +97,34 @@ class CommentSerializer(serializers.ModelSerializer):
         return Comment.objects.create(**validated_data)
     
 
-class LikeSerializer(serializers.ModelSerializer):
+class LikeSerializer(InsertFirstMixin, serializers.ModelSerializer):
+    # the unique (post, user) index answers "already liked", see social_media_api/integrity.py
+    unique_error_messages = {('post', 'user'): "You have already liked this post."}
+
     class Meta:
         model = Like
         fields = ['id', 'post', 'user', 'created_at']
-        read_only_fields = ['id', 'post', 'user', 'created_at']
-
-    def create(self, validated_data):
-        return Like.objects.create(**validated_data)
-    
-    def validate(self, data):
-        if Like.objects.filter(post=data['post'], user=data['user']).exists():
-            raise serializers.ValidationError("You have already liked this post.")
-        return data
+        read_only_fields = ['id', 'user', 'created_at']
     
 from rest_framework import serializers
 from .models import Emoji
 
-class EmojiSerializer(serializers.ModelSerializer):
+class EmojiSerializer(InsertFirstMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
         model = Emoji
         fields = ['id', 'name', 'unicode', 'post', 'user', 'created_at']
-        read_only_fields = ['id', 'user', 'created_at']
\ No newline at end of file
+        read_only_fields = ['id', 'user', 'created_at']
+        list_serializer_class = EmojiBulkSerializer
+
+
+
+class PostRowSerializer(ValuesSerializer):
+    """PostSerializer output for list endpoints, built from values() rows"""
+    model_serializer = PostSerializer
+    optional_columns = ('search_rank', 'search_snippet')  # see PostSerializer.to_representation
+
+
+class EmojiRowSerializer(ValuesSerializer):
+    model_serializer = EmojiSerializer
@@ -0,0 +1,64 @@
+# posts/signals.py
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from social_media_api import conditional
+
+from . import counters, timeline
+from .models import Post, Like, Comment, Emoji, TimelineEntry
+
+User = get_user_model()
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def sync_timelines(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    """Keep materialized timelines in step with follows and unfollows"""
+    if action == 'pre_clear':
+        if reverse:
+            TimelineEntry.objects.filter(owner=instance).delete()
+        else:
+            TimelineEntry.objects.filter(post__author=instance).delete()
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+
+    # user.followers.add(...) -> instance is the author, pk_set are readers
+    # user.following.add(...) -> instance is the reader, pk_set are authors
+    for pk in pk_set:
+        owner_id, author_id = (instance.pk, pk) if reverse else (pk, instance.pk)
+        if action == 'post_add':
+            timeline.backfill(owner_id, author_id)
+        else:
+            timeline.remove_author(owner_id, author_id)
+    if action == 'post_remove' and pk_set:
+        timeline.unfollowed(dict.fromkeys(pk_set, 1) if reverse else {instance.pk: len(pk_set)}, using=using)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_version(sender, instance, **kwargs):
+    """Invalidate ETags of responses showing this post"""
+    conditional.bump_posts([instance.pk])
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Emoji)
+def increment_post_counter(sender, instance, created, **kwargs):
+    """Bump the post's like/comment/emoji counter when a row is added"""
+    if created and not counters.is_suspended():
+        counters.adjust(instance.post_id, counters.COUNTER_FIELDS[sender], 1)
+
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Emoji)
+def decrement_post_counter(sender, instance, origin=None, **kwargs):
+    """Drop the post's like/comment/emoji counter when a row is removed"""
+    if counters.is_suspended():
+        return
+    # Skip rows cascading away with their post; there is no counter left to fix
+    if isinstance(origin, Post) or getattr(origin, 'model', None) is Post:
+        return
+    counters.adjust(instance.post_id, counters.COUNTER_FIELDS[sender], -1)
@@ -1,3 +1,776 @@
-from django.test import TestCase
+import json
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+from rest_framework.validators import UniqueTogetherValidator
+
+from .models import Post, Comment, Like, Emoji, TimelineEntry
+from . import timeline, views
+from .serializers import EmojiSerializer, PostSerializer
+from .buffers import like_buffer
+from notifications.models import Notification
+from social_media_api import conditional
+from social_media_api.instrumentation import registry
+from social_media_api.integrity import create_unique
+from social_media_api.serialization import ValuesSerializer
+
+User = get_user_model()
+
+LONG_CONTENT = 'x' * 1000  # PostSerializer requires long content
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TimelineTests(APITestCase):
+    def setUp(self):
+        cache.clear()  # follow graph sets outlive the test transaction
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.stranger = User.objects.create_user(username='stranger', password='pass12345')
+        self.reader.following.add(self.author)
+
+    def _feed_titles(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.data['results']]
+
+    # ---------- Fan-out on write ----------
+    def test_new_post_is_fanned_out_to_followers(self):
+        self.client.force_authenticate(user=self.author)
+        response = self.client.post(reverse('post-list'), {'title': 'Hello', 'content': LONG_CONTENT})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post_id=response.data['id']).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.stranger).exists())
+        self.assertEqual(self._feed_titles(self.reader), ['Hello'])
+        self.assertEqual(self._feed_titles(self.stranger), [])
+
+    # ---------- Follow graph changes ----------
+    def test_follow_backfills_and_unfollow_removes(self):
+        Post.objects.create(author=self.author, title='Old', content=LONG_CONTENT)
+        self.stranger.following.add(self.author)
+        self.assertEqual(self._feed_titles(self.stranger), ['Old'])
+
+        self.stranger.following.remove(self.author)
+        self.assertEqual(self._feed_titles(self.stranger), [])
+
+    # ---------- Popular authors ----------
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_merged_on_read(self):
+        post = Post.objects.create(author=self.author, title='Viral', content=LONG_CONTENT)
+        self.assertEqual(timeline.fan_out_post(post), 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self._feed_titles(self.reader), ['Viral'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_posts_made_while_popular_are_fanned_out_when_the_author_drops_below(self):
+        self.stranger.following.add(self.author)
+        viral = Post.objects.create(author=self.author, title='Viral', content=LONG_CONTENT)
+        self.assertEqual(timeline.fan_out_post(viral), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stranger.following.remove(self.author)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post=viral).exists())
+        self.assertEqual(self._feed_titles(self.reader), ['Viral'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.posts = [Post.objects.create(author=self.user, title=f'Post {i}', content=LONG_CONTENT) for i in range(25)]
+        self.client.force_authenticate(user=self.user)
+
+    def test_cursor_walks_every_post_once_newest_first(self):
+        seen = []
+        url = reverse('post-list')
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, [post.id for post in reversed(self.posts)])
+
+    def test_cursor_is_stable_when_new_posts_arrive(self):
+        first = self.client.get(reverse('post-list'))
+        Post.objects.create(author=self.user, title='Newer', content=LONG_CONTENT)
+        second = self.client.get(first.data['next'])
+        self.assertEqual(second.data['results'][0]['id'], self.posts[14].id)
+
+    def test_page_number_clients_fall_back(self):
+        response = self.client.get(reverse('post-list'), {'page': 2})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('post-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, LIKE_BUFFER={'ENABLED': False},
+                   NOTIFICATION_PIPELINE={'ENABLED': False})
+class PostCounterTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.fan = User.objects.create_user(username='fan', password='pass12345')
+        self.post = Post.objects.create(author=self.author, title='Counted', content=LONG_CONTENT)
+        self.client.force_authenticate(user=self.fan)
+
+    def test_like_and_unlike_actions_move_like_count(self):
+        url = reverse('post-like', kwargs={'pk': self.post.pk})
+        self.client.post(url)
+        self.client.post(url)  # liking twice is a no-op
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        self.client.post(reverse('post-unlike', kwargs={'pk': self.post.pk}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_comments_and_emojis_are_counted(self):
+        Comment.objects.create(post=self.post, author=self.fan, content='Nice')
+        emoji = Emoji.objects.create(post=self.post, user=self.fan, name='heart', unicode='h')
+        emoji.delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.comment_count, self.post.emoji_count), (1, 0))
+
+    def test_order_by_popularity(self):
+        other = Post.objects.create(author=self.author, title='Popular', content=LONG_CONTENT)
+        Like.objects.create(post=other, user=self.fan)
+        response = self.client.get(reverse('post-list'), {'ordering': '-like_count'})
+        self.assertEqual(response.data['results'][0]['title'], 'Popular')
+        self.assertEqual(response.data['results'][0]['like_count'], 1)
+
+    def test_popularity_ordering_is_cursor_paginated(self):
+        posts = [Post.objects.create(author=self.author, title=f'Post {i}', content=LONG_CONTENT) for i in range(4)]
+        for i, post in enumerate(posts):
+            Post.objects.filter(pk=post.pk).update(comment_count=i % 2)
+
+        seen = []
+        url = reverse('post-list') + '?ordering=-comment_count&page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            seen += [(item['comment_count'], item['id']) for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(seen), Post.objects.count())
+
+    def test_reconcile_command_fixes_drift(self):
+        Like.objects.create(post=self.post, user=self.fan)
+        Post.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=3)
+        out = StringIO()
+        call_command('reconcile_post_counters', batch_size=1, stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+        self.assertIn('Fixed 1', out.getvalue())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, LIKE_BUFFER={'ENABLED': True, 'MAX_SIZE': 100, 'FLUSH_INTERVAL': 0},
+                   NOTIFICATION_PIPELINE={'ENABLED': False})
+class LikeBufferTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.fan = User.objects.create_user(username='fan', password='pass12345')
+        self.post = Post.objects.create(author=self.author, title='Buffered', content=LONG_CONTENT)
+        self.client.force_authenticate(user=self.fan)
+
+    def tearDown(self):
+        like_buffer.flush()
+
+    def test_like_is_acknowledged_then_written_in_batch(self):
+        response = self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(like_buffer.stats()['pending'], 1)
+
+        self.assertEqual(like_buffer.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertTrue(Like.objects.filter(post=self.post, user=self.fan).exists())
+        self.assertEqual(Notification.objects.filter(recipient=self.author, verb='liked').count(), 1)
+
+    def test_toggles_collapse_to_last_operation(self):
+        url = reverse('post-like', kwargs={'pk': self.post.pk})
+        self.client.post(url)
+        self.client.post(reverse('post-unlike', kwargs={'pk': self.post.pk}))
+        self.client.post(url)
+        self.client.post(reverse('post-unlike', kwargs={'pk': self.post.pk}))
+
+        with self.assertNumQueries(3):  # one lookup inside the transaction, nothing left to write
+            like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_liking_user_reads_own_writes(self):
+        self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        response = self.client.get(reverse('like-list'))
+        self.assertEqual([item['post'] for item in response.data['results']], [self.post.id])
+
+    def test_rows_written_by_another_worker_leave_the_counter_alone(self):
+        like_buffer.like(self.post.id, self.fan.id)
+        # another worker inserts the like after this flush looked for existing rows
+        with mock.patch.object(like_buffer, '_existing', return_value={}):
+            Like.objects.create(post=self.post, user=self.fan)
+            like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, Like.objects.count())
+
+        like = Like.objects.get()
+        Like.objects.create(post=self.post, user=self.author)
+        like_buffer.unlike(self.post.id, self.fan.id)
+        # ... and deletes it after the lookup
+        with mock.patch.object(like_buffer, '_existing', return_value={(self.post.id, self.fan.id): like.id}):
+            like.delete()
+            like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    @override_settings(LIKE_BUFFER={'ENABLED': True, 'MAX_SIZE': 2, 'FLUSH_INTERVAL': 0})
+    def test_size_threshold_triggers_flush(self):
+        other = Post.objects.create(author=self.author, title='Other', content=LONG_CONTENT)
+        like_buffer.like(self.post.id, self.fan.id)
+        self.assertFalse(Like.objects.exists())
+        like_buffer.like(other.id, self.fan.id)
+        self.assertEqual(Like.objects.count(), 2)
+
+    def test_likes_on_deleted_posts_do_not_block_the_batch(self):
+        doomed = Post.objects.create(author=self.author, title='Doomed', content=LONG_CONTENT)
+        like_buffer.like(doomed.id, self.fan.id)
+        like_buffer.like(self.post.id, self.fan.id)
+        doomed.delete()
+
+        self.assertEqual(like_buffer.flush(), 2)
+        self.assertEqual(list(Like.objects.values_list('post_id', flat=True)), [self.post.id])
+        self.assertEqual(like_buffer.stats()['pending'], 0)
+
+    def test_failing_key_is_dead_lettered_and_others_are_written(self):
+        other = Post.objects.create(author=self.author, title='Other', content=LONG_CONTENT)
+        like_buffer.like(self.post.id, self.fan.id)
+        like_buffer.like(other.id, self.fan.id)
+        write = like_buffer.write
+
+        def poisoned(batch):
+            if (other.id, self.fan.id) in batch:
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            write(batch)
+
+        dropped = like_buffer.dropped
+        with mock.patch.object(like_buffer, 'write', side_effect=poisoned), self.assertLogs('social_media_api.buffering'):
+            self.assertEqual(like_buffer.flush(), 1)
+            for _ in range(like_buffer.config('MAX_ATTEMPTS') - 1):
+                like_buffer.flush()
+        self.assertEqual(like_buffer.dropped, dropped + 1)
+        self.assertEqual(like_buffer.dead_letters[-1], ((other.id, self.fan.id), True))
+        self.assertEqual(like_buffer.stats()['pending'], 0)
+        self.assertEqual(list(Like.objects.values_list('post_id', flat=True)), [self.post.id])
+
+    def test_exit_flush_skips_a_different_database(self):
+        like_buffer.like(self.post.id, self.fan.id)
+        with mock.patch.dict(connection.settings_dict, {'NAME': 'elsewhere.sqlite3'}), \
+                self.assertLogs('social_media_api.buffering', level='WARNING'):
+            like_buffer._flush_at_exit()
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(like_buffer.stats()['pending'], 1)
+
+    def test_legacy_unlike_view_cancels_a_buffered_like(self):
+        self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        request = APIRequestFactory().post('/')
+        force_authenticate(request, user=self.fan)
+        response = views.UnlikePostView.as_view()(request, pk=self.post.pk)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        like_buffer.flush()
+        self.assertFalse(Like.objects.exists())
+
+
+@override_settings(TIMELINE_MAX_LENGTH=2, TIMELINE_TRIM_SLACK=1)
+class TimelineCapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.reader.following.add(self.author)
+
+    def _post(self, count):
+        posts = [Post.objects.create(author=self.author, title=f'Post {i}', content=LONG_CONTENT) for i in range(count)]
+        for post in posts:
+            timeline.fan_out_post(post)
+        return posts
+
+    def entries(self):
+        return TimelineEntry.objects.filter(owner=self.reader).count()
+
+    def test_fan_out_trims_once_past_the_slack(self):
+        posts = self._post(3)
+        self.assertEqual(self.entries(), 3)  # within the slack
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(timeline.timeline_post_ids(self.reader), [posts[2].id, posts[1].id])
+        table = TimelineEntry._meta.db_table
+        self.assertFalse([query for query in queries if table in query['sql'] and not query['sql'].startswith('SELECT')])
+
+        self._post(1)
+        self.assertEqual(self.entries(), 2)
+
+    def test_trim_command_cuts_to_the_cap(self):
+        self._post(3)
+        out = StringIO()
+        call_command('trim_timelines', stdout=out)
+        self.assertEqual(self.entries(), 2)
+        self.assertIn('Deleted 1 timeline entry', out.getvalue())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, LIKE_BUFFER={'ENABLED': False})
+class PostSearchTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.title_hit = Post.objects.create(author=self.author, title='Running shoes', content=LONG_CONTENT)
+        self.body_hit = Post.objects.create(author=self.author, title='Weekend', content='I went running today. ' + LONG_CONTENT)
+        self.miss = Post.objects.create(author=self.author, title='Cooking', content=LONG_CONTENT)
+
+    def _search(self, text, **params):
+        response = self.client.get(reverse('post-list'), {'search': text, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_matches_are_ranked_with_snippets(self):
+        results = self._search('run')  # stemmed
+        self.assertEqual([row['id'] for row in results], [self.title_hit.id, self.body_hit.id])
+        self.assertGreater(results[0]['search_rank'], results[1]['search_rank'])
+        self.assertIn('<mark>running</mark>', results[1]['search_snippet'])
+
+    def test_snippet_escapes_post_markup(self):
+        self.miss.content = '<script>alert("cooking")</script> & more. ' + LONG_CONTENT
+        self.miss.save()
+        snippet = self._search('cooking')[0]['search_snippet']
+        self.assertNotIn('<script>', snippet)
+        self.assertIn('&lt;script&gt;alert(&quot;<mark>cooking</mark>&quot;)&lt;/script&gt; &amp; more', snippet)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.miss.title = 'Running late'
+        self.miss.save()
+        self.title_hit.delete()
+        self.assertEqual({row['id'] for row in self._search('running')}, {self.body_hit.id, self.miss.id})
+
+    def test_explicit_ordering_wins_over_relevance(self):
+        results = self._search('running', ordering='created_at')
+        self.assertEqual([row['id'] for row in results], [self.title_hit.id, self.body_hit.id])
+
+    def test_query_syntax_is_treated_as_words(self):
+        self.assertEqual(self._search('"running" OR NEAR('), [])
+        self.assertEqual(self._search('***'), [])
+
+
+INSTRUMENT_ALL = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SERVER_TIMING': True, 'SLOW_QUERY_MS': 100,
+                  'SLOW_QUERY_SAMPLES': 50, 'ALLOWED_IPS': ['127.0.0.1']}
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, INSTRUMENTATION=INSTRUMENT_ALL)
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.reader.following.add(self.author)
+        Post.objects.create(author=self.author, title='Hello', content=LONG_CONTENT)
+        self.client.force_authenticate(user=self.reader)
+
+    def test_sampled_request_gets_server_timing_and_metrics(self):
+        response = self.client.get(reverse('feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response['Server-Timing']
+        for name in ('db;dur=', 'serialize;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(name, timing)
+
+        stats = registry.views['feed']
+        self.assertEqual(stats.count, 1)
+        self.assertGreater(stats.queries, 0)
+        self.assertIn(f'desc="{stats.queries} queries"', timing)
+        self.assertEqual(stats.response_bytes, len(response.content))
+        self.assertGreater(stats.serialize_seconds, 0)
+        self.assertGreater(stats.render_seconds, 0)
+
+        metrics = self.client.get(reverse('metrics'))
+        self.assertEqual(metrics['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = metrics.content.decode()
+        self.assertIn('django_view_requests_total{view="feed",method="GET",status="200"} 1', text)
+        self.assertIn('django_view_duration_seconds_count{view="feed"} 1', text)
+        self.assertIn(f'django_view_db_queries_total{{view="feed"}} {stats.queries}', text)
+
+    @override_settings(INSTRUMENTATION={**INSTRUMENT_ALL, 'SAMPLE_RATE': 0.0})
+    def test_unsampled_requests_are_left_alone(self):
+        response = self.client.get(reverse('feed'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(registry.views, {})
+
+    @override_settings(INSTRUMENTATION={**INSTRUMENT_ALL, 'SLOW_QUERY_MS': 0})
+    def test_slow_queries_are_sampled_with_their_origin(self):
+        with self.assertLogs('social_media_api.instrumentation', 'WARNING'):
+            self.client.get(reverse('feed'))
+        samples = self.client.get(reverse('metrics-slow-queries')).json()['slow_queries']
+        self.assertTrue(samples)
+        self.assertTrue(any(
+            frame.startswith('posts/timeline.py') for sample in samples for frame in sample['origin']
+        ))
+
+    def test_metrics_are_local_only(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 404)
+
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, LIKE_BUFFER={'ENABLED': False},
+                   NOTIFICATION_PIPELINE={'ENABLED': False})
+class RowSerializerTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.reader.following.add(self.author)
+        for number in range(12):
+            post = Post.objects.create(author=self.author, title=f'Post {number}', content=f'Running {number} ' + LONG_CONTENT)
+            timeline.fan_out_post(post)
+            Emoji.objects.create(post=post, user=self.reader, name='heart', unicode='❤️')
+        Like.objects.create(post=post, user=self.reader)
+        self.client.force_authenticate(user=self.reader)
+
+    def assertSameAsModelSerializer(self, view, url, params=None):
+        fast = self.client.get(url, params)
+        with mock.patch.object(view, 'row_serializer_class', None):
+            slow = self.client.get(url, params)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_post_list_output_is_identical(self):
+        first = self.assertSameAsModelSerializer(views.PostViewSet, reverse('post-list'))
+        self.assertEqual(len(first.data['results']), 10)
+        self.assertSameAsModelSerializer(views.PostViewSet, first.data['next'])
+        self.assertSameAsModelSerializer(views.PostViewSet, reverse('post-list'), {'ordering': '-like_count'})
+        self.assertSameAsModelSerializer(views.PostViewSet, reverse('post-list'), {'page': 2})
+
+    def test_search_results_keep_rank_and_snippet(self):
+        response = self.assertSameAsModelSerializer(views.PostViewSet, reverse('post-list'), {'search': 'running'})
+        self.assertIn('search_snippet', response.data['results'][0])
+
+    def test_feed_and_emoji_lists_are_identical(self):
+        self.assertSameAsModelSerializer(views.FeedView, reverse('feed'))
+        self.assertSameAsModelSerializer(views.EmojiViewSet, reverse('emoji-list'))
+
+    def test_detail_still_uses_the_model_serializer(self):
+        post = Post.objects.first()
+        response = self.client.get(reverse('post-detail', args=[post.id]))
+        self.assertEqual(response.data, PostSerializer(post).data)
+
+    def test_unsupported_fields_are_rejected(self):
+        class Computed(serializers.ModelSerializer):
+            shout = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Post
+                fields = ['id', 'shout']
+
+        class ComputedRows(ValuesSerializer):
+            model_serializer = Computed
+
+        with self.assertRaises(ImproperlyConfigured):
+            ComputedRows.mappers()
+
+
+    def test_fast_renderer_matches_json_renderer(self):
+        response = self.client.get(reverse('post-list'), {'search': 'running'})
+        # floats may differ in spelling only (1e-6 vs 1e-06)
+        self.assertEqual(json.loads(response.content), json.loads(JSONRenderer().render(response.data)))
+
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, LIKE_BUFFER={'ENABLED': False},
+                   NOTIFICATION_PIPELINE={'ENABLED': False})
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.reader.following.add(self.author)
+        self.post = Post.objects.create(author=self.author, title='Hello', content=LONG_CONTENT)
+        timeline.fan_out_post(self.post)
+        self.client.force_authenticate(user=self.reader)
+        window = mock.patch.object(conditional, 'window_start', return_value=0)  # no rollover mid-test
+        self.window_start = window.start()
+        self.addCleanup(window.stop)
+
+    def _revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        return first['ETag'], self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_unchanged_post_list_is_not_modified_with_one_query(self):
+        etag, response = self._revalidate(reverse('post-list'))
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        with self.assertNumQueries(1):  # the version lookup, nothing from the posts table
+            self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=etag)
+
+        with self.captureOnCommitCallbacks(execute=True):  # versions are stamped on commit
+            Post.objects.create(author=self.author, title='Another', content=LONG_CONTENT)
+        response = self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_counters_bump_no_versions_and_show_up_with_the_next_window(self):
+        scopes = [conditional.POSTS, conditional.post_scope(self.post.id)]
+        before = conditional.versions(*scopes)
+        etag, _ = self._revalidate(reverse('post-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=self.post, user=self.reader)
+            Comment.objects.create(post=self.post, author=self.author, content='y' * 400)
+        self.assertEqual(conditional.versions(*scopes), before)
+        response = self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.window_start.return_value = conditional.counter_window() * 1_000_000_000
+        response = self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['like_count'], 1)
+
+    def test_query_string_is_part_of_the_etag(self):
+        etag, _ = self._revalidate(reverse('post-list'))
+        response = self.client.get(reverse('post-list'), {'ordering': 'like_count'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_post_detail_follows_edits(self):
+        url = reverse('post-detail', args=[self.post.id])
+        etag, response = self._revalidate(url)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.post.title = 'Edited'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('post-detail', args=[self.post.id]))
+        again = self.client.get(reverse('post-detail', args=[self.post.id]),
+                                HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_feed_changes_with_new_posts_and_counters(self):
+        etag, response = self._revalidate(reverse('feed'))
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # timeline ids, followed authors and their follower counts, one version; however long the feed
+        with self.assertNumQueries(4):
+            self.client.get(reverse('feed'), HTTP_IF_NONE_MATCH=etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.author, content='y' * 400)
+        self.window_start.return_value = conditional.counter_window() * 1_000_000_000
+        response = self.client.get(reverse('feed'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            newer = Post.objects.create(author=self.author, title='Again', content=LONG_CONTENT)
+            timeline.fan_out_post(newer)
+        response = self.client.get(reverse('feed'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_reconcile_command_invalidates_etags(self):
+        etag, _ = self._revalidate(reverse('post-list'))
+        Post.objects.filter(pk=self.post.pk).update(like_count=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_post_counters', stdout=StringIO())
+        response = self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       CONDITIONAL_GET_CACHE='default')
+    def test_per_process_version_cache_fails_the_system_check(self):
+        self.assertEqual([error.id for error in conditional.check_version_cache(None)], ['social_media_api.E002'])
+
+    def test_feed_etag_is_per_user(self):
+        etag, _ = self._revalidate(reverse('feed'))
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self.client.get(reverse('feed'), HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkWriteTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.reader.following.add(self.author)
+        self.post = Post.objects.create(author=self.author, title='Hello', content=LONG_CONTENT)
+        self.client.force_authenticate(user=self.author)
+
+    def _queries(self, url, items, method='post'):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, items, format='json')
+        return response, len(queries)
+
+    def test_posts_are_created_in_one_batch_and_fanned_out(self):
+        url = reverse('post-list')
+        few, few_queries = self._queries(url, [{'title': f'P{i}', 'content': LONG_CONTENT} for i in range(2)])
+        many, many_queries = self._queries(url, [{'title': f'Q{i}', 'content': LONG_CONTENT} for i in range(20)])
+        self.assertEqual(many.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(many.data), 20)
+        self.assertTrue(all(item['id'] and item['author'] == self.author.id for item in many.data))
+        self.assertEqual(few_queries, many_queries)
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 22)
+
+    def test_invalid_items_are_reported_by_position(self):
+        response = self.client.post(reverse('post-list'), [{'title': 'Ok', 'content': LONG_CONTENT},
+                                                           {'title': 'Short', 'content': 'x'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('content', response.data[1])
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_emoji_uniqueness_is_checked_for_the_whole_batch(self):
+        self.client.force_authenticate(user=self.reader)
+        Emoji.objects.create(post=self.post, user=self.reader, name='heart', unicode='h')
+        other = Post.objects.create(author=self.author, title='Other', content=LONG_CONTENT)
+        items = [
+            {'post': self.post.id, 'name': 'heart', 'unicode': 'h'},  # exists already
+            {'post': self.post.id, 'name': 'smile', 'unicode': 's'},
+            {'post': other.id, 'name': 'smile', 'unicode': 's'},
+            {'post': self.post.id, 'name': 'smile', 'unicode': 's'},  # repeats the second item
+        ]
+        response, queries = self._queries(reverse('emoji-list'), items)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([bool(errors) for errors in response.data], [True, False, False, True])
+        self.assertIn('unique set', str(response.data[0]['non_field_errors'][0]))
+        self.assertEqual(queries, 2)  # posts in_bulk() and one uniqueness query
+
+        response = self.client.post(reverse('emoji-list'), items[1:3], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.post.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.post.emoji_count, other.emoji_count), (2, 1))
+
+    def test_bulk_emojis_cannot_react_to_own_posts(self):
+        own = Post.objects.create(author=self.reader, title='Own', content=LONG_CONTENT)
+        self.client.force_authenticate(user=self.reader)
+        items = [{'post': self.post.id, 'name': 'heart', 'unicode': 'h'},
+                 {'post': own.id, 'name': 'heart', 'unicode': 'h'}]
+        response = self.client.post(reverse('emoji-list'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(response.data[1]['non_field_errors'], ['You cannot react to your own post dummy!.'])
+        self.assertFalse(Emoji.objects.exists())
+
+    def test_comments_are_counted(self):
+        items = [{'post': self.post.id, 'content': 'c' * 400} for _ in range(3)]
+        response = self.client.post(reverse('comment-list'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+
+        response = self.client.post(reverse('comment-list'), [{'post': 9999, 'content': 'c' * 400}], format='json')
+        self.assertIn('post', response.data[0])
+
+    def test_bulk_update_changes_only_own_rows(self):
+        second = Post.objects.create(author=self.author, title='Second', content=LONG_CONTENT)
+        foreign = Post.objects.create(author=self.reader, title='Foreign', content=LONG_CONTENT)
+        url = reverse('post-bulk-update')
+
+        response = self.client.patch(url, [{'id': self.post.id, 'title': 'Mine'}, {'id': foreign.id, 'title': 'No'}],
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, [{}, {'id': ['Not found.']}])
+
+        before = self.post.updated_at
+        response, queries = self._queries(url, [{'id': self.post.id, 'title': 'One'},
+                                                {'id': second.id, 'title': 'Two', 'author': self.reader.id}], 'patch')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['title'] for item in response.data], ['One', 'Two'])
+        self.post.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((self.post.title, second.title, second.author_id), ('One', 'Two', self.author.id))
+        self.assertGreater(self.post.updated_at, before)
+
+    def test_bulk_update_accepts_string_ids(self):
+        response = self.client.patch(reverse('post-bulk-update'), [{'id': str(self.post.id), 'title': 'Stringly'}],
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.title, 'Stringly')
+
+    def test_bulk_endpoints_require_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.post(reverse('post-list'), [{'title': 'T', 'content': LONG_CONTENT}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.patch(reverse('post-bulk-update'), [{'id': self.post.id, 'title': 'T'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, LIKE_BUFFER={'ENABLED': False})
+class InsertFirstTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.post = Post.objects.create(author=self.author, title='Hello', content=LONG_CONTENT)
+        self.client.force_authenticate(user=self.reader)
+
+    def test_like_is_inserted_without_checking_first(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('like-list'), {'post': self.post.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        like_queries = [query['sql'] for query in queries if 'posts_like' in query['sql']]
+        self.assertEqual(len(like_queries), 1)
+        self.assertTrue(like_queries[0].startswith('INSERT'))
+
+    def test_duplicate_like_gets_the_old_validation_error(self):
+        self.client.post(reverse('like-list'), {'post': self.post.id}, format='json')
+        response = self.client.post(reverse('like-list'), {'post': self.post.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'non_field_errors': ['You have already liked this post.']})
+        self.post.refresh_from_db()
+        self.assertEqual((Like.objects.count(), self.post.like_count), (1, 1))
+
+    def test_duplicate_emoji_gets_the_unique_set_error(self):
+        item = {'post': self.post.id, 'name': 'heart', 'unicode': 'h'}
+        self.assertEqual(self.client.post(reverse('emoji-list'), item, format='json').status_code,
+                         status.HTTP_201_CREATED)
+        response = self.client.post(reverse('emoji-list'), item, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['non_field_errors'][0].code, 'unique')
+        self.assertIn('unique set', str(response.data['non_field_errors'][0]))
+        self.assertEqual(Emoji.objects.count(), 1)
+
+    def test_reacting_to_own_post_is_refused(self):
+        self.client.force_authenticate(user=self.author)
+        response = self.client.post(reverse('emoji-list'), {'post': self.post.id, 'name': 'heart', 'unicode': 'h'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, ['You cannot react to your own post dummy!.'])
+        self.assertFalse(Emoji.objects.exists())
+
+    def test_create_unique(self):
+        like, created = create_unique(Like.objects, post=self.post, user=self.reader)
+        self.assertTrue(created)
+        self.assertEqual(create_unique(Like.objects, post_id=self.post.id, user_id=self.reader.id), (None, False))
+        self.assertEqual(Like.objects.get(), like)  # the savepoint kept the transaction usable
+        with self.assertRaises(IntegrityError):  # not a duplicate, so not swallowed
+            create_unique(Like.objects, post=None, user=self.author)
+
+    def test_unique_validator_is_left_to_the_database(self):
+        def unique_validators(serializer):
+            return [validator for validator in serializer.validators if isinstance(validator, UniqueTogetherValidator)]
+        self.assertEqual(unique_validators(EmojiSerializer()), [])
+        self.assertEqual(len(EmojiSerializer(many=True).unique_together), 1)  # bulk writes still check per batch
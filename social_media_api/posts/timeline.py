@@ -0,0 +1,206 @@
+# posts/timeline.py
+"""
+Materialized home timelines (fan-out-on-write).
+
+Every new post is pushed into a TimelineEntry row for each follower of its
+author, so FeedView reads a capped, pre-ordered list of post IDs instead of
+scanning and sorting every post by every followed author.
+
+Authors with more than TIMELINE_FANOUT_LIMIT followers are not fanned out
+(one post would mean that many inserts); their posts are pulled at read time
+and merged into the materialized list instead. When unfollows take an author
+back under the limit, the posts they made while over it (the ones with no
+timeline entries) are fanned out after commit, since the read-time merge
+stops covering them.
+
+Reads never write. Timelines are trimmed back to TIMELINE_MAX_LENGTH by the
+writers that grow them (fan-out and backfill), once they are more than
+TIMELINE_TRIM_SLACK entries over the cap, so a follower is trimmed once per
+that many posts rather than on every one. Reads only look at the newest
+TIMELINE_MAX_LENGTH entries, so the slack never shows. `manage.py
+trim_timelines` trims everything down to the cap and can run periodically.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Exists, OuterRef
+
+from accounts import graph
+from social_media_api.deferred import defer
+
+from .models import Post, TimelineEntry
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+def max_length():
+    """Number of post IDs kept per timeline"""
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+
+def fanout_limit():
+    """Follower count above which an author's posts are merged on read"""
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+
+
+def trim_slack():
+    """Entries a timeline may grow past the cap before a writer trims it"""
+    return getattr(settings, 'TIMELINE_TRIM_SLACK', 50)
+
+
+def is_popular(author):
+    return graph.follower_count(author.pk) >= fanout_limit()
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    trim({entry.owner_id for entry in entries}, slack=trim_slack())
+
+
+def trim(owner_ids=None, slack=0):
+    """
+    Cut timelines holding more than the cap plus `slack` entries back to the
+    cap (all timelines when owner_ids is None); returns the number deleted
+    """
+    limit = max_length()
+    entries = TimelineEntry.objects.all()
+    if owner_ids is not None:
+        entries = entries.filter(owner_id__in=owner_ids)
+    oversized = list(
+        entries.values('owner_id').annotate(total=Count('id'))
+        .filter(total__gt=limit + slack).values_list('owner_id', flat=True)
+    )
+    deleted = 0
+    for owner_id in oversized:
+        timeline = TimelineEntry.objects.filter(owner_id=owner_id)
+        cutoff = timeline.order_by('-created_at', '-post_id').values_list('created_at', flat=True)[limit - 1]
+        deleted += timeline.filter(created_at__lt=cutoff).delete()[0]
+    return deleted
+
+
+def fan_out_post(post):
+    """Push a new post into the timeline of every follower of its author"""
+    return fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """fan_out_post() for many new posts, reading each author's followers once"""
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.author_id, []).append(post)
+
+    entries = []
+    inserted = 0
+    for authored in by_author.values():
+        author = authored[0].author
+        if is_popular(author):
+            continue
+        follower_ids = author.followers.values_list('id', flat=True)
+        for follower_id in follower_ids.iterator(chunk_size=BATCH_SIZE):
+            entries += [TimelineEntry(owner_id=follower_id, post_id=post.id, created_at=post.created_at)
+                        for post in authored]
+            if len(entries) >= BATCH_SIZE:
+                _bulk_insert(entries)
+                inserted += len(entries)
+                entries = []
+    if entries:
+        _bulk_insert(entries)
+        inserted += len(entries)
+    return inserted
+
+
+def backfill(owner_id, author_id):
+    """Copy an author's recent posts into a timeline after a new follow"""
+    author = User.objects.get(id=author_id)
+    if is_popular(author):
+        return
+    recent = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:max_length()]
+    )
+    _bulk_insert([
+        TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at)
+        for post_id, created_at in recent
+    ])
+
+
+def remove_author(owner_id, author_id):
+    """Drop an author's posts from a timeline after an unfollow"""
+    TimelineEntry.objects.filter(owner_id=owner_id, post__author_id=author_id).delete()
+
+
+def unfollowed(lost, using=None):
+    """
+    After unfollows ({author_id: followers lost}), queue fan_out_missed() for
+    the authors they took from the fan-out limit or over to under it
+    """
+    limit = fanout_limit()
+    for author_id, total in graph.follower_counts(lost).items():
+        if total < limit <= total + lost[author_id]:
+            defer(fan_out_missed, author_id, using=using)
+
+
+def fan_out_missed(author_ids):
+    """
+    Fan out the posts these authors made while over the limit: those among
+    their newest max_length() with no timeline entry at all
+    """
+    for author_id in set(author_ids):
+        if graph.follower_count(author_id) >= fanout_limit():
+            continue  # popular again, merged on read
+        recent = list(
+            Post.objects.filter(author_id=author_id)
+            .order_by('-created_at', '-id').values_list('id', flat=True)[:max_length()]
+        )
+        missed = (
+            Post.objects.filter(id__in=recent).select_related('author')
+            .exclude(Exists(TimelineEntry.objects.filter(post_id=OuterRef('pk'))))
+        )
+        fan_out_posts(list(missed))
+
+
+def popular_followee_ids(user):
+    """IDs of followed authors whose posts are merged on read, from the graph cache"""
+    counts = graph.follower_counts(graph.following_ids(user.id))
+    return [author_id for author_id, total in counts.items() if total >= fanout_limit()]
+
+
+def timeline_post_ids(user):
+    """
+    Return the newest post IDs of the user's home timeline, newest first.
+
+    Materialized entries are merged with the recent posts of popular followed
+    authors. Entries past the cap that no writer has trimmed yet are skipped.
+    """
+    limit = max_length()
+    rows = list(
+        TimelineEntry.objects.filter(owner=user)
+        .order_by('-created_at', '-post_id')
+        .values_list('post_id', 'created_at')[:limit]
+    )
+
+    popular = popular_followee_ids(user)
+    if popular:
+        rows += list(
+            Post.objects.filter(author_id__in=popular)
+            .order_by('-created_at', '-id')
+            .values_list('id', 'created_at')[:limit]
+        )
+        rows.sort(key=lambda row: (row[1], row[0]), reverse=True)
+
+    post_ids = []
+    seen = set()
+    for post_id, _ in rows:
+        if post_id not in seen:
+            seen.add(post_id)
+            post_ids.append(post_id)
+    return post_ids[:limit]
+
+
+def rebuild(user):
+    """Recompute a user's timeline from the follow graph"""
+    TimelineEntry.objects.filter(owner=user).delete()
+    for author_id in user.following.values_list('id', flat=True):
+        backfill(user.id, author_id)
@@ -3,31 +3,52 @@ from rest_framework import viewsets, status, filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from .models import Post, Comment, Like, Emoji
-from .serializers import PostSerializer, CommentSerializer, LikeSerializer, EmojiSerializer
+from .serializers import PostSerializer, CommentSerializer, LikeSerializer, EmojiSerializer, PostRowSerializer, EmojiRowSerializer
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.authentication import TokenAuthentication
+from accounts.authentication import CachedTokenAuthentication
 from rest_framework import serializers
 from rest_framework import generics, permissions
 from rest_framework.views import APIView
 from rest_framework.decorators import action
-from notifications.models import Notification
 from notifications.utils import create_notification
+from .timeline import fan_out_post, fan_out_posts, timeline_post_ids
+from .buffers import like_buffer
+from .search import PostSearchFilter
+from social_media_api.pagination import PostKeysetPagination, OldestFirstKeysetPagination
+from social_media_api.instrumentation import InstrumentedViewMixin
+from social_media_api.serialization import ValuesListMixin
+from social_media_api.bulk import BulkCreateMixin, BulkUpdateMixin
+from social_media_api.integrity import create_unique
+from social_media_api.conditional import ConditionalGetMixin, POSTS, counter_window, post_scope
 # Create your views here.
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(InstrumentedViewMixin, ConditionalGetMixin, ValuesListMixin, BulkCreateMixin, BulkUpdateMixin,
+                  viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
+    row_serializer_class = PostRowSerializer    # list() reads values() rows, see social_media_api/serialization.py
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    authentication_classes = [CachedTokenAuthentication]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, PostSearchFilter]
     filterset_fields = ['title', 'author']      # exact filtering
-    search_fields = ['title', 'content']        # partial search
-    ordering_fields = ['created_at', 'likes']   # fields you can sort by
+    search_fields = ['title', 'content']        # full-text search, see posts/search.py
+    ordering_fields = ['created_at', 'like_count', 'comment_count', 'emoji_count']   # fields you can sort by
     ordering = ['-created_at']   
+    pagination_class = PostKeysetPagination     # infinite scroll, also by counter; ?page= still works
+
+    def conditional_scopes(self):
+        # ETag / 304 for polling clients, see social_media_api/conditional.py
+        if self.action == 'retrieve':
+            return [post_scope(self.kwargs[self.lookup_url_kwarg or self.lookup_field])]
+        return [POSTS]
+
+    def conditional_window(self):
+        return counter_window()  # like/comment/emoji counts bump no versions
 
     def get_permissions(self):
-        if self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
+        if self.action in ['retrieve', 'update', 'partial_update', 'destroy', 'like', 'unlike', 'bulk_update'] \
+                or self.is_bulk_create():
             self.permission_classes = [IsAuthenticated]
         else:
             self.permission_classes = [AllowAny]
@@ -35,8 +56,15 @@ class PostViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         post = serializer.save(author=self.request.user)
+        fan_out_post(post)  # push into followers' home timelines
+
+    def perform_bulk_create(self, serializer):
+        posts = serializer.save(author=self.request.user)
+        fan_out_posts(posts)
+
+    def get_bulk_update_queryset(self):
+        return Post.objects.filter(author=self.request.user)
 
-     
 
     def perform_update(self, serializer):
         serializer = PostSerializer(data=self.request.data)
@@ -56,9 +84,13 @@ class PostViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def like(self, request, pk=None):
         post = self.get_object()
-        post.likes.add(request.user)
+        if like_buffer.enabled:
+            like_buffer.like(post.id, request.user.id)  # written with the next batch
+            return Response({"status": "post liked"}, status=status.HTTP_202_ACCEPTED)
 
-        if request.user != post.author:
+        _, created = create_unique(Like.objects, post=post, user=request.user)  # like_count follows via signal
+
+        if created and request.user != post.author:
             create_notification(
                 recipient=post.author,
                 actor=request.user,
@@ -70,19 +102,24 @@ class PostViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def unlike(self, request, pk=None):
         post = self.get_object()
-        post.likes.remove(request.user)
+        if like_buffer.enabled:
+            like_buffer.unlike(post.id, request.user.id)
+            return Response({"status": "post unliked"}, status=status.HTTP_202_ACCEPTED)
+
+        Like.objects.filter(post=post, user=request.user).delete()
         return Response({"status": "post unliked"}, status=status.HTTP_200_OK)
 
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(InstrumentedViewMixin, BulkCreateMixin, BulkUpdateMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    pagination_class = OldestFirstKeysetPagination
 
     def get_permissions(self):
-        if self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
+        if self.action in ['retrieve', 'update', 'partial_update', 'destroy', 'bulk_update'] or self.is_bulk_create():
             self.permission_classes = [IsAuthenticated]
         else:
             self.permission_classes = [AllowAny]
@@ -91,6 +128,12 @@ class CommentViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_bulk_create(self, serializer):
+        serializer.save(author=self.request.user)
+
+    def get_bulk_update_queryset(self):
+        return Comment.objects.filter(author=self.request.user)
+
     def perform_update(self, serializer):
         serializer = PostSerializer(data=self.request.data)
         if serializer.is_valid() and serializer.validated_data['author'] == self.request.user:
@@ -104,11 +147,11 @@ class CommentViewSet(viewsets.ModelViewSet):
         else:
             raise serializers.ValidationError("You can only delete your own comments.")
         
-class LikeViewSet(viewsets.ModelViewSet):
+class LikeViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = Like.objects.all()
     serializer_class = LikeSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
 
     def get_permissions(self):
         if self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
@@ -117,12 +160,28 @@ class LikeViewSet(viewsets.ModelViewSet):
             self.permission_classes = [AllowAny]
         return super().get_permissions()
 
+    def get_queryset(self):
+        # Read-your-writes: land this user's buffered likes before listing them
+        if self.request.user.is_authenticated:
+            like_buffer.flush_for_user(self.request.user.id)
+        return super().get_queryset()
+
+    def create(self, request, *args, **kwargs):
+        if not like_buffer.enabled:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        post = serializer.validated_data['post']
+        if post.author == request.user:
+            raise serializers.ValidationError("You cannot like your own post dummy!.")
+        like_buffer.like(post.id, request.user.id)
+        return Response({"post": post.id, "user": request.user.id, "status": "pending"},
+                        status=status.HTTP_202_ACCEPTED)
+
     def perform_create(self, serializer):
-        if Post.author == self.request.user:
+        if serializer.validated_data['post'].author_id == self.request.user.id:
             raise serializers.ValidationError("You cannot like your own post dummy!.")
-        if Like.objects.filter(post=serializer.validated_data['post'], user=self.request.user).exists():
-            raise serializers.ValidationError("You have already liked this post.")
-        serializer.save(user=self.request.user)
+        serializer.save(user=self.request.user)  # a second like is turned away by the unique index
 
     def perform_destroy(self, instance):
         if instance.user == self.request.user:
@@ -131,11 +190,12 @@ class LikeViewSet(viewsets.ModelViewSet):
             raise serializers.ValidationError("You can only delete your own likes.")
         
 
-class EmojiViewSet(viewsets.ModelViewSet):
+class EmojiViewSet(InstrumentedViewMixin, ValuesListMixin, BulkCreateMixin, BulkUpdateMixin, viewsets.ModelViewSet):
     queryset = Emoji.objects.all()
     serializer_class = EmojiSerializer
+    row_serializer_class = EmojiRowSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['name', 'post', 'user']      # exact filtering
     search_fields = ['name']        # partial search
@@ -143,18 +203,22 @@ class EmojiViewSet(viewsets.ModelViewSet):
 
 
     def get_permissions(self):
-        if self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
+        if self.action in ['retrieve', 'update', 'partial_update', 'destroy', 'bulk_update'] or self.is_bulk_create():
             self.permission_classes = [IsAuthenticated]
         else:
             self.permission_classes = [AllowAny]
         return super().get_permissions()
 
+    def perform_bulk_create(self, serializer):
+        serializer.save(user=self.request.user)  # uniqueness was checked for the whole batch
+
+    def get_bulk_update_queryset(self):
+        return Emoji.objects.filter(user=self.request.user)
+
     def perform_create(self, serializer):
-        if Post.author == self.request.user:
+        if serializer.validated_data['post'].author_id == self.request.user.id:
             raise serializers.ValidationError("You cannot react to your own post dummy!.")
-        if Emoji.objects.filter(post=serializer.validated_data['post'], user=self.request.user, name=serializer.validated_data['name']).exists():
-            raise serializers.ValidationError("You cannot react to a certain post twice.")
-        serializer.save(user=self.request.user)
+        serializer.save(user=self.request.user)  # a repeated reaction is turned away by the unique index
 
     def perform_destroy(self, instance):
         if instance.user == self.request.user:
@@ -163,21 +227,37 @@ class EmojiViewSet(viewsets.ModelViewSet):
             raise serializers.ValidationError("You can only delete your own reactions.")
         
 
-class FeedView(generics.ListAPIView):
+class FeedView(InstrumentedViewMixin, ConditionalGetMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = PostSerializer
+    row_serializer_class = PostRowSerializer
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    authentication_classes = [CachedTokenAuthentication]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, PostSearchFilter]
     filterset_fields = ['title', 'author']      # exact filtering
-    search_fields = ['title', 'content']        # partial search
-    ordering_fields = ['created_at', 'likes']   # fields you can sort by
+    search_fields = ['title', 'content']        # full-text search, see posts/search.py
+    ordering_fields = ['created_at', 'like_count', 'comment_count', 'emoji_count']   # fields you can sort by
     ordering = ['-created_at']
+    pagination_class = PostKeysetPagination
+
+    def timeline_ids(self):
+        if not hasattr(self, '_timeline_ids'):
+            self._timeline_ids = timeline_post_ids(self.request.user)
+        return self._timeline_ids
+
+    def conditional_scopes(self):
+        # one version for post content; fan-out shows up in the ids below
+        return [POSTS]
+
+    def conditional_window(self):
+        return counter_window()
+
+    def conditional_variant(self):
+        # a new or unfollowed post changes the ids even when no post in them changed
+        return super().conditional_variant() + [self.timeline_ids()]
 
     def get_queryset(self):
-        user = self.request.user
-        # Assuming you have a 'followers' ManyToManyField on your User model
-        following_users = user.following.all()
-        return Post.objects.filter(author__in=following_users).order_by('-created_at')  
+        # Read the precomputed timeline instead of scanning every followed author's posts
+        return Post.objects.filter(id__in=self.timeline_ids()).order_by('-created_at')
     
 
 #GARBAGE BELOW, DELETE LATER IF NOT NEEDED
@@ -207,10 +287,14 @@ class PostUnlikeView(generics.GenericAPIView):
 class LikePostView(generics.GenericAPIView):
     def post(self, request, pk):
         post = generics.get_object_or_404(Post, pk=pk)
+        if like_buffer.enabled:
+            like_buffer.like(post.id, request.user.id)
+            return Response({"status": "post liked"}, status=status.HTTP_202_ACCEPTED)
+
         like, created = Like.objects.get_or_create(user=request.user, post=post)
 
         if created and request.user != post.author:
-            Notification.objects.create(
+            create_notification(
                 recipient=post.author,
                 actor=request.user,
                 verb="liked",
@@ -222,6 +306,9 @@ class LikePostView(generics.GenericAPIView):
 class UnlikePostView(generics.GenericAPIView):
     def post(self, request, pk):
         post = generics.get_object_or_404(Post, pk=pk)
+        if like_buffer.enabled:
+            like_buffer.unlike(post.id, request.user.id)
+            return Response({"status": "post unliked"}, status=status.HTTP_202_ACCEPTED)
         try:
             like = Like.objects.get(user=request.user, post=post)
             like.delete()
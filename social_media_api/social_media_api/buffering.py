@@ -0,0 +1,180 @@
+"""
+In-process write buffers.
+
+A WriteBuffer collects keyed operations from request threads, collapses
+repeated operations on the same key, and writes them in one batch when the
+buffer reaches MAX_SIZE or FLUSH_INTERVAL seconds after the first pending
+write. Each gunicorn worker owns its own buffer and flushes it on exit,
+unless the buffer is disabled or the database it was filled against is no
+longer the configured one (the test runner swaps it out, for instance).
+
+A failed batch is retried key by key so one bad row cannot hold back the
+rest; a key that fails MAX_ATTEMPTS flushes in a row is moved to
+`dead_letters` and logged instead of being re-queued forever.
+
+Subclasses set `setting_name` (a dict in settings.py) and implement write().
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    setting_name = None
+    defaults = {
+        'ENABLED': True,
+        'MAX_SIZE': 500,        # flush as soon as this many keys are pending
+        'FLUSH_INTERVAL': 1.0,  # seconds; 0 disables the background timer
+        'MAX_ATTEMPTS': 3,      # failed flushes before a key is dead-lettered
+    }
+    dead_letter_size = 1000
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._timer = None
+        self._attempts = {}
+        self._database = None
+        self.dead_letters = deque(maxlen=self.dead_letter_size)
+        self.flushes = 0
+        self.flushed_items = 0
+        self.failures = 0
+        self.dropped = 0
+        atexit.register(self._flush_at_exit)
+
+    def config(self, key):
+        default = self.defaults.get(key, WriteBuffer.defaults.get(key))
+        return getattr(settings, self.setting_name, {}).get(key, default)
+
+    @property
+    def enabled(self):
+        return self.config('ENABLED')
+
+    def merge(self, pending, key, value):
+        """Combine a new operation with whatever is already pending for key"""
+        pending[key] = value
+
+    def write(self, batch):
+        raise NotImplementedError
+
+    def add(self, key, value):
+        with self._lock:
+            self.merge(self._pending, key, value)
+            self._database = connection.settings_dict.get('NAME')
+            size = len(self._pending)
+        if size >= self.config('MAX_SIZE'):
+            self.flush()
+        else:
+            self._schedule()
+
+    def has_pending(self, predicate):
+        with self._lock:
+            return any(predicate(key) for key in self._pending) or any(predicate(key) for key in self._inflight)
+
+    def flush(self):
+        """Write everything pending; returns the number of keys written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return 0
+            try:
+                self.write(batch)
+                failed = {}
+            except Exception:
+                self.failures += 1
+                logger.exception('%s flush of %d item(s) failed; retrying them one by one',
+                                 type(self).__name__, len(batch))
+                failed = self._write_each(batch) if len(batch) > 1 else batch
+            with self._lock:
+                self._inflight = {}
+                if self._attempts:
+                    for key in batch.keys() - failed.keys():
+                        self._attempts.pop(key, None)
+            if failed:
+                self._requeue(failed)
+                self._schedule()
+            written = len(batch) - len(failed)
+            if written:
+                self.flushes += 1
+                self.flushed_items += written
+            return written
+
+    def _write_each(self, batch):
+        """Write batch one key at a time; returns the keys that still failed"""
+        failed = {}
+        for key, value in batch.items():
+            try:
+                self.write({key: value})
+            except Exception:
+                failed[key] = value
+        if failed:
+            logger.warning('%s could not write %d of %d item(s)', type(self).__name__, len(failed), len(batch))
+        return failed
+
+    def _requeue(self, failed):
+        max_attempts = self.config('MAX_ATTEMPTS')
+        with self._lock:
+            for key, value in failed.items():
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts >= max_attempts:
+                    self._attempts.pop(key, None)
+                    self.dead_letters.append((key, value))
+                    self.dropped += 1
+                    logger.error('%s dropped %r after %d failed writes', type(self).__name__, key, attempts)
+                    continue
+                self._attempts[key] = attempts
+                self._pending.setdefault(key, value)  # newer operations win
+
+    def _flush_at_exit(self):
+        with self._lock:
+            pending = len(self._pending)
+        if not pending:
+            return
+        if not self.enabled or connection.settings_dict.get('NAME') != self._database:
+            logger.warning('%s discarding %d item(s) at exit: buffer disabled or database changed',
+                           type(self).__name__, pending)
+            return
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushes': self.flushes,
+            'flushed_items': self.flushed_items,
+            'failures': self.failures,
+            'dropped': self.dropped,
+        }
+
+    def _schedule(self):
+        interval = self.config('FLUSH_INTERVAL')
+        if not interval:
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(interval, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        started = time.perf_counter()
+        try:
+            written = self.flush()
+            logger.debug('%s flushed %d item(s) in %.1fms', type(self).__name__, written,
+                         (time.perf_counter() - started) * 1000)
+        finally:
+            connection.close()  # the timer thread owns its own DB connection
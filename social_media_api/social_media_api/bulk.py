@@ -0,0 +1,256 @@
+"""
+Bulk create and update for ModelSerializer endpoints.
+
+A ModelSerializer with many=True validates, looks up related rows and checks
+uniqueness once per item, then saves with one INSERT per item. Importers and
+clients replaying offline queues send thousands of items, so that is
+thousands of round-trips.
+
+BulkListSerializer (set it as Meta.list_serializer_class) does each step once
+per batch:
+
+- primary keys sent for writable related fields are loaded with one in_bulk()
+  per field before the items are validated, instead of one get() per item;
+- the child's UniqueTogetherValidators run as one query per unique set over
+  the whole batch, plus a check for duplicates inside the batch, and report
+  DRF's usual message on the offending items;
+- creates go through one bulk_create() and updates through one bulk_update().
+
+bulk_create() and bulk_update() send no model signals, so subclasses
+override after_create() / after_update() to do whatever the model's
+receivers would have done, once for the batch.
+
+BulkCreateMixin lets a viewset's create accept a JSON array, and
+BulkUpdateMixin adds PUT/PATCH <list url>/bulk/ taking an array of items with
+their `id`. A batch may hold at most BULK_MAX_ITEMS items.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator
+
+
+def max_items():
+    return getattr(settings, 'BULK_MAX_ITEMS', 1000)
+
+
+def _key(value):
+    # related rows compare by primary key, the way values_list() returns them
+    return value.pk if hasattr(value, '_meta') else value
+
+
+def item_id(model, data):
+    """The primary key an update item names in `id` ("5" as well as 5), or None"""
+    value = data.get('id') if isinstance(data, dict) else None
+    try:
+        return model._meta.pk.to_python(value) if value is not None and not isinstance(value, bool) else None
+    except DjangoValidationError:
+        return None
+
+
+class Preloaded:
+    """Stands in for a related field's queryset while a batch is validated"""
+
+    def __init__(self, queryset, values):
+        self.model = queryset.model
+        keys = {key for key in map(self._to_python, values) if key is not None}
+        self.rows = queryset.in_bulk(keys) if keys else {}
+
+    def _to_python(self, value):
+        if isinstance(value, bool):
+            return None
+        try:
+            return self.model._meta.pk.to_python(value)
+        except DjangoValidationError:
+            return None
+
+    def get(self, pk):
+        key = self._to_python(pk)
+        if key is None:
+            raise ValueError(pk)  # reported as incorrect_type
+        try:
+            return self.rows[key]
+        except KeyError:
+            raise self.model.DoesNotExist from None
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    # Model fields an update may change; anything else in an item is ignored, like read-only fields
+    updatable_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', max_items())
+        super().__init__(*args, **kwargs)
+        validators = self.child.validators
+        self.unique_together = [validator for validator in validators if isinstance(validator, UniqueTogetherValidator)]
+        self.child.validators = [validator for validator in validators if validator not in self.unique_together]
+        self._matched = []
+
+    @property
+    def model(self):
+        return self.child.Meta.model
+
+    # validation
+
+    def to_internal_value(self, data):
+        self._matched = []
+        fields = self._related_fields() if isinstance(data, list) else []
+        originals = [(field, field.queryset) for field in fields]
+        try:
+            for field in fields:
+                values = [item.get(field.field_name) for item in data if isinstance(item, dict)]
+                field.queryset = Preloaded(field.get_queryset(), [value for value in values if value is not None])
+            validated = super().to_internal_value(data)
+        finally:
+            for field, queryset in originals:
+                field.queryset = queryset
+
+        errors = self.validate_batch(validated)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def _related_fields(self):
+        return [
+            field for field in self.child.fields.values()
+            if type(field) is PrimaryKeyRelatedField and not field.read_only and field.pk_field is None
+        ]
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            instance = self._instances().get(self._item_id(data))
+            if instance is None:
+                raise serializers.ValidationError({'id': ['Not found.']}, code='not_found')
+            self.child.instance = instance
+            self._matched.append(instance)
+        return super().run_child_validation(data)
+
+    def _instances(self):
+        if not hasattr(self, '_instances_by_id'):
+            self._instances_by_id = {instance.pk: instance for instance in self.instance}
+        return self._instances_by_id
+
+    def _item_id(self, data):
+        return item_id(self.model, data)
+
+    def _value(self, index, attrs, source):
+        """A field's value as the row will be saved; an update keeps what it does not change"""
+        if self.instance is None or (source in attrs and source in self.updatable_fields):
+            return attrs.get(source)
+        return getattr(self._matched[index], self.model._meta.get_field(source).attname)  # no FK fetch
+
+    def validate_batch(self, validated):
+        """Per-item errors ([] or one dict per item) for checks that span the batch"""
+        errors = [{} for _ in validated]
+        for validator in self.unique_together:
+            sources = [self.child.fields[name].source for name in validator.fields]
+            keys = [tuple(_key(self._value(index, attrs, source)) for source in sources)
+                    for index, attrs in enumerate(validated)]
+
+            candidates = [key for key in keys if None not in key]
+            if not candidates:
+                continue
+            existing = validator.queryset.filter(**{
+                f'{source}__in': {key[position] for key in candidates}
+                for position, source in enumerate(sources)
+            })
+            if self.instance is not None:
+                existing = existing.exclude(pk__in=[instance.pk for instance in self._matched])
+            taken = set(existing.values_list(*sources))
+
+            seen = set()
+            message = validator.message.format(field_names=', '.join(validator.fields))
+            for index, key in enumerate(keys):
+                if None in key:
+                    continue
+                if key in taken or key in seen:
+                    errors[index].setdefault(api_settings.NON_FIELD_ERRORS_KEY, []).append(message)
+                seen.add(key)
+        return errors if any(errors) else []
+
+    # saving
+
+    def create(self, validated_data):
+        objects = [self.model(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            self.model._default_manager.bulk_create(objects, batch_size=max_items())
+            self.after_create(objects)
+        return objects
+
+    def update(self, instances, validated_data):
+        if not validated_data:
+            return []
+        fields = set()
+        for instance, attrs in zip(self._matched, validated_data):
+            for name, value in attrs.items():
+                if name in self.updatable_fields:
+                    setattr(instance, name, value)
+                    fields.add(name)
+        for field in self.model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False):  # bulk_update() skips pre_save()
+                now = timezone.now()
+                for instance in self._matched:
+                    setattr(instance, field.attname, now)
+                fields.add(field.name)
+        with transaction.atomic():
+            if fields:
+                self.model._default_manager.bulk_update(self._matched, sorted(fields), batch_size=max_items())
+            self.after_update(self._matched)
+        return list(self._matched)
+
+    def after_create(self, objects):
+        """Batch equivalent of the model's post_save receivers for new rows"""
+
+    def after_update(self, objects):
+        """Batch equivalent of the model's post_save receivers for changed rows"""
+
+
+class BulkCreateMixin:
+    """POSTing a JSON array to the list endpoint creates every item in one batch"""
+
+    def is_bulk_create(self):
+        return self.action == 'create' and isinstance(self.request.data, list)
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        self.perform_bulk_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_bulk_create(self, serializer):
+        serializer.save()
+
+
+class BulkUpdateMixin:
+    """
+    PUT/PATCH <list url>/bulk/ with a JSON array of items carrying their `id`.
+    Only rows in get_bulk_update_queryset() can be changed; other ids are
+    reported as not found.
+    """
+
+    def get_bulk_update_queryset(self):
+        return self.get_queryset()
+
+    @action(detail=False, methods=['put', 'patch'], url_path='bulk')
+    def bulk_update(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ['Expected a list of items.']})
+        queryset = self.get_bulk_update_queryset()
+        ids = {pk for pk in (item_id(queryset.model, item) for item in items) if pk is not None}
+        instances = list(queryset.filter(pk__in=ids)) if ids else []
+        serializer = self.get_serializer(instances, data=items, many=True, partial=request.method == 'PATCH')
+        serializer.is_valid(raise_exception=True)
+        self.perform_bulk_update(serializer)
+        return Response(serializer.data)
+
+    def perform_bulk_update(self, serializer):
+        serializer.save()
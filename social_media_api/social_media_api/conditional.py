@@ -0,0 +1,175 @@
+"""
+Conditional GET (ETag / Last-Modified) for polled endpoints.
+
+Every piece of data a response depends on belongs to a version scope:
+
+    posts                 any post's content, creation or deletion
+    post:<id>             one post's content
+    notifications:<id>    one user's notifications
+
+Like, comment and emoji counters are left out on purpose: bumping a version
+per reaction cost a cache write on the hottest write path, and the global
+`posts` version made every reaction contend for one row. Views whose bodies
+show counters name a counter window instead (CONDITIONAL_GET_COUNTER_WINDOW
+seconds): the start of the current window is folded into the validators like
+a version, so a counter shown from a 304 is at most that many seconds old.
+The home feed depends on `posts` and on the timeline's post ids, which change
+whenever fan-out adds or removes an entry, so it needs no versions of its
+own.
+
+A scope's version is the time, in nanoseconds, of its last change, kept in
+the CONDITIONAL_GET_CACHE cache. Web workers and management commands
+(reconcile_post_counters, archive_notifications) all bump versions, so that
+cache has to be shared between processes; a system check rejects a
+per-process LocMemCache.
+
+Writers call bump() for the scopes they touched. Bumping happens right away
+and again when the transaction commits, so a poll that slips in between the
+write and the commit cannot pin a validator to the old rows. With the
+database cache a version written inside the transaction would only be
+visible at commit anyway (and would lock a hot row until then), so there it
+is written once, on commit. A scope missing from the cache (cold cache,
+eviction) starts at the current time, which can only cause a miss.
+
+ConditionalGetMixin builds the ETag from the versions of the scopes a view
+names for the request, plus everything else that shapes the response (path
+and query string, user, response format), and answers If-None-Match and
+If-Modified-Since with 304 before the queryset is touched. Last-Modified has
+one-second resolution, so clients should prefer the ETag; when both are sent,
+If-None-Match wins.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache.backends.db import DatabaseCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .shared_cache import check_shared, shared_cache
+
+POSTS = 'posts'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def notifications_scope(user_id):
+    return f'notifications:{user_id}'
+
+
+def _key(scope):
+    return f'conditional:version:{scope}'
+
+
+def version_cache():
+    return shared_cache('CONDITIONAL_GET_CACHE', 'default')
+
+
+@checks.register(checks.Tags.caches)
+def check_version_cache(app_configs, **kwargs):
+    return check_shared(
+        'CONDITIONAL_GET_CACHE', 'social_media_api.E001', 'social_media_api.E002',
+        'Other workers and management commands would not invalidate ETags, so clients could get '
+        '304 for changed data.',
+        default='default',
+    )
+
+
+def versions(*scopes):
+    """Current version of each scope, in order"""
+    cache = version_cache()
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time_ns()
+        cache.set_many({key: now for key in missing}, timeout=None)
+        found.update(dict.fromkeys(missing, now))
+    return [found[key] for key in keys]
+
+
+def _stamp(scopes):
+    now = time.time_ns()
+    version_cache().set_many({_key(scope): now for scope in scopes}, timeout=None)
+
+
+def bump(*scopes):
+    """Mark scopes changed, now and again when the current transaction commits"""
+    if not scopes:
+        return
+    if not isinstance(version_cache(), DatabaseCache):
+        _stamp(scopes)
+    transaction.on_commit(lambda: _stamp(scopes))
+
+
+def counter_window():
+    return getattr(settings, 'CONDITIONAL_GET_COUNTER_WINDOW', 30)
+
+
+def window_start(seconds):
+    """Start of the current `seconds`-long window, in nanoseconds like a version"""
+    now = time.time_ns()
+    return now - now % (seconds * 1_000_000_000)
+
+
+def bump_posts(post_ids):
+    bump(POSTS, *(post_scope(post_id) for post_id in post_ids))
+
+
+def bump_notifications(user_ids):
+    bump(*(notifications_scope(user_id) for user_id in user_ids))
+
+
+class ConditionalGetMixin:
+    """
+    Add validators to list and retrieve responses and answer conditional
+    requests with 304 Not Modified.
+
+    Views return the scopes a request depends on from conditional_scopes(),
+    or None to skip the check, may add values to conditional_variant(), and
+    return a window length in seconds from conditional_window() when the
+    response shows values that change without a version bump (counters).
+    """
+
+    def conditional_scopes(self):
+        return None
+
+    def conditional_window(self):
+        return None
+
+    def conditional_variant(self):
+        request = self.request
+        return [request.get_full_path(), request.user.pk, request.accepted_renderer.format]
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        scopes = self.conditional_scopes()
+        if scopes is None:
+            return handler(request, *args, **kwargs)
+
+        stamps = versions(*scopes)
+        window = self.conditional_window()
+        if window:
+            stamps.append(window_start(window))
+        seed = repr((stamps, self.conditional_variant())).encode()
+        etag = quote_etag(hashlib.md5(seed, usedforsecurity=False).hexdigest())
+        last_modified = max(stamps) // 1_000_000_000 if stamps else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,326 @@
+"""
+Per-view request instrumentation.
+
+InstrumentationMiddleware picks a SAMPLE_RATE share of requests and, for
+those, wraps every database connection with `execute_wrapper` to count
+queries and time them. DRF views that also mix in InstrumentedViewMixin split
+their own time into serialization and rendering, and any view can time named
+stages of its own with `stage(request, name)`. Unsampled requests cost one
+random() call.
+
+Sampled requests get a `Server-Timing` header (visible in browser devtools)
+and are aggregated per view name in a process-local registry, which
+`/metrics/` serves in Prometheus text format. Counts there are of *sampled*
+requests; divide by the exported sample rate to estimate totals. Each worker
+process keeps its own registry, so scrape every worker (or run one).
+
+Queries slower than SLOW_QUERY_MS are logged and kept, with the project
+frames that issued them, in a small ring buffer served at
+`/metrics/slow-queries/`.
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.1,           # share of requests measured, 0..1
+    'SERVER_TIMING': True,        # add a Server-Timing header to sampled responses
+    'SLOW_QUERY_MS': 100,
+    'SLOW_QUERY_SAMPLES': 50,     # slow queries kept for /metrics/slow-queries/
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],  # who may read the metrics endpoints
+}
+
+# request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STACK_DEPTH = 5
+
+
+def config(key):
+    return getattr(settings, 'INSTRUMENTATION', {}).get(key, DEFAULTS[key])
+
+
+class RequestMetrics:
+    """Measurements of one sampled request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_seconds = 0.0
+        self.stages = {}  # name -> seconds
+        self.slow_queries = []
+        self._serialize_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper hook"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if elapsed * 1000 >= config('SLOW_QUERY_MS'):
+                self.slow_queries.append({'sql': sql[:1000], 'ms': round(elapsed * 1000, 2), 'origin': origin()})
+
+    def start_serialize(self):
+        self._serialize_started = (time.perf_counter(), self.db_seconds)
+
+    def stop_serialize(self):
+        """Close the window opened by start_serialize, not counting queries run inside it"""
+        if self._serialize_started is not None:
+            started, db_before = self._serialize_started
+            elapsed = time.perf_counter() - started - (self.db_seconds - db_before)
+            self.serialize_seconds += max(elapsed, 0.0)
+            self._serialize_started = None
+
+    def server_timing(self, total):
+        parts = [
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_seconds * 1000:.2f}',
+            f'render;dur={self.render_seconds * 1000:.2f}',
+        ]
+        parts += [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages.items()]
+        parts.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(parts)
+
+
+def origin():
+    """The innermost project frames on the stack, skipping Django, DRF and this module"""
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if str(settings.BASE_DIR) in frame.filename
+        and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('instrumentation.py')
+    ]
+    return [f'{frame.filename[len(str(settings.BASE_DIR)) + 1:]}:{frame.lineno} in {frame.name}'
+            for frame in frames[-STACK_DEPTH:]]
+
+
+class ViewStats:
+    def __init__(self):
+        self.responses = {}  # (method, status) -> count
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_seconds = 0.0
+        self.response_bytes = 0
+        self.slow_queries = 0
+        self.stages = {}
+
+
+class Registry:
+    """Aggregated measurements per view name, shared by the threads of one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+        self.slow_queries = deque(maxlen=config('SLOW_QUERY_SAMPLES'))
+
+    def record(self, metrics, method, status, seconds, size):
+        with self._lock:
+            stats = self.views.setdefault(metrics.view, ViewStats())
+            key = (method, status)
+            stats.responses[key] = stats.responses.get(key, 0) + 1
+            index = bisect.bisect_left(BUCKETS, seconds)
+            if index < len(BUCKETS):
+                stats.buckets[index] += 1
+            stats.count += 1
+            stats.seconds += seconds
+            stats.queries += metrics.queries
+            stats.db_seconds += metrics.db_seconds
+            stats.serialize_seconds += metrics.serialize_seconds
+            stats.render_seconds += metrics.render_seconds
+            stats.response_bytes += size
+            stats.slow_queries += len(metrics.slow_queries)
+            for name, seconds in metrics.stages.items():
+                stats.stages[name] = stats.stages.get(name, 0.0) + seconds
+            self.slow_queries.extend({'view': metrics.view, **query} for query in metrics.slow_queries)
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+            self.slow_queries.clear()
+
+    def prometheus(self):
+        """All metrics in Prometheus text exposition format 0.0.4"""
+        with self._lock:
+            views = sorted(self.views.items())
+            lines = [
+                '# HELP django_instrumentation_sample_rate Share of requests that are measured',
+                '# TYPE django_instrumentation_sample_rate gauge',
+                f'django_instrumentation_sample_rate {float(config("SAMPLE_RATE"))}',
+                '# HELP django_view_requests_total Sampled requests by view, method and status',
+                '# TYPE django_view_requests_total counter',
+            ]
+            for view, stats in views:
+                for (method, status), count in sorted(stats.responses.items()):
+                    lines.append(
+                        f'django_view_requests_total{{view="{label(view)}",method="{method}",status="{status}"}} {count}'
+                    )
+
+            lines += [
+                '# HELP django_view_duration_seconds Time spent in Django per sampled request',
+                '# TYPE django_view_duration_seconds histogram',
+            ]
+            for view, stats in views:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'django_view_duration_seconds_bucket{{view="{label(view)}",le="{bound}"}} {cumulative}')
+                lines += [
+                    f'django_view_duration_seconds_bucket{{view="{label(view)}",le="+Inf"}} {stats.count}',
+                    f'django_view_duration_seconds_sum{{view="{label(view)}"}} {stats.seconds:.6f}',
+                    f'django_view_duration_seconds_count{{view="{label(view)}"}} {stats.count}',
+                ]
+
+            totals = [
+                ('db_queries', 'Database queries run by sampled requests', 'queries', '{}'),
+                ('db_seconds', 'Time spent executing database queries', 'db_seconds', '{:.6f}'),
+                ('serialize_seconds', 'Time spent serializing, excluding queries', 'serialize_seconds', '{:.6f}'),
+                ('render_seconds', 'Time spent rendering responses', 'render_seconds', '{:.6f}'),
+                ('response_bytes', 'Response body bytes sent', 'response_bytes', '{}'),
+                ('slow_queries', 'Queries slower than SLOW_QUERY_MS', 'slow_queries', '{}'),
+            ]
+            for name, help_text, attribute, number in totals:
+                lines += [f'# HELP django_view_{name}_total {help_text}', f'# TYPE django_view_{name}_total counter']
+                for view, stats in views:
+                    value = number.format(getattr(stats, attribute))
+                    lines.append(f'django_view_{name}_total{{view="{label(view)}"}} {value}')
+
+            lines += [
+                '# HELP django_view_stage_seconds_total Time spent in stages views time with stage()',
+                '# TYPE django_view_stage_seconds_total counter',
+            ]
+            for view, stats in views:
+                for name, seconds in sorted(stats.stages.items()):
+                    lines.append(
+                        f'django_view_stage_seconds_total{{view="{label(view)}",stage="{label(name)}"}} {seconds:.6f}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def current(request):
+    """RequestMetrics of a sampled request, or None"""
+    return getattr(request, 'instrumentation', None)
+
+
+@contextmanager
+def stage(request, name):
+    """Time a named stage of a sampled request; repeated stages add up"""
+    metrics = current(request)
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.stages[name] = metrics.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match.route or match._func_path
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not config('ENABLED') or random.random() >= config('SAMPLE_RATE'):
+            return self.get_response(request)
+
+        metrics = request.instrumentation = RequestMetrics()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(metrics))
+            response = self.get_response(request)
+        total = time.perf_counter() - metrics.started
+
+        metrics.view = view_name(request)
+        size = 0 if response.streaming else len(response.content)
+        registry.record(metrics, request.method, response.status_code, total, size)
+        for query in metrics.slow_queries:
+            logger.warning('Slow query (%.1f ms) in %s from %s: %s',
+                           query['ms'], metrics.view, ' < '.join(reversed(query['origin'])), query['sql'])
+        if config('SERVER_TIMING'):
+            response['Server-Timing'] = metrics.server_timing(total)
+        return response
+
+
+class InstrumentedViewMixin:
+    """
+    Split serialization and rendering time out of a DRF view's time.
+
+    Serialization is timed from get_serializer() returning to the response
+    being built (serializer.data is evaluated in between), minus the queries
+    run meanwhile. The response is rendered in finalize_response() so the
+    renderer can be timed; Django skips responses that are already rendered.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        metrics = current(self.request)
+        if metrics is not None:
+            metrics.start_serialize()
+        return serializer
+
+    def get_paginated_response(self, data):
+        metrics = current(self.request)
+        if metrics is not None:
+            metrics.stop_serialize()
+        return super().get_paginated_response(data)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        metrics = current(request)
+        if metrics is not None:
+            metrics.stop_serialize()
+            if hasattr(response, 'render') and not response.is_rendered:
+                started = time.perf_counter()
+                response.render()
+                metrics.render_seconds += time.perf_counter() - started
+        return response
+
+
+def _check_access(request):
+    if request.META.get('REMOTE_ADDR') not in config('ALLOWED_IPS'):
+        raise Http404
+
+
+def metrics_view(request):
+    _check_access(request)
+    return HttpResponse(registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def slow_queries_view(request):
+    _check_access(request)
+    return JsonResponse({'slow_queries': list(registry.slow_queries)})
@@ -0,0 +1,98 @@
+"""
+Insert-first uniqueness.
+
+Checking `exists()` before inserting costs one extra round-trip per write and
+still races: two writers can both find no row and both insert, and the loser
+hits the unique constraint anyway, as a 500. The database already enforces
+unique_together, so writers here insert straight away and turn a unique
+violation into the answer the check would have given.
+
+The INSERT runs in a savepoint when a transaction is open, so a violation
+does not abort it (PostgreSQL would refuse every later statement); in
+autocommit mode it is sent on its own. IntegrityError does not portably say
+which constraint failed, so after a failure the unique sets are looked up,
+one query per set, on the failure path only. Anything that is not a
+duplicate, such as a foreign key to a row deleted meanwhile, is re-raised.
+"""
+from contextlib import nullcontext
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator
+
+
+def unique_sets(model):
+    """Field name tuples the database keeps unique, besides single unique fields"""
+    sets = [tuple(fields) for fields in model._meta.unique_together]
+    sets += [tuple(constraint.fields) for constraint in model._meta.total_unique_constraints]
+    return sets
+
+
+def _lookup(model, fields, values):
+    """Filter kwargs for a unique set, from values keyed by field name or attname (post / post_id)"""
+    lookup = {}
+    for name in fields:
+        attname = model._meta.get_field(name).attname
+        key = name if name in values else attname if attname in values else None
+        if key is None:
+            return None
+        lookup[key] = values[key]
+    return lookup
+
+
+def conflict(model, values):
+    """The unique set whose values already exist in the table, or None"""
+    for fields in unique_sets(model):
+        lookup = _lookup(model, fields, values)
+        if lookup is not None and model._default_manager.filter(**lookup).exists():
+            return fields
+    return None
+
+
+def savepoint(using=None):
+    if transaction.get_connection(using).in_atomic_block:
+        return transaction.atomic(using=using)
+    return nullcontext()
+
+
+def create_unique(manager, **values):
+    """(row, True) from a single INSERT, or (None, False) when an equal row already exists"""
+    try:
+        with savepoint(manager.db):
+            return manager.create(**values), True
+    except IntegrityError:
+        if conflict(manager.model, values) is None:
+            raise
+        return None, False
+
+
+class InsertFirstMixin:
+    """
+    ModelSerializer mixin: leave unique_together to the database.
+
+    The per-item UniqueTogetherValidator is dropped, and create() reports a
+    violation as the validator would have ({"non_field_errors": [message]}).
+    `unique_error_messages` maps field name tuples to custom messages. Inside
+    a BulkListSerializer the validators stay, as it checks them per batch.
+    """
+    unique_error_messages = {}
+
+    def get_validators(self):
+        validators = super().get_validators()
+        if self.parent is not None:
+            return validators
+        return [validator for validator in validators if not isinstance(validator, UniqueTogetherValidator)]
+
+    def create(self, validated_data):
+        model = self.Meta.model
+        try:
+            with savepoint(model._default_manager.db):
+                return super().create(validated_data)
+        except IntegrityError:
+            fields = conflict(model, validated_data)
+            if fields is None:
+                raise
+        message = self.unique_error_messages.get(fields) or \
+            UniqueTogetherValidator.message.format(field_names=', '.join(fields))
+        raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='unique')
@@ -0,0 +1,157 @@
+"""
+Keyset (cursor) pagination for infinite-scroll endpoints.
+
+Pages are fetched with a `WHERE (created_at, id) < (last_created_at, last_id)`
+predicate on an indexed ordering instead of COUNT(*) + OFFSET, so a deep page
+costs the same as the first one and cursors stay stable when new rows arrive.
+
+A paginator may also list `alternative_orderings` (e.g. by a denormalized
+counter, tie-broken by id) that are walked the same way when the queryset is
+sorted by them. Requests that ask for a page number (`?page=`) or for any
+other ordering fall back to PageNumberPagination.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Must end with a unique field so every row has a distinct position
+    ordering = ('-created_at', '-id')
+    alternative_orderings = ()
+    fallback_class = PageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        ordering = self.keyset_ordering(queryset, request)
+        if ordering is None:
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.ordering = ordering
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        rows = list(queryset[:page_size + 1])  # one extra row tells us whether a next page exists
+        page = rows[:page_size]
+        self.next_position = self.get_position(page[-1]) if len(rows) > page_size else None
+        return page
+
+    def keyset_ordering(self, queryset, request):
+        """The keyset ordering that matches the queryset's, or None to fall back"""
+        if self.fallback_class.page_query_param in request.query_params:
+            return None
+        order_by = tuple(queryset.query.order_by or queryset.model._meta.ordering)
+        if not order_by:
+            return self.ordering
+        for ordering in (self.ordering, *self.alternative_orderings):
+            if ordering[:len(order_by)] == order_by:
+                return ordering
+        return None
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def after(self, position):
+        """Build the row-value comparison `(f1, f2, ...) > (v1, v2, ...)` as ORed Q objects"""
+        condition = Q()
+        equal_so_far = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal_so_far, **{f'{name}__{lookup}': value})
+            equal_so_far[name] = value
+        return condition
+
+    def get_position(self, row):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            values.append(row[name] if isinstance(row, dict) else getattr(row, name))
+        return values
+
+    def encode_cursor(self, position):
+        raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in position])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PostKeysetPagination(KeysetPagination):
+    """Newest first, or by a Post counter either way (`?ordering=-like_count`); see the indexes on Post"""
+    alternative_orderings = tuple(
+        ordering
+        for counter in ('like_count', 'comment_count', 'emoji_count')
+        for ordering in ((f'-{counter}', '-id'), (counter, 'id'))
+    )
+
+
+class OldestFirstKeysetPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
+
+
+class NotificationKeysetPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
+
+
+class FollowKeysetPagination(KeysetPagination):
+    """Walks one user's follow rows by the other user's id, which is unique within them"""
+    def __init__(self, member_field):
+        self.ordering = (member_field,)
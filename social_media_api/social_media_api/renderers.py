@@ -0,0 +1,53 @@
+"""
+JSON rendering straight to bytes.
+
+FastJSONRenderer encodes with orjson when it is installed, which writes UTF-8
+bytes in one pass instead of building a str with stdlib json and encoding it
+afterwards. The output matches DRF's JSONRenderer with its default settings
+(compact, unescaped unicode, U+2028/U+2029 escaped, datetimes and decimals
+through DRF's encoder). Two differences: NaN and infinity become null instead
+of raising, and small or large floats may be spelled differently (1e-6 rather
+than 1e-06) while parsing to the same number. Without orjson, or when a client
+asks for indented output, rendering falls back to JSONRenderer itself.
+"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_encoder = JSONEncoder()
+
+if orjson is not None:
+    # datetimes go through DRF's encoder, which formats them like the rest of DRF
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def _escape_separators(data):
+    # valid JSON, but not valid JavaScript; JSONRenderer escapes them too
+    if b'\xe2\x80\xa8' in data or b'\xe2\x80\xa9' in data:
+        data = data.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return data
+
+
+def dumps(data):
+    """Encode data to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return _escape_separators(orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS))
+    text = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+    return _escape_separators(text.encode())
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # non-default UNICODE_JSON / COMPACT_JSON settings and indentation are left to JSONRenderer
+        if orjson is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return dumps(data)
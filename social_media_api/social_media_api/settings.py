@@ -55,12 +55,14 @@ INSTALLED_APPS = [
     'posts',
     'django_filters',
     'notifications',
+    'benchmarks',
 
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'social_media_api.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -163,7 +165,13 @@ AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
+    ],
+
+    # orjson-backed JSON (social_media_api/renderers.py), stdlib json if orjson is missing
+    'DEFAULT_RENDERER_CLASSES': [
+        'social_media_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 
     'DEFAULT_FILTER_BACKENDS': [
@@ -176,6 +184,119 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,  # number of items per page
 }
 
+# The default cache is per process. Conditional GET versions
+# (social_media_api/conditional.py) must be seen by every worker and by the
+# management commands that write, so they get their own shared cache: the
+# database cache out of the box (`manage.py createcachetable`), or Redis or
+# Memcached through CONDITIONAL_CACHE_BACKEND / CONDITIONAL_CACHE_LOCATION.
+# Other values one worker changes and the rest read (follow graph sets, unread
+# notification counters, validated auth tokens) go to the 'shared' cache,
+# configured the same way through SHARED_CACHE_BACKEND / SHARED_CACHE_LOCATION
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'conditional': {
+        'BACKEND': os.environ.get('CONDITIONAL_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CONDITIONAL_CACHE_LOCATION', 'conditional_get_versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'shared': {
+        'BACKEND': os.environ.get('SHARED_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', 'shared_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+CONDITIONAL_GET_CACHE = 'conditional'
+# Counters bump no ETag versions; responses showing them revalidate at least
+# once per this many seconds
+CONDITIONAL_GET_COUNTER_WINDOW = 30
+
+# Home timelines (posts/timeline.py): post IDs kept per user, and the follower
+# count above which an author's posts are merged on read instead of fanned out
+TIMELINE_MAX_LENGTH = int(os.environ.get('TIMELINE_MAX_LENGTH', 800))
+TIMELINE_FANOUT_LIMIT = int(os.environ.get('TIMELINE_FANOUT_LIMIT', 5000))
+# Entries a timeline may grow past TIMELINE_MAX_LENGTH before fan-out trims it;
+# `manage.py trim_timelines` trims all the way down
+TIMELINE_TRIM_SLACK = int(os.environ.get('TIMELINE_TRIM_SLACK', 50))
+
+# Token auth cache (accounts/authentication.py): validated tokens are kept in
+# the shared cache for TTL seconds and in each worker for LOCAL_TTL seconds, so
+# a revoked token keeps working on other workers for at most LOCAL_TTL seconds.
+# The shared tier is skipped while 'shared' is the DatabaseCache; point
+# SHARED_CACHE_BACKEND at Redis or Memcached to use it
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 300)),
+    'LOCAL_TTL': int(os.environ.get('TOKEN_AUTH_CACHE_LOCAL_TTL', 5)),
+    'SHARED_CACHE': os.environ.get('TOKEN_AUTH_SHARED_CACHE', 'shared'),
+}
+
+# Login fast path (accounts/login.py): last_login is written in batches like
+# likes, token keys are cached per user after the first login and outdated
+# password hashes are upgraded by a background thread instead of the login
+LAST_LOGIN_BUFFER = {
+    'ENABLED': os.environ.get('LAST_LOGIN_BUFFER_ENABLED', 'True').lower() == 'true',
+    'MAX_SIZE': 1000,
+    'FLUSH_INTERVAL': 5.0,
+}
+LOGIN_FAST_PATH = {
+    'TOKEN_CACHE_TIMEOUT': 3600,
+    'DEFER_HASH_UPGRADES': True,
+    'MAX_PENDING_UPGRADES': 100,
+}
+
+# Bulk create/update (social_media_api/bulk.py): most items one request may send
+BULK_MAX_ITEMS = 1000
+
+# Follow graph adjacency sets (accounts/graph.py) are cached in this shared
+# cache for this many seconds; follows and unfollows invalidate them right away
+FOLLOW_GRAPH_CACHE = 'shared'
+FOLLOW_GRAPH_CACHE_TIMEOUT = int(os.environ.get('FOLLOW_GRAPH_CACHE_TIMEOUT', 3600))
+
+# Buffered like ingestion (posts/buffers.py): likes are acknowledged at once and
+# written in batches of up to MAX_SIZE, at most FLUSH_INTERVAL seconds later.
+# Off by default: until the flush, clients (on other workers especially) do
+# not see their own likes or the new like_count
+LIKE_BUFFER = {
+    'ENABLED': os.environ.get('LIKE_BUFFER_ENABLED', 'False').lower() == 'true',
+    'MAX_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+}
+
+# Notification pipeline (notifications/pipeline.py): repeats of (recipient,
+# verb, target) within COALESCE_WINDOW seconds are folded into one row. Enabled,
+# writes are batched the same way; off by default because a worker that is
+# killed loses the notifications it has not flushed yet
+NOTIFICATION_PIPELINE = {
+    'ENABLED': os.environ.get('NOTIFICATION_PIPELINE_ENABLED', 'False').lower() == 'true',
+    'MAX_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+    'COALESCE_WINDOW': 3600,
+}
+
+# Unread notification counters (notifications/unread.py) live in the shared
+# cache and are recounted at least every NOTIFICATION_UNREAD_TIMEOUT seconds
+NOTIFICATION_UNREAD_CACHE = 'shared'
+NOTIFICATION_UNREAD_TIMEOUT = int(os.environ.get('NOTIFICATION_UNREAD_TIMEOUT', 300))
+
+# Request instrumentation (social_media_api/instrumentation.py): SAMPLE_RATE of
+# requests are measured per view (queries, DB/serialize/render time, size),
+# answered with a Server-Timing header and exported at /metrics/ to ALLOWED_IPS
+INSTRUMENTATION = {
+    'ENABLED': os.environ.get('INSTRUMENTATION_ENABLED', 'True').lower() == 'true',
+    'SAMPLE_RATE': float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.1)),
+    'SERVER_TIMING': True,
+    'SLOW_QUERY_MS': int(os.environ.get('SLOW_QUERY_MS', 100)),
+    'SLOW_QUERY_SAMPLES': 50,
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Notifications older than this are moved to the archive table by
+# `manage.py archive_notifications` (run it from cron)
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -0,0 +1,45 @@
+"""
+Caches that every process has to agree on.
+
+The default cache is a LocMemCache, so each gunicorn worker (and each
+management command) has its own copy. That is fine for values that are only
+ever recomputed, but not for values that one process invalidates or changes
+and another reads: the other workers would keep the old value until it
+expires. Such values live in a cache named by a setting (FOLLOW_GRAPH_CACHE,
+CONDITIONAL_GET_CACHE, ...), which defaults to the 'shared' alias in
+settings.CACHES, and each module registers a system check built with
+check_shared() so a per-process backend fails at startup.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+SHARED = 'shared'
+
+
+def alias(setting, default=SHARED):
+    return getattr(settings, setting, default)
+
+
+def shared_cache(setting, default=SHARED):
+    """The cache named by `setting`"""
+    return caches[alias(setting, default)]
+
+
+def check_shared(setting, unknown_id, per_process_id, consequence, default=SHARED):
+    """System check errors for a `setting` that names no cache or a per-process one"""
+    return check_alias(setting, alias(setting, default), unknown_id, per_process_id, consequence)
+
+
+def check_alias(label, name, unknown_id, per_process_id, consequence):
+    """check_shared() for a cache alias that is not a setting of its own"""
+    if name not in settings.CACHES:
+        return [checks.Error(f'{label} names an unknown cache {name!r}.', id=unknown_id)]
+    if isinstance(caches[name], LocMemCache):
+        return [checks.Error(
+            f'{label} ({name!r}) is a per-process LocMemCache.',
+            hint=f'{consequence} Use a cache every process shares (database, Redis, Memcached).',
+            id=per_process_id,
+        )]
+    return []
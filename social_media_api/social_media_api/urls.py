@@ -17,9 +17,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .instrumentation import metrics_view, slow_queries_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
     path('posts/', include('posts.urls')),
     path('notifications/', include('notifications.urls')),
+    path('metrics/', metrics_view, name='metrics'),
+    path('metrics/slow-queries/', slow_queries_view, name='metrics-slow-queries'),
 ]